@@ -113,6 +113,7 @@ class RelatorioBalanco(models.Model):
             print("📊 Dados do relatório carregados do cache")
             return dados_cache
         
+        from carinho.arquivo import pedidos_arquivados_no_periodo
         from carinho.models import PedidoEntrega
         
         inicio_periodo = timezone.make_aware(
@@ -130,7 +131,10 @@ class RelatorioBalanco(models.Model):
         
         print(f"📦 Total de pedidos encontrados: {pedidos_periodo.count()}")
         
-        self._calcular_estatisticas(pedidos_periodo)
+        # Só lê o arquivo se o período começar antes do limite de arquivo
+        arquivados_periodo = pedidos_arquivados_no_periodo(inicio_periodo, fim_periodo)
+        
+        self._calcular_estatisticas(pedidos_periodo, arquivados_periodo)
         self.save()
         
         # Salvar no cache por 1 hora
@@ -138,8 +142,8 @@ class RelatorioBalanco(models.Model):
         
         return self
     
-    def _calcular_estatisticas(self, pedidos_queryset):
-        """Calcula estatísticas a partir dos pedidos"""
+    def _calcular_estatisticas(self, pedidos_queryset, arquivados_queryset=None):
+        """Calcula estatísticas a partir dos pedidos (e dos arquivados, se houver)"""
         pedidos_entregues = pedidos_queryset.filter(estado='entregue')
         self.total_pedidos_entregues = pedidos_entregues.count()
         
@@ -164,11 +168,27 @@ class RelatorioBalanco(models.Model):
                 print(f"⚠️ Erro ao calcular valor cancelado do pedido {pedido.id}: {e}")
                 continue
         
+        self.total_pedidos_periodo = pedidos_queryset.count()
+        
+        # Pedidos arquivados: totais já gravados, uma única agregação
+        if arquivados_queryset is not None:
+            from django.db.models import Count, Q, Sum
+            arquivo = arquivados_queryset.aggregate(
+                total=Count('id'),
+                entregues=Count('id', filter=Q(estado='entregue')),
+                cancelados=Count('id', filter=Q(estado='cancelado')),
+                valor=Sum('valor_total'),
+                valor_cancelados=Sum('valor_total', filter=Q(estado='cancelado')),
+            )
+            self.total_pedidos_periodo += arquivo['total']
+            self.total_pedidos_entregues += arquivo['entregues']
+            self.total_pedidos_cancelados += arquivo['cancelados']
+            self.subtotal_pedidos += arquivo['valor'] or Decimal('0.00')
+            self.valor_total_cancelados += arquivo['valor_cancelados'] or Decimal('0.00')
+        
         # NOVO CÁLCULO: Total Geral (Subtotal - Valor Cancelado)
         self.total_geral = self.subtotal_pedidos - self.valor_total_cancelados
         
-        self.total_pedidos_periodo = pedidos_queryset.count()
-        
         print(f"✅ Estatísticas calculadas:")
         print(f"   - Pedidos entregues: {self.total_pedidos_entregues}")
         print(f"   - Pedidos cancelados: {self.total_pedidos_cancelados}")
@@ -235,14 +255,20 @@ class RelatorioBalanco(models.Model):
             else:
                 # Usa o valor dos pedidos entregues do subtotal
                 valor_entregues = Decimal('0.00')
+                from django.db.models import Sum
+                from carinho.arquivo import pedidos_arquivados_no_periodo
                 from carinho.models import PedidoEntrega
+                periodo = (
+                    timezone.make_aware(datetime.combine(self.data_inicio, datetime.min.time())),
+                    timezone.make_aware(datetime.combine(self.data_fim, datetime.max.time()))
+                )
                 pedidos_entregues = PedidoEntrega.objects.filter(
-                    data_solicitacao__range=(
-                        timezone.make_aware(datetime.combine(self.data_inicio, datetime.min.time())),
-                        timezone.make_aware(datetime.combine(self.data_fim, datetime.max.time()))
-                    ),
+                    data_solicitacao__range=periodo,
                     estado='entregue'
                 )
+                valor_entregues += pedidos_arquivados_no_periodo(*periodo).filter(
+                    estado='entregue'
+                ).aggregate(valor=Sum('valor_total'))['valor'] or Decimal('0.00')
                 for pedido in pedidos_entregues:
                     try:
                         valor_entregues += pedido.total_pedido
@@ -0,0 +1,4 @@
+# Garante que a app Celery é carregada junto com o Django
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
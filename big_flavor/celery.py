@@ -0,0 +1,17 @@
+"""
+Configuração do Celery para o projeto big_flavor.
+
+As tarefas ficam em `<app>/tasks.py` e são descobertas automaticamente.
+Em testes/desenvolvimento pode-se usar CELERY_TASK_ALWAYS_EAGER=True para
+executar as tarefas no próprio processo, sem broker.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'big_flavor.settings')
+
+app = Celery('big_flavor')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -1,4 +1,5 @@
 import os
+from celery.schedules import crontab
 import dj_database_url
 from pathlib import Path
 #from dotenv import load_dotenv # Devo comentar em desenvolvimento
@@ -150,6 +151,58 @@ CACHES = {
     }
 }
 
+# Celery (fila de tarefas em background)
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL)
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'  # Executa no próprio processo (testes)
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_PUBLISH_RETRY = False  # Se o broker cair, a varredura periódica reenvia
+CELERY_TIMEZONE = 'Africa/Luanda'
+
+CELERY_BEAT_SCHEDULE = {
+    'processar-outbox-emails': {
+        'task': 'index.tasks.processar_outbox_emails',
+        'schedule': 60.0,  # 1 minuto
+    },
+    'reconciliar-estoque': {
+        'task': 'menu.tasks.reconciliar_estoque_produtos',
+        'schedule': 60.0,  # 1 minuto
+    },
+    'descarregar-visualizacoes-blog': {
+        'task': 'blog.tasks.descarregar_visualizacoes_blog',
+        'schedule': 60.0,  # 1 minuto
+    },
+    'atualizar-publicacoes-populares': {
+        'task': 'blog.tasks.atualizar_publicacoes_populares',
+        'schedule': 60.0 * 10,  # 10 minutos
+    },
+    'arquivar-pedidos-antigos': {
+        'task': 'carinho.tasks.arquivar_pedidos_antigos',
+        'schedule': crontab(hour=3, minute=30),  # Todas as noites
+    },
+    'limpar-carrinhos-abandonados': {
+        'task': 'carinho.tasks.limpar_carrinhos_abandonados',
+        'schedule': crontab(hour=4, minute=0),  # Todas as noites
+    },
+    'reconciliar-popularidade': {
+        'task': 'carinho.tasks.reconciliar_popularidade_produtos',
+        'schedule': crontab(hour=4, minute=30),  # Todas as noites
+    },
+    'calcular-recomendacoes': {
+        'task': 'menu.tasks.calcular_recomendacoes_produtos',
+        'schedule': crontab(hour=5, minute=0),  # Todas as noites
+    },
+}
+
+# Pedidos entregues/cancelados mais antigos do que isto vão para o arquivo
+ARQUIVO_PEDIDOS_MESES = int(os.environ.get('ARQUIVO_PEDIDOS_MESES', 6))
+
+# Recolha de carrinhos sem pedido (dias sem alterações)
+CARRINHO_FECHADO_DIAS = 7
+CARRINHO_ABANDONADO_DIAS = 60
+
+# Meia-vida (dias) do peso de uma venda na popularidade dos produtos
+POPULARIDADE_MEIA_VIDA_DIAS = 7
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
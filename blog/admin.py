@@ -8,7 +8,10 @@ class CategoriaAdmin(admin.ModelAdmin):
 
 @admin.register(Publicacao)
 class PublicacaoAdmin(admin.ModelAdmin):
-    list_display = ['titulo', 'autor', 'categoria', 'data_publicacao', 'publicado', 'visualizacoes']
+    list_display = ['titulo', 'autor', 'categoria', 'data_publicacao', 'publicado', 'visualizacoes',
+                    'num_likes', 'num_adores', 'num_comentarios']
+    # Reações só pelos toggles (blog/reacoes.py), que mantêm os contadores
+    exclude = ['likes', 'adores']
     list_filter = ['publicado', 'categoria', 'data_publicacao']
     search_fields = ['titulo', 'conteudo']
     prepopulated_fields = {'slug': ('titulo',)}
@@ -19,6 +22,7 @@ class ComentarioAdmin(admin.ModelAdmin):
     list_display = ['autor', 'publicacao', 'data_criacao', 'total_likes']
     list_filter = ['data_criacao']
     search_fields = ['autor__email', 'texto', 'publicacao__titulo']
+    exclude = ['likes']
     # ✅ REMOVIDO: ações de aprovação
     
     def total_likes(self, obj):
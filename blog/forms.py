@@ -1,5 +1,5 @@
 from django import forms
-from django.core.cache import cache
+from index.invalidacao import invalidar
 from .models import Comentario, Avaliacao
 
 class ComentarioForm(forms.ModelForm):
@@ -23,7 +23,7 @@ class ComentarioForm(forms.ModelForm):
         
         # Invalida o cache de comentários após salvar
         cache_key = f"comentarios_{instance.conteudo_id}"  # assumindo que há um relacionamento com conteúdo
-        cache.delete(cache_key)
+        invalidar(cache_key)
         
         return instance
 
@@ -47,10 +47,10 @@ class AvaliacaoForm(forms.ModelForm):
         
         # Invalida o cache de avaliações após salvar
         cache_key = f"avaliacoes_{instance.conteudo_id}"  # assumindo que há um relacionamento com conteúdo
-        cache.delete(cache_key)
+        invalidar(cache_key)
         
         # Invalida também o cache da média de avaliações
         media_cache_key = f"media_avaliacoes_{instance.conteudo_id}"
-        cache.delete(media_cache_key)
+        invalidar(media_cache_key)
         
         return instance
\ No newline at end of file
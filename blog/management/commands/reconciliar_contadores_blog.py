@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.reacoes import reconciliar_contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores de likes, adoros e comentários do blog'
+
+    def handle(self, *args, **options):
+        total = reconciliar_contadores()
+        self.stdout.write(self.style.SUCCESS(f'Contadores reconciliados: {total} linhas corrigidas'))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_remove_comentario_aprovado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='publicacao',
+            index=models.Index(condition=models.Q(('publicado', True)), fields=['data_publicacao'], name='blog_pub_publicado_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='publicacao',
+            index=models.Index(condition=models.Q(('publicado', True)), fields=['visualizacoes'], name='blog_pub_publicado_visual_idx'),
+        ),
+    ]
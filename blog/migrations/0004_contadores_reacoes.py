@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:45
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _contagem(queryset, coluna):
+    return Coalesce(Subquery(
+        queryset.filter(**{coluna: OuterRef('pk')}).order_by().values(coluna)
+        .annotate(n=Count('id')).values('n'),
+        output_field=IntegerField(),
+    ), Value(0))
+
+
+def preencher_contadores(apps, schema_editor):
+    Publicacao = apps.get_model('blog', 'Publicacao')
+    Comentario = apps.get_model('blog', 'Comentario')
+    Publicacao.objects.update(
+        num_likes=_contagem(Publicacao.likes.through.objects, 'publicacao_id'),
+        num_adores=_contagem(Publicacao.adores.through.objects, 'publicacao_id'),
+        num_comentarios=_contagem(Comentario.objects, 'publicacao_id'),
+    )
+    Comentario.objects.update(num_likes=_contagem(Comentario.likes.through.objects, 'comentario_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_publicacao_blog_pub_publicado_data_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comentario',
+            name='num_likes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='publicacao',
+            name='num_adores',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='publicacao',
+            name='num_comentarios',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='publicacao',
+            name='num_likes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_contadores_reacoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DescargaVisualizacoes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote', models.CharField(max_length=32, unique=True, verbose_name='Lote')),
+                ('data', models.DateTimeField(auto_now_add=True, verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Descarga de Visualizações',
+                'verbose_name_plural': 'Descargas de Visualizações',
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
@@ -6,6 +7,8 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.cache import cache
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from index.imagens import agendar_derivadas
+from index.invalidacao import agrupar_invalidacoes, invalidar
 
 class Categoria(models.Model):
     nome = models.CharField(max_length=100)
@@ -18,14 +21,15 @@ class Categoria(models.Model):
     def __str__(self):
         return self.nome
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         # Limpa cache relacionado quando uma categoria é salva
-        cache.delete_many([
+        invalidar(
             'todas_categorias',
             f'categoria_{self.slug}',
             'publicacoes_recentes',
             'publicacoes_populares'
-        ])
+        )
         super().save(*args, **kwargs)
 
 class Publicacao(models.Model):
@@ -40,6 +44,10 @@ class Publicacao(models.Model):
     data_atualizacao = models.DateTimeField(auto_now=True)
     publicado = models.BooleanField(default=False)
     visualizacoes = models.PositiveIntegerField(default=0)
+    # Contadores desnormalizados (ver blog/reacoes.py)
+    num_likes = models.PositiveIntegerField(default=0, editable=False)
+    num_adores = models.PositiveIntegerField(default=0, editable=False)
+    num_comentarios = models.PositiveIntegerField(default=0, editable=False)
     
     likes = models.ManyToManyField(
         settings.AUTH_USER_MODEL, 
@@ -56,6 +64,18 @@ class Publicacao(models.Model):
         ordering = ['-data_publicacao']
         verbose_name = 'Publicação'
         verbose_name_plural = 'Publicações'
+        indexes = [
+            # Parciais: o filtro booleano sai como `WHERE "publicado"`, que só
+            # um índice com a mesma condição consegue aproveitar no SQLite.
+            models.Index(
+                fields=['data_publicacao'], condition=models.Q(publicado=True),
+                name='blog_pub_publicado_data_idx',
+            ),
+            models.Index(
+                fields=['visualizacoes'], condition=models.Q(publicado=True),
+                name='blog_pub_publicado_visual_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.titulo
@@ -64,35 +84,18 @@ class Publicacao(models.Model):
         return reverse('detalhes_publicacao', kwargs={'pk': self.id})
     
     def total_comentarios(self):
-        # Cache para total de comentários
-        cache_key = f'publicacao_{self.id}_total_comentarios'
-        total = cache.get(cache_key)
-        if total is None:
-            total = self.comentarios.count()
-            cache.set(cache_key, total, 300)  # Cache por 5 minutos
-        return total
+        return self.num_comentarios
     
     def total_likes(self):
-        cache_key = f'publicacao_{self.id}_total_likes'
-        total = cache.get(cache_key)
-        if total is None:
-            total = self.likes.count()
-            cache.set(cache_key, total, 300)
-        return total
+        return self.num_likes
     
     def total_adores(self):
-        cache_key = f'publicacao_{self.id}_total_adores'
-        total = cache.get(cache_key)
-        if total is None:
-            total = self.adores.count()
-            cache.set(cache_key, total, 300)
-        return total
+        return self.num_adores
     
     def incrementar_visualizacao(self):
-        self.visualizacoes += 1
-        self.save()
-        # Limpa cache de publicações populares
-        cache.delete('publicacoes_populares')
+        # Acumulada no Redis e gravada em lote (ver blog/visualizacoes.py)
+        from .visualizacoes import registrar_visualizacao
+        registrar_visualizacao(self.id)
     
     def get_postagens_relacionadas(self):
         if not self.categoria:
@@ -110,6 +113,7 @@ class Publicacao(models.Model):
         
         return relacionadas
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         # Limpa cache relacionado quando uma publicação é salva
         cache_keys_to_delete = [
@@ -121,7 +125,7 @@ class Publicacao(models.Model):
         
         # Remove keys None
         cache_keys_to_delete = [key for key in cache_keys_to_delete if key is not None]
-        cache.delete_many(cache_keys_to_delete)
+        invalidar(*cache_keys_to_delete)
         
         super().save(*args, **kwargs)
 
@@ -137,6 +141,7 @@ class Comentario(models.Model):
         related_name='comentario_likes', 
         blank=True
     )
+    num_likes = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['-data_criacao']
@@ -147,12 +152,7 @@ class Comentario(models.Model):
         return f'Comentário de {self.autor} em {self.publicacao}'
     
     def total_likes_comentario(self):
-        cache_key = f'comentario_{self.id}_total_likes'
-        total = cache.get(cache_key)
-        if total is None:
-            total = self.likes.count()
-            cache.set(cache_key, total, 300)
-        return total
+        return self.num_likes
     
     def total_likes(self):
         return self.total_likes_comentario()
@@ -166,12 +166,10 @@ class Comentario(models.Model):
             cache.set(cache_key, curtiu, 300)
         return curtiu
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         # Limpa cache relacionado quando um comentário é salvo
-        cache.delete_many([
-            f'publicacao_{self.publicacao.id}_total_comentarios',
-            f'publicacao_{self.publicacao.id}_comentarios'
-        ])
+        invalidar(f'publicacao_{self.publicacao_id}_comentarios')
         super().save(*args, **kwargs)
 
 class Avaliacao(models.Model):
@@ -190,14 +188,27 @@ class Avaliacao(models.Model):
     def __str__(self):
         return f'{self.nota} estrelas por {self.usuario}'
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         # Limpa cache de avaliações quando uma avaliação é salva
-        cache.delete_many([
+        invalidar(
             f'publicacao_{self.publicacao.id}_media_avaliacoes',
             f'publicacao_{self.publicacao.id}_total_avaliacoes'
-        ])
+        )
         super().save(*args, **kwargs)
 
+class DescargaVisualizacoes(models.Model):
+    """Lote de visualizações já gravado: a repetição do mesmo lote não conta duas vezes"""
+    lote = models.CharField(max_length=32, unique=True, verbose_name='Lote')
+    data = models.DateTimeField(auto_now_add=True, verbose_name='Data')
+    
+    class Meta:
+        verbose_name = 'Descarga de Visualizações'
+        verbose_name_plural = 'Descargas de Visualizações'
+    
+    def __str__(self):
+        return self.lote
+
 # Funções utilitárias de cache
 def get_publicacoes_recentes(limit=5):
     """Obtém publicações recentes com cache"""
@@ -212,15 +223,16 @@ def get_publicacoes_recentes(limit=5):
     
     return publicacoes
 
-def get_publicacoes_populares(limit=5):
-    """Obtém publicações populares com cache"""
+def get_publicacoes_populares(limit=5, atualizar=False):
+    """Obtém publicações populares com cache (`atualizar` recalcula e regrava)"""
     cache_key = f'publicacoes_populares_{limit}'
-    publicacoes = cache.get(cache_key)
+    publicacoes = None if atualizar else cache.get(cache_key)
     
     if publicacoes is None:
-        publicacoes = Publicacao.objects.filter(
+        publicacoes = list(Publicacao.objects.filter(
             publicado=True
-        ).select_related('autor', 'categoria').order_by('-visualizacoes', '-data_publicacao')[:limit]
+        ).select_related('autor', 'categoria').order_by('-visualizacoes', '-data_publicacao')[:limit])
+        # Regravado a cada 10 minutos pela tarefa atualizar_publicacoes_populares
         cache.set(cache_key, publicacoes, 1800)  # Cache por 30 minutos
     
     return publicacoes
@@ -241,29 +253,47 @@ def get_todas_categorias():
 @receiver(post_delete, sender=Publicacao)
 def limpar_cache_publicacao(sender, instance, **kwargs):
     """Limpa cache relacionado a publicações"""
-    cache.delete_many([
+    invalidar(
         'publicacoes_recentes',
         'publicacoes_populares',
+        'blog_ids_publicados',
         f'publicacao_{instance.id}_relacionadas',
         f'categoria_{instance.categoria.slug}_publicacoes' if instance.categoria else None
-    ])
+    )
+
+@receiver(post_save, sender=Publicacao)
+def gerar_derivadas_publicacao(sender, instance, raw=False, **kwargs):
+    """Versões redimensionadas da imagem de destaque, geradas no worker"""
+    if not raw:
+        agendar_derivadas(instance.imagem_destaque)
 
 @receiver(post_save, sender=Comentario)
 @receiver(post_delete, sender=Comentario)
 def limpar_cache_comentario(sender, instance, **kwargs):
     """Limpa cache relacionado a comentários"""
-    cache.delete_many([
-        f'publicacao_{instance.publicacao.id}_total_comentarios',
-        f'publicacao_{instance.publicacao.id}_comentarios'
-    ])
+    invalidar(f'publicacao_{instance.publicacao_id}_comentarios')
+
+@receiver(post_save, sender=Comentario)
+@receiver(post_delete, sender=Comentario)
+def contar_comentario(sender, instance, created=False, raw=False, **kwargs):
+    """Mantém Publicacao.num_comentarios (F(), na transação de quem grava)"""
+    if raw:
+        return
+    if kwargs['signal'] is post_delete:
+        delta = -1
+    elif created:
+        delta = 1
+    else:
+        return
+    Publicacao.objects.filter(pk=instance.publicacao_id).update(num_comentarios=F('num_comentarios') + delta)
 
 @receiver(post_save, sender=Categoria)
 @receiver(post_delete, sender=Categoria)
 def limpar_cache_categoria(sender, instance, **kwargs):
     """Limpa cache relacionado a categorias"""
-    cache.delete_many([
+    invalidar(
         'todas_categorias',
         f'categoria_{instance.slug}',
         'publicacoes_recentes',
         'publicacoes_populares'
-    ])
\ No newline at end of file
+    )
\ No newline at end of file
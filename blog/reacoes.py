@@ -0,0 +1,90 @@
+# blog/reacoes.py
+"""
+Likes/adoros das publicações e likes dos comentários, com contadores
+desnormalizados (`num_likes`, `num_adores`, `num_comentarios`).
+
+`alternar` liga ou desliga a reação do usuário e ajusta o contador com
+F() na mesma transação. A decisão vem do próprio DELETE/INSERT na tabela
+intermédia (e não de um exists() antes): dois cliques simultâneos não
+contam a mesma reação duas vezes. Os comentários são contados pelos
+sinais de Comentario.
+
+Alterações feitas por outros caminhos (admin, shell) não passam por aqui:
+`manage.py reconciliar_contadores_blog` volta a contar tudo.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Comentario, Publicacao
+
+# Reação -> (modelo, relação M2M, contador)
+REACOES = {
+    'like_publicacao': (Publicacao, 'likes', 'num_likes'),
+    'adorar_publicacao': (Publicacao, 'adores', 'num_adores'),
+    'like_comentario': (Comentario, 'likes', 'num_likes'),
+}
+
+
+def alternar(reacao, objeto_id, usuario):
+    """Liga/desliga a reação. Retorna (ativa, total)."""
+    modelo, relacao, contador = REACOES[reacao]
+    campo = modelo._meta.get_field(relacao)
+    intermedia = campo.remote_field.through
+    filtro = {f'{campo.m2m_field_name()}_id': objeto_id, f'{campo.m2m_reverse_field_name()}_id': usuario.id}
+
+    with transaction.atomic():
+        removidas, _ = intermedia.objects.filter(**filtro).delete()
+        if removidas:
+            ativa, delta = False, -removidas
+        else:
+            try:
+                with transaction.atomic():
+                    intermedia.objects.create(**filtro)
+                ativa, delta = True, 1
+            except IntegrityError:
+                # Outro pedido do mesmo usuário acabou de a criar (e de a contar)
+                ativa, delta = True, 0
+        if delta:
+            modelo.objects.filter(pk=objeto_id).update(**{contador: F(contador) + delta})
+        total = modelo.objects.values_list(contador, flat=True).get(pk=objeto_id)
+    return ativa, total
+
+
+def _contagens(modelo, relacao):
+    campo = modelo._meta.get_field(relacao)
+    coluna = f'{campo.m2m_field_name()}_id'
+    return _por(campo.remote_field.through.objects, coluna)
+
+
+def _por(queryset, coluna):
+    """{id: nº de linhas}, contado no banco (Counter: 0 para os ausentes)"""
+    return Counter(dict(queryset.order_by().values(coluna).annotate(n=Count('id')).values_list(coluna, 'n')))
+
+
+def reconciliar_contadores():
+    """Recalcula os contadores a partir das tabelas. Retorna o número de linhas corrigidas."""
+    corrigidas = 0
+    reais = {
+        'num_likes': _contagens(Publicacao, 'likes'),
+        'num_adores': _contagens(Publicacao, 'adores'),
+        'num_comentarios': _por(Comentario.objects, 'publicacao_id'),
+    }
+    corrigidas += _corrigir(Publicacao, reais)
+    corrigidas += _corrigir(Comentario, {'num_likes': _contagens(Comentario, 'likes')})
+    return corrigidas
+
+
+def _corrigir(modelo, reais):
+    campos = list(reais)
+    alterados = []
+    for objeto in modelo.objects.only('id', *campos).iterator():
+        diferentes = [campo for campo in campos if getattr(objeto, campo) != reais[campo][objeto.id]]
+        for campo in diferentes:
+            setattr(objeto, campo, reais[campo][objeto.id])
+        if diferentes:
+            alterados.append(objeto)
+    # bulk_update não chama save(): não invalida caches nem muda data_atualizacao
+    modelo.objects.bulk_update(alterados, campos, batch_size=500)
+    return len(alterados)
@@ -0,0 +1,31 @@
+// Likes/adoros sem recarregar a página.
+// form[data-reacao]: o POST vai com Accept: application/json e a resposta
+// {ativa, total} atualiza [data-total] e as classes do botão
+// (data-ativa / data-inativa). Sem JavaScript, o form faz o POST normal.
+(function () {
+    document.querySelectorAll('form[data-reacao]').forEach(function (form) {
+        form.addEventListener('submit', function (evento) {
+            evento.preventDefault();
+            const botao = form.querySelector('button');
+            botao.disabled = true;
+
+            fetch(form.action, {
+                method: 'POST',
+                body: new FormData(form),
+                headers: {'Accept': 'application/json'},
+                credentials: 'same-origin',
+            }).then(function (resposta) {
+                if (!resposta.ok) throw new Error(resposta.status);
+                return resposta.json();
+            }).then(function (dados) {
+                form.querySelector('[data-total]').textContent = dados.total;
+                botao.classList.toggle(botao.dataset.ativa, dados.ativa);
+                botao.classList.toggle(botao.dataset.inativa, !dados.ativa);
+            }).catch(function () {
+                form.submit();
+            }).finally(function () {
+                botao.disabled = false;
+            });
+        });
+    });
+})();
@@ -0,0 +1,10 @@
+// Regista a visualização da publicação fora do cache da página.
+// <script src=".../visualizacao.js" data-url="{% url 'registrar_visualizacao' id %}">
+(function () {
+    const url = document.currentScript.dataset.url;
+    if (navigator.sendBeacon) {
+        navigator.sendBeacon(url);
+    } else {
+        fetch(url, {method: 'POST', keepalive: true, credentials: 'omit'});
+    }
+})();
@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from .visualizacoes import atualizar_populares, descarregar_visualizacoes
+
+
+@shared_task
+def descarregar_visualizacoes_blog():
+    """Grava no banco as visualizações acumuladas no Redis"""
+    return descarregar_visualizacoes()
+
+
+@shared_task
+def atualizar_publicacoes_populares():
+    """Regrava no cache as listas de publicações populares"""
+    atualizar_populares()
@@ -1,3 +1,179 @@
-from django.test import TestCase
+import importlib.util
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Categoria, Comentario, DescargaVisualizacoes, Publicacao
+from .visualizacoes import CHAVE_BLOQUEIO, CHAVE_REDIS, PREFIXO_LOTE, descarregar_visualizacoes, registrar_visualizacao
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class VisualizacoesTest(TestCase):
+    """Sem Redis (locmem), cada visualização é logo um UPDATE"""
+
+    def setUp(self):
+        cache.clear()
+        autor = get_user_model().objects.create_user(
+            username='autor', email='autor@teste.com', password='senha', nome='Autor'
+        )
+        categoria = Categoria.objects.create(nome='Novidades', slug='novidades')
+        self.publicacao = Publicacao.objects.create(
+            titulo='Novo menu', slug='novo-menu', conteudo='...', resumo='...',
+            autor=autor, categoria=categoria, publicado=True,
+        )
+
+    def test_beacon_soma_sem_save(self):
+        data_atualizacao = self.publicacao.data_atualizacao
+        url = reverse('registrar_visualizacao', args=[self.publicacao.id])
+
+        self.assertEqual(self.client.post(url).status_code, 204)
+        self.assertEqual(self.client.post(url).status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        # Id que não está publicado: ignorado
+        self.assertEqual(self.client.post(reverse('registrar_visualizacao', args=[999])).status_code, 204)
+
+        self.publicacao.refresh_from_db()
+        self.assertEqual(self.publicacao.visualizacoes, 2)
+        self.assertEqual(self.publicacao.data_atualizacao, data_atualizacao)
+
+    def test_pagina_de_detalhe_nao_conta(self):
+        resposta = self.client.get(reverse('detalhes_publicacao', args=[self.publicacao.id]))
+        self.assertContains(resposta, reverse('registrar_visualizacao', args=[self.publicacao.id]))
+
+        self.publicacao.refresh_from_db()
+        self.assertEqual(self.publicacao.visualizacoes, 0)
+
+
+@skipUnless(importlib.util.find_spec('fakeredis'), 'fakeredis não instalado')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DescargaVisualizacoesTest(TestCase):
+    """Descarga do hash do Redis (fakeredis) para o banco"""
+
+    def setUp(self):
+        import fakeredis
+
+        cache.clear()
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('blog.visualizacoes.obter_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        autor = get_user_model().objects.create_user(
+            username='autor', email='autor@teste.com', password='senha', nome='Autor'
+        )
+        categoria = Categoria.objects.create(nome='Novidades', slug='novidades')
+        self.publicacao = Publicacao.objects.create(
+            titulo='Novo menu', slug='novo-menu', conteudo='...', resumo='...',
+            autor=autor, categoria=categoria, publicado=True,
+        )
+        for _ in range(3):
+            registrar_visualizacao(self.publicacao.id)
+
+    def _visualizacoes(self):
+        return Publicacao.objects.values_list('visualizacoes', flat=True).get(pk=self.publicacao.pk)
+
+    def _lotes(self):
+        return list(self.redis.scan_iter(match=f'{PREFIXO_LOTE}*'))
+
+    def test_descarrega_e_apaga_o_hash(self):
+        self.assertEqual(self._visualizacoes(), 0)
+        self.assertEqual(descarregar_visualizacoes(), 1)
+        self.assertEqual(self._visualizacoes(), 3)
+        self.assertFalse(self.redis.exists(CHAVE_REDIS))
+        self.assertEqual(self._lotes(), [])
+        self.assertEqual(descarregar_visualizacoes(), 0)
+
+    def test_queda_depois_do_commit_nao_conta_duas_vezes(self):
+        with mock.patch.object(self.redis, 'delete', side_effect=ConnectionError('caiu')):
+            with self.assertRaises(ConnectionError):
+                descarregar_visualizacoes()
+        self.assertEqual(self._visualizacoes(), 3)
+        self.assertEqual(len(self._lotes()), 1)
+
+        registrar_visualizacao(self.publicacao.id)
+        descarregar_visualizacoes()
+        self.assertEqual(self._visualizacoes(), 4)
+        self.assertEqual(self._lotes(), [])
+
+    def test_queda_antes_do_banco_repete_o_lote(self):
+        with mock.patch('blog.visualizacoes._somar', side_effect=ConnectionError('caiu')):
+            with self.assertRaises(ConnectionError):
+                descarregar_visualizacoes()
+        self.assertEqual(self._visualizacoes(), 0)
+        self.assertFalse(DescargaVisualizacoes.objects.exists())
+
+        self.assertEqual(descarregar_visualizacoes(), 1)
+        self.assertEqual(self._visualizacoes(), 3)
+        self.assertEqual(self._lotes(), [])
+
+    def test_outra_descarga_em_curso(self):
+        self.redis.set(CHAVE_BLOQUEIO, 'outro-worker')
+        self.assertEqual(descarregar_visualizacoes(), 0)
+        self.assertEqual(int(self.redis.hget(CHAVE_REDIS, self.publicacao.id)), 3)
+        self.assertEqual(self._visualizacoes(), 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReacoesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = get_user_model().objects.create_user(
+            username='leitor', email='leitor@teste.com', password='senha', nome='Leitor'
+        )
+        categoria = Categoria.objects.create(nome='Novidades', slug='novidades')
+        self.publicacao = Publicacao.objects.create(
+            titulo='Novo menu', slug='novo-menu', conteudo='...', resumo='...',
+            autor=self.usuario, categoria=categoria, publicado=True,
+        )
+        self.client.force_login(self.usuario)
+
+    def test_toggle_json_atualiza_contador(self):
+        url = reverse('like_publicacao', args=[self.publicacao.id])
+
+        resposta = self.client.post(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(resposta.json(), {'ativa': True, 'total': 1})
+        resposta = self.client.post(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(resposta.json(), {'ativa': False, 'total': 0})
+
+        # Sem JavaScript: redirect para a publicação
+        resposta = self.client.post(reverse('adorar_publicacao', args=[self.publicacao.id]))
+        self.assertRedirects(resposta, self.publicacao.get_absolute_url(), fetch_redirect_response=False)
+        self.publicacao.refresh_from_db()
+        self.assertEqual((self.publicacao.num_likes, self.publicacao.num_adores), (0, 1))
+
+    def test_comentarios_contados_e_reconciliacao(self):
+        comentario = Comentario.objects.create(publicacao=self.publicacao, autor=self.usuario, texto='Bom!')
+        Comentario.objects.create(publicacao=self.publicacao, autor=self.usuario, texto='Ótimo!')
+        comentario.delete()
+        self.publicacao.refresh_from_db()
+        self.assertEqual(self.publicacao.total_comentarios(), 1)
+
+        # Like feito por fora dos toggles: só a reconciliação o conta
+        self.publicacao.likes.add(self.usuario)
+        saida = StringIO()
+        call_command('reconciliar_contadores_blog', stdout=saida)
+        self.assertIn('1 linhas corrigidas', saida.getvalue())
+        self.publicacao.refresh_from_db()
+        self.assertEqual(self.publicacao.total_likes(), 1)
+
+    def _consultas_da_pagina(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(self.publicacao.get_absolute_url()).status_code, 200)
+        return len(consultas)
+
+    def test_consultas_da_pagina_nao_crescem_com_comentarios(self):
+        Comentario.objects.create(publicacao=self.publicacao, autor=self.usuario, texto='Bom!')
+        self._consultas_da_pagina()
+        antes = self._consultas_da_pagina()
+
+        for texto in ('Ótimo!', 'Excelente!'):
+            comentario = Comentario.objects.create(publicacao=self.publicacao, autor=self.usuario, texto=texto)
+            comentario.likes.add(self.usuario)
+        self.assertEqual(self._consultas_da_pagina(), antes)
@@ -10,6 +10,7 @@ urlpatterns = [
     path('publicacao/<int:pk>/', views.DetalhesPublicacaoView.as_view(), name='detalhes_publicacao'),
     
     # ✅ MODIFICADO: Usando ID em vez de slug
+    path('publicacao/<int:publicacao_id>/visualizacao/', views.registrar_visualizacao, name='registrar_visualizacao'),
     path('publicacao/<int:publicacao_id>/comentar/', views.adicionar_comentario, name='adicionar_comentario'),
     path('publicacao/<int:publicacao_id>/like/', views.like_publicacao, name='like_publicacao'),
     path('publicacao/<int:publicacao_id>/adorar/', views.adorar_publicacao, name='adorar_publicacao'),
@@ -1,15 +1,21 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.db.models import Q
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.cache import cache_page, never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.views.decorators.vary import vary_on_cookie
 from functools import wraps  # ✅ ADICIONE ESTA IMPORT
 
-from .models import Publicacao, Comentario, Categoria, Avaliacao
+from . import reacoes, visualizacoes
+from .models import Publicacao, Comentario, Categoria, Avaliacao, get_publicacoes_populares
+from .visualizacoes import ids_publicados
 from .forms import ComentarioForm, AvaliacaoForm
+from index.invalidacao import invalidar
 
 # Cache para lista de publicações - 15 minutos
 @method_decorator(cache_page(60 * 15), name='dispatch')
@@ -41,9 +47,8 @@ class ListaPublicacoesView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categorias'] = Categoria.objects.all()
-        context['publicacoes_populares'] = Publicacao.objects.filter(
-            publicado=True
-        ).order_by('-visualizacoes')[:5]
+        # Recalculadas periodicamente (ver blog/visualizacoes.py)
+        context['publicacoes_populares'] = get_publicacoes_populares(5)
         return context
 
 # Cache para detalhes da publicação - 10 minutos
@@ -61,19 +66,16 @@ class DetalhesPublicacaoView(DetailView):
         context = super().get_context_data(**kwargs)
         publicacao = self.object
         
-        # Incrementar visualizações - não cacheado
-        publicacao.incrementar_visualizacao()
+        # A visualização é registada pelo browser (registrar_visualizacao), fora do cache da página
         
-        context['comentarios'] = publicacao.comentarios.all()
+        context['comentarios'] = publicacao.comentarios.select_related('autor')
         context['comentario_form'] = ComentarioForm()
         context['avaliacao_form'] = AvaliacaoForm()
         
         context['postagens_relacionadas'] = publicacao.get_postagens_relacionadas()
         
         # Estatísticas
-        context['postagens_populares'] = Publicacao.objects.filter(
-            publicado=True
-        ).order_by('-visualizacoes')[:5]
+        context['postagens_populares'] = get_publicacoes_populares(5)
         
         context['postagens_recentes'] = Publicacao.objects.filter(
             publicado=True
@@ -81,11 +83,19 @@ class DetalhesPublicacaoView(DetailView):
         
         context['postagens_mais_comentadas'] = Publicacao.objects.filter(
             publicado=True
-        ).annotate(
-            total_coments=Count('comentarios')
-        ).order_by('-total_coments')[:5]
+        ).order_by('-num_comentarios')[:5]
         
+        # Contagens vêm das colunas; do usuário só se lê o que ele marcou
+        context['curtiu_publicacao'] = context['adorou_publicacao'] = False
+        context['comentarios_curtidos'] = set()
         if self.request.user.is_authenticated:
+            usuario = self.request.user
+            context['curtiu_publicacao'] = publicacao.likes.filter(pk=usuario.pk).exists()
+            context['adorou_publicacao'] = publicacao.adores.filter(pk=usuario.pk).exists()
+            context['comentarios_curtidos'] = set(Comentario.likes.through.objects.filter(
+                comentario__publicacao=publicacao, usuario=usuario
+            ).values_list('comentario_id', flat=True))
+
             try:
                 context['avaliacao_usuario'] = Avaliacao.objects.get(
                     publicacao=publicacao,
@@ -96,6 +106,16 @@ class DetalhesPublicacaoView(DetailView):
         
         return context
 
+# SEM CACHE - contador de visualizações (sendBeacon da página de detalhe)
+@csrf_exempt
+@require_POST
+@never_cache
+def registrar_visualizacao(request, publicacao_id):
+    """Soma uma visualização no Redis; ids que não estão publicados são ignorados"""
+    if publicacao_id in ids_publicados():
+        visualizacoes.registrar_visualizacao(publicacao_id)
+    return HttpResponse(status=204)
+
 # Views que modificam dados - SEM CACHE
 @login_required
 def adicionar_comentario(request, publicacao_id):
@@ -110,9 +130,8 @@ def adicionar_comentario(request, publicacao_id):
             comentario.save()
             
             # Invalidar cache da página de detalhes
-            from django.core.cache import cache
             cache_key = f"detalhes_publicacao_{publicacao.id}"
-            cache.delete(cache_key)
+            invalidar(cache_key)
             
             messages.success(request, 'Comentário adicionado com sucesso! Aguarde aprovação.')
         else:
@@ -120,60 +139,37 @@ def adicionar_comentario(request, publicacao_id):
     
     return redirect('detalhes_publicacao', pk=publicacao.id)
 
+def _resposta_reacao(request, reacao, objeto_id, publicacao_id, mensagens):
+    """Alterna a reação; JSON para o AJAX (js/reacoes.js), redirect sem JavaScript"""
+    ativa, total = reacoes.alternar(reacao, objeto_id, request.user)
+    if request.headers.get('Accept', '').startswith('application/json'):
+        return JsonResponse({'ativa': ativa, 'total': total})
+    if ativa:
+        messages.success(request, mensagens[0])
+    else:
+        messages.info(request, mensagens[1])
+    return redirect('detalhes_publicacao', pk=publicacao_id)
+
 @login_required
+@require_POST
 def like_comentario(request, comentario_id):
-    comentario = get_object_or_404(Comentario, id=comentario_id)
-    publicacao = comentario.publicacao
-    
-    if comentario.likes.filter(id=request.user.id).exists():
-        comentario.likes.remove(request.user)
-        messages.info(request, 'Like removido do comentário!')
-    else:
-        comentario.likes.add(request.user)
-        messages.success(request, 'Comentário curtido!')
-    
-    # Invalidar cache
-    from django.core.cache import cache
-    cache_key = f"detalhes_publicacao_{publicacao.id}"
-    cache.delete(cache_key)
-    
-    return redirect('detalhes_publicacao', pk=publicacao.id)
+    comentario = get_object_or_404(Comentario.objects.only('id', 'publicacao_id'), id=comentario_id)
+    return _resposta_reacao(request, 'like_comentario', comentario.id, comentario.publicacao_id,
+                            ('Comentário curtido!', 'Like removido do comentário!'))
 
 @login_required
+@require_POST
 def like_publicacao(request, publicacao_id):
-    publicacao = get_object_or_404(Publicacao, id=publicacao_id, publicado=True)
-    
-    if publicacao.likes.filter(id=request.user.id).exists():
-        publicacao.likes.remove(request.user)
-        messages.info(request, 'Like removido!')
-    else:
-        publicacao.likes.add(request.user)
-        messages.success(request, 'Publicação curtida!')
-    
-    # Invalidar cache
-    from django.core.cache import cache
-    cache_key = f"detalhes_publicacao_{publicacao.id}"
-    cache.delete(cache_key)
-    
-    return redirect('detalhes_publicacao', pk=publicacao.id)
+    publicacao = get_object_or_404(Publicacao.objects.only('id'), id=publicacao_id, publicado=True)
+    return _resposta_reacao(request, 'like_publicacao', publicacao.id, publicacao.id,
+                            ('Publicação curtida!', 'Like removido!'))
 
 @login_required
+@require_POST
 def adorar_publicacao(request, publicacao_id):
-    publicacao = get_object_or_404(Publicacao, id=publicacao_id, publicado=True)
-    
-    if publicacao.adores.filter(id=request.user.id).exists():
-        publicacao.adores.remove(request.user)
-        messages.info(request, 'Adoro removido!')
-    else:
-        publicacao.adores.add(request.user)
-        messages.success(request, 'Você adorou esta publicação!')
-    
-    # Invalidar cache
-    from django.core.cache import cache
-    cache_key = f"detalhes_publicacao_{publicacao.id}"
-    cache.delete(cache_key)
-    
-    return redirect('detalhes_publicacao', pk=publicacao.id)
+    publicacao = get_object_or_404(Publicacao.objects.only('id'), id=publicacao_id, publicado=True)
+    return _resposta_reacao(request, 'adorar_publicacao', publicacao.id, publicacao.id,
+                            ('Você adorou esta publicação!', 'Adoro removido!'))
 
 @login_required
 def avaliar_publicacao(request, publicacao_id):
@@ -193,9 +189,8 @@ def avaliar_publicacao(request, publicacao_id):
                 avaliacao.save()
             
             # Invalidar cache
-            from django.core.cache import cache
             cache_key = f"detalhes_publicacao_{publicacao.id}"
-            cache.delete(cache_key)
+            invalidar(cache_key)
             
             messages.success(request, f'Avaliação de {avaliacao.nota} estrelas registrada!')
         else:
@@ -226,12 +221,11 @@ def cache_com_invalidacao(timeout, key_prefix):
 # Função para invalidar cache manualmente quando necessário
 def invalidar_cache_publicacoes():
     """Invalidar todo o cache relacionado a publicações"""
-    from django.core.cache import cache
-    cache.delete_many([
+    invalidar(
         'lista_publicacoes',
         'categorias_publicacoes',
         'publicacoes_populares'
-    ])
+    )
 
 # Exemplo de uso do decorator personalizado (opcional)
 @cache_com_invalidacao(60 * 10, 'minha_view_cache')  # 10 minutos
@@ -0,0 +1,136 @@
+# blog/visualizacoes.py
+"""
+Contagem de visualizações das publicações.
+
+A página de detalhe fica em cache (cache_page), por isso a visualização é
+registada pelo browser num pedido à parte (`js/visualizacao.js`, via
+sendBeacon) e não ao renderizar. Cada registo é um HINCRBY num hash do
+Redis (`blog:visualizacoes`, campo = id da publicação).
+
+A tarefa `descarregar_visualizacoes_blog` corre com um bloqueio no Redis
+(duas execuções não descarregam ao mesmo tempo). Num MULTI lê o hash e
+muda-lhe o nome para uma cópia com nome único (`...:lote:<uuid>`), que
+fica até o lote estar gravado. As contagens vão para o banco com um UPDATE
+... SET visualizacoes = visualizacoes + n por publicação, sem save(): não
+muda data_atualizacao nem invalida caches. Na mesma transação regista-se o
+lote (DescargaVisualizacoes): se a descarga cair depois do commit, a cópia
+que ficou é apagada na execução seguinte sem ser contada outra vez; se
+cair antes, é gravada nessa altura.
+
+As listas de publicações populares são recalculadas pela tarefa
+`atualizar_publicacoes_populares` e regravadas no cache, em vez de
+apagadas a cada visualização.
+
+Sem Redis, cada visualização é logo um UPDATE com F().
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from redis.exceptions import LockError
+
+from index.conexao_redis import obter_redis
+
+from .models import DescargaVisualizacoes, Publicacao, get_publicacoes_populares
+
+logger = logging.getLogger(__name__)
+
+CHAVE_REDIS = 'blog:visualizacoes'
+PREFIXO_LOTE = f'{CHAVE_REDIS}:lote:'
+CHAVE_BLOQUEIO = f'{CHAVE_REDIS}:bloqueio'
+TEMPO_BLOQUEIO = 60 * 5  # 5 minutos; libertado no fim de cada descarga
+# Lotes gravados guardados por este tempo (bem mais do que o intervalo da tarefa)
+RETENCAO_LOTES = timedelta(days=7)
+# Limites das listas de populares usadas nas páginas
+LIMITES_POPULARES = (5,)
+
+
+def ids_publicados():
+    """Ids das publicações publicadas (para ignorar ids inventados), com cache"""
+    ids = cache.get('blog_ids_publicados')
+    if ids is None:
+        ids = frozenset(Publicacao.objects.filter(publicado=True).values_list('id', flat=True))
+        cache.set('blog_ids_publicados', ids, 60 * 60)  # 1 hora
+    return ids
+
+
+def _somar(contagens):
+    """Grava {publicacao_id: n} no banco, um UPDATE por publicação"""
+    with transaction.atomic():
+        for publicacao_id, delta in contagens.items():
+            Publicacao.objects.filter(pk=publicacao_id).update(visualizacoes=F('visualizacoes') + delta)
+
+
+def registrar_visualizacao(publicacao_id):
+    """Conta uma visualização (Redis; sem Redis, direto no banco)"""
+    cliente = obter_redis()
+    if cliente is not None:
+        try:
+            cliente.hincrby(CHAVE_REDIS, publicacao_id, 1)
+            return
+        except Exception as e:
+            logger.warning(f"Falha ao registar a visualização no Redis: {e}")
+    _somar({publicacao_id: 1})
+
+
+def _gravar_lote(cliente, copia, contagens):
+    """Grava a cópia `copia` uma única vez e apaga-a. Retorna as publicações atualizadas."""
+    lote = copia[len(PREFIXO_LOTE):]
+    contagens = {int(publicacao_id): int(delta) for publicacao_id, delta in contagens.items()}
+    with transaction.atomic():
+        _, novo = DescargaVisualizacoes.objects.get_or_create(lote=lote)
+        if novo:
+            _somar(contagens)
+    cliente.delete(copia)
+    return len(contagens) if novo else 0
+
+
+def descarregar_visualizacoes():
+    """
+    Grava no banco as visualizações acumuladas no Redis. Retorna o número
+    de publicações atualizadas (0 se outra descarga estiver a correr).
+    """
+    cliente = obter_redis()
+    if cliente is None:
+        return 0
+
+    bloqueio = cliente.lock(CHAVE_BLOQUEIO, timeout=TEMPO_BLOQUEIO, blocking=False)
+    if not bloqueio.acquire():
+        return 0
+    try:
+        total = 0
+        # Cópias de descargas que caíram a meio
+        for copia in cliente.scan_iter(match=f'{PREFIXO_LOTE}*'):
+            copia = copia.decode() if isinstance(copia, bytes) else copia
+            total += _gravar_lote(cliente, copia, cliente.hgetall(copia))
+
+        # Com o bloqueio, entre o EXISTS e o RENAME o hash só pode crescer
+        if cliente.exists(CHAVE_REDIS):
+            copia = f'{PREFIXO_LOTE}{uuid.uuid4().hex}'
+            pipe = cliente.pipeline(transaction=True)
+            pipe.hgetall(CHAVE_REDIS)
+            pipe.rename(CHAVE_REDIS, copia)
+            contagens, _ = pipe.execute()
+            total += _gravar_lote(cliente, copia, contagens)
+
+        DescargaVisualizacoes.objects.filter(data__lt=timezone.now() - RETENCAO_LOTES).delete()
+    finally:
+        try:
+            bloqueio.release()
+        except LockError:
+            # Expirou a meio: o registo dos lotes evita contar duas vezes
+            logger.warning("Bloqueio da descarga de visualizações expirou antes do fim")
+
+    if total:
+        logger.info(f"Visualizações gravadas: {total} publicações")
+    return total
+
+
+def atualizar_populares():
+    """Recalcula e regrava no cache as listas de publicações populares"""
+    for limite in LIMITES_POPULARES:
+        get_publicacoes_populares(limite, atualizar=True)
@@ -1,6 +1,13 @@
-from django.contrib import admin
-from django.utils.safestring import mark_safe
-from .models import Carrinho, ItemCarrinho, PedidoEntrega
+from django.contrib import admin, messages
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.template.loader import render_to_string
+from index.invalidacao import versao_tag
+from menu.models import TAG_CATALOGO
+from .models import (
+    Carrinho, ItemCarrinho, ItemPedidoArquivado, PedidoArquivado, PedidoEntrega, PedidoEvento,
+    PedidoEventoArquivado,
+)
+from .transicoes import TransicaoInvalida, transicionar, transicionar_em_lote
 
 class EstadoCarrinhoFilter(admin.SimpleListFilter):
     title = 'Estado do Carrinho'
@@ -89,13 +96,27 @@ class ItemCarrinhoPedidoInline(admin.TabularInline):
     def has_delete_permission(self, request, obj=None):
         return False
 
+class PedidoEventoInline(admin.TabularInline):
+    """Histórico de mudanças de estado (somente leitura)"""
+    model = PedidoEvento
+    extra = 0
+    can_delete = False
+    readonly_fields = ('data_evento', 'estado_anterior', 'estado_novo', 'usuario', 'observacao')
+    fields = readonly_fields
+    
+    def has_add_permission(self, request, obj):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Carrinho)
 class CarrinhoAdmin(admin.ModelAdmin):
     list_filter = (EstadoCarrinhoFilter, 'data_criacao')
-    list_display = ('id', 'usuario', 'estado', 'total_itens', 'subtotal_display', 'taxa_entrega_display', 'total_display', 'data_criacao')
+    list_display = ('id', 'usuario', 'estado', 'total_itens_display', 'subtotal_display', 'taxa_entrega_display', 'total_display', 'data_criacao')
     list_filter = ('estado', 'data_criacao')
     search_fields = ('usuario__email', 'usuario__nome')
-    readonly_fields = ('data_criacao', 'data_atualizacao', 'subtotal_display', 'taxa_entrega_display', 'total_display', 'total_itens')
+    readonly_fields = ('data_criacao', 'data_atualizacao', 'subtotal_display', 'taxa_entrega_display', 'total_display', 'total_itens_display')
     inlines = [ItemCarrinhoInline]  # Aqui funciona porque Carrinho tem relação direta com ItemCarrinho
     list_per_page = 20
     
@@ -104,7 +125,7 @@ class CarrinhoAdmin(admin.ModelAdmin):
             'fields': ('usuario', 'estado')
         }),
         ('Resumo Financeiro', {
-            'fields': ('total_itens', 'subtotal_display', 'taxa_entrega_display', 'total_display')
+            'fields': ('total_itens_display', 'subtotal_display', 'taxa_entrega_display', 'total_display')
         }),
         ('Datas', {
             'fields': ('data_criacao', 'data_atualizacao'),
@@ -112,20 +133,25 @@ class CarrinhoAdmin(admin.ModelAdmin):
         }),
     )
     
+    # Valores vindos das anotações de com_totais(): nenhuma consulta por linha
+    @admin.display(description='Total de Itens', ordering='qtd_itens')
+    def total_itens_display(self, obj):
+        return obj.qtd_itens
+    
+    @admin.display(description='Subtotal', ordering='valor_subtotal')
     def subtotal_display(self, obj):
-        return f"KZ {obj.subtotal:.2f}"
-    subtotal_display.short_description = 'Subtotal'
+        return f"KZ {obj.valor_subtotal:.2f}"
     
+    @admin.display(description='Taxa de Entrega', ordering='valor_taxa')
     def taxa_entrega_display(self, obj):
-        return f"KZ {obj.taxa_entrega:.2f}"
-    taxa_entrega_display.short_description = 'Taxa de Entrega'
+        return f"KZ {obj.valor_taxa:.2f}"
     
+    @admin.display(description='Total', ordering='valor_total')
     def total_display(self, obj):
-        return f"KZ {obj.total:.2f}"
-    total_display.short_description = 'Total'
+        return f"KZ {obj.valor_total:.2f}"
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('usuario').prefetch_related('itens__produto')
+        return super().get_queryset(request).select_related('usuario').com_totais()
 
 @admin.register(PedidoEntrega)
 class PedidoEntregaAdmin(admin.ModelAdmin):
@@ -134,7 +160,9 @@ class PedidoEntregaAdmin(admin.ModelAdmin):
     search_fields = ('carrinho__usuario__email', 'carrinho__usuario__nome', 'endereco_entrega')
     readonly_fields = ('data_solicitacao', 'data_atualizacao', 'total_pedido_display', 'resumo_itens', 'lista_itens_detalhada')
     list_editable = ('estado', 'notificado_admin')
+    raw_id_fields = ('carrinho',)
     # REMOVA o inline problemático e use métodos personalizados
+    inlines = [PedidoEventoInline]
     list_per_page = 20
     
     fieldsets = (
@@ -158,159 +186,127 @@ class PedidoEntregaAdmin(admin.ModelAdmin):
     carrinho_usuario.short_description = 'Cliente'
     carrinho_usuario.admin_order_field = 'carrinho__usuario__email'
     
+    @admin.display(description='Total', ordering='valor_total')
     def total_pedido(self, obj):
-        return f"KZ {obj.carrinho.total:.2f}"
-    total_pedido.short_description = 'Total'
+        return f"KZ {obj.valor_total:.2f}"
+    
+    def _renderizar(self, template, obj):
+        """Renderiza um bloco do formulário a partir de fragmento em cache"""
+        def itens():
+            # Só consultados quando o fragmento não está em cache
+            if not hasattr(obj, '_itens_admin'):
+                obj._itens_admin = list(
+                    obj.carrinho.itens.select_related('produto').annotate(
+                        valor=ExpressionWrapper(
+                            F('quantidade') * F('produto__preco'),
+                            output_field=DecimalField(max_digits=12, decimal_places=2)
+                        )
+                    ).order_by('data_adicao')
+                )
+            return obj._itens_admin
+        
+        return render_to_string(f'admin/carinho/pedidoentrega/{template}', {
+            'pedido': obj,
+            'itens': itens,
+            # Muda quando o pedido ou qualquer produto do catálogo muda
+            'versao': f"{obj.data_atualizacao:%Y%m%d%H%M%S%f}-{versao_tag(TAG_CATALOGO)}",
+        })
     
+    @admin.display(description='Resumo Financeiro')
     def total_pedido_display(self, obj):
-        carrinho = obj.carrinho
-        html = f"""
-        <div style="background: #f8f9fa;color:black; padding: 15px; border-radius: 5px; border-left: 4px solid #007bff;">
-            <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 10px;">
-                <div style="font-size: 18px;">
-                    <strong>Subtotal:</strong><br>
-                    <strong>Taxa de Entrega:</strong><br>
-                    <strong style="font-size: 20px;">Total Final:</strong>
-                </div>
-                <div style="font-size: 18px; text-align: right;">
-                    KZ {carrinho.subtotal:.2f}<br>
-                    KZ {carrinho.taxa_entrega:.2f}<br>
-                    <strong style="font-size: 20px; color: #28a745;">KZ {carrinho.total:.2f}</strong>
-                </div>
-            </div>
-        </div>
-        """
-        return mark_safe(html)
-    total_pedido_display.short_description = 'Resumo Financeiro'
-
+        return self._renderizar('resumo_financeiro.html', obj)
+    
+    @admin.display(description='Itens do Pedido (Resumo)')
     def resumo_itens(self, obj):
-        itens = obj.carrinho.itens.all()
-        html = '<div style="background: #f8f9fa; color:black; padding: 15px; border-radius: 5px; max-height: 300px; overflow-y: auto;">'
-        
-        for item in itens:
-            html += f"""
-            <div style="font-size: 20px; color:black; border-bottom: 1px solid #dee2e6; padding: 10px 0; margin-bottom: 8px;">
-                <div style="display: flex; justify-content: space-between; align-items: start;">
-                    <div style="flex: 1;">
-                        <strong style="color: black;">{item.produto.nome}</strong><br>
-                        <small style="font-size: 18px; color:black;">SKU: {getattr(item.produto, 'sku', 'N/A')}</small>
-                    </div>
-                    <div style="text-align: right;">
-                        <span style="background: #007bff; color: black; padding: 2px 8px; border-radius: 12px; font-size: 18px;">
-                            {item.quantidade}x
-                        </span><br>
-                        <small style="font-size: 18px; color: black;">KZ {item.subtotal:.2f}</small>
-                    </div>
-                </div>
-                <div style="font-size: 17px; color: #28a745; margin-top: 5px;">
-                    KZ {item.produto.preco:.2f} cada
-                </div>
-            </div>
-            """
-        
-        html += f"""
-        <div style="font-size: 20px; margin-top: 15px; padding-top: 15px; border-top: 2px solid #007bff; background: white; padding: 10px; border-radius: 4px;">
-            <div style="display: flex; justify-content: space-between; font-weight: bold;">
-                <span>Total de itens:</span>
-                <span style="color: #007bff;">{obj.carrinho.total_itens}</span>
-            </div>
-        </div>
-        """
-        html += '</div>'
-        return mark_safe(html)
-    resumo_itens.short_description = 'Itens do Pedido (Resumo)'
-
+        return self._renderizar('resumo_itens.html', obj)
+    
+    @admin.display(description='Itens do Pedido (Detalhado)')
     def lista_itens_detalhada(self, obj):
-        itens = obj.carrinho.itens.all().select_related('produto')
-        html = '''
-        <div style="font-size: 20px; background: white; color:black; border: 1px solid #dee2e6; border-radius: 5px; overflow: hidden;">
-            <table style="width: 100%; border-collapse: collapse; font-size: 14px;">
-                <thead style="background: #343a40; color: white;">
-                    <tr>
-                        <th style="padding: 17px; text-align: left; border-bottom: 1px solid #454d55;">Produto</th>
-                        <th style="padding: 17px; text-align: center; border-bottom: 1px solid #454d55;">Qtd</th>
-                        <th style="padding: 17px; text-align: right; border-bottom: 1px solid #454d55;">Preço Unit.</th>
-                        <th style="padding: 17px; text-align: right; border-bottom: 1px solid #454d55;">Subtotal</th>
-                    </tr>
-                </thead>
-                <tbody>
-        '''
-        
-        for i, item in enumerate(itens):
-            row_bg = '#f8f9fa' if i % 2 == 0 else 'white'
-            html += f'''
-            <tr style="background: {row_bg};">
-                <td style="font-size: 17px;padding: 10px; border-bottom: 1px solid #dee2e6;">
-                    <strong>{item.produto.nome}</strong>
-                    <br><small style="color: #6c757d;">ID: {item.produto.id}</small>
-                </td>
-                <td style="padding: 10px; text-align: center; border-bottom: 1px solid #dee2e6;">
-                    <span style="background: #6c757d; color: white; padding: 4px 8px; border-radius: 4px; font-weight: bold;">
-                        {item.quantidade}
-                    </span>
-                </td>
-                <td style="font-size: 17px; padding: 10px; text-align: right; border-bottom: 1px solid #dee2e6;">
-                    KZ {item.produto.preco:.2f}
-                </td>
-                <td style="font-size: 17px; padding: 10px; text-align: right; border-bottom: 1px solid #dee2e6;">
-                    <strong>KZ {item.subtotal:.2f}</strong>
-                </td>
-            </tr>
-            '''
-        
-        # Linhas de totais
-        html += f'''
-                </tbody>
-                <tfoot>
-                    <tr style="font-size: 20px; background: #e9ecef;">
-                        <td colspan="2" style="padding: 12px; border-top: 2px solid #dee2e6;"></td>
-                        <td style="font-size: 20px; padding: 12px; text-align: right; border-top: 2px solid #dee2e6;">
-                            <strong>Subtotal:</strong>
-                        </td>
-                        <td style="font-size: 20px; padding: 12px; text-align: right; border-top: 2px solid #dee2e6;">
-                            <strong>KZ {obj.carrinho.subtotal:.2f}</strong>
-                        </td>
-                    </tr>
-                    <tr style="background: #e9ecef;">
-                        <td colspan="2" style="padding: 12px;"></td>
-                        <td style="font-size: 20px; padding: 12px; text-align: right;">
-                            <strong>Taxa de Entrega:</strong>
-                        </td>
-                        <td style="font-size: 20px; padding: 12px; text-align: right;">
-                            <strong>KZ {obj.carrinho.taxa_entrega:.2f}</strong>
-                        </td>
-                    </tr>
-                    <tr style="background: #28a745; color: white;">
-                        <td colspan="2" style="padding: 15px; border-top: 2px solid #1e7e34;"></td>
-                        <td style="font-size: 20px; padding: 15px; text-align: right; border-top: 2px solid #1e7e34;">
-                            <strong style="font-size: 16px;">TOTAL:</strong>
-                        </td>
-                        <td style="font-size: 20px; padding: 15px; text-align: right; border-top: 2px solid #1e7e34;">
-                            <strong style="font-size: 16px;">KZ {obj.carrinho.total:.2f}</strong>
-                        </td>
-                    </tr>
-                </tfoot>
-            </table>
-        </div>
-        '''
-        return mark_safe(html)
-    lista_itens_detalhada.short_description = 'Itens do Pedido (Detalhado)'
+        return self._renderizar('itens_detalhados.html', obj)
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
             'carrinho__usuario'
-        ).prefetch_related(
-            'carrinho__itens__produto'
-        )
+        ).com_totais()
+    
+    def save_model(self, request, obj, form, change):
+        """Mudanças de estado feitas no admin passam pela máquina de estados"""
+        if change and 'estado' in form.changed_data:
+            novo_estado = obj.estado
+            obj.estado = form.initial['estado']
+            super().save_model(request, obj, form, change)
+            try:
+                transicionar(obj, novo_estado, usuario=request.user)
+            except TransicaoInvalida as e:
+                self.message_user(request, str(e), messages.ERROR)
+        else:
+            super().save_model(request, obj, form, change)
     
-    actions = ['marcar_como_notificado', 'marcar_como_entregue']
+    actions = [
+        'marcar_como_notificado',
+        'marcar_como_confirmado',
+        'marcar_em_preparacao',
+        'marcar_como_despachado',
+        'marcar_como_entregue',
+    ]
     
     def marcar_como_notificado(self, request, queryset):
         updated = queryset.update(notificado_admin=True)
         self.message_user(request, f'{updated} pedido(s) marcado(s) como notificado(s).')
     marcar_como_notificado.short_description = "Marcar como notificado"
     
+    def _transicionar_selecionados(self, request, queryset, novo_estado, descricao):
+        atualizados, ignorados = transicionar_em_lote(queryset, novo_estado, usuario=request.user)
+        self.message_user(request, f'{atualizados} pedido(s) marcado(s) como {descricao}.')
+        if ignorados:
+            self.message_user(
+                request,
+                f'{ignorados} pedido(s) ignorado(s): transição para "{novo_estado}" não permitida.',
+                messages.WARNING
+            )
+    
+    def marcar_como_confirmado(self, request, queryset):
+        self._transicionar_selecionados(request, queryset, 'confirmado', 'confirmado(s)')
+    marcar_como_confirmado.short_description = "Marcar como confirmado"
+    
+    def marcar_em_preparacao(self, request, queryset):
+        self._transicionar_selecionados(request, queryset, 'preparacao', 'em preparação')
+    marcar_em_preparacao.short_description = "Marcar como em preparação"
+    
+    def marcar_como_despachado(self, request, queryset):
+        self._transicionar_selecionados(request, queryset, 'despachado', 'despachado(s)')
+    marcar_como_despachado.short_description = "Marcar como despachado"
+    
     def marcar_como_entregue(self, request, queryset):
-        updated = queryset.update(estado='entregue')
-        self.message_user(request, f'{updated} pedido(s) marcado(s) como entregue(s).')
-    marcar_como_entregue.short_description = "Marcar como entregue"
\ No newline at end of file
+        self._transicionar_selecionados(request, queryset, 'entregue', 'entregue(s)')
+    marcar_como_entregue.short_description = "Marcar como entregue"
+
+class ItemPedidoArquivadoInline(admin.TabularInline):
+    model = ItemPedidoArquivado
+    extra = 0
+    can_delete = False
+    fields = ('nome_produto', 'quantidade', 'preco_unitario', 'valor', 'data_adicao')
+    readonly_fields = fields
+
+class PedidoEventoArquivadoInline(admin.TabularInline):
+    model = PedidoEventoArquivado
+    extra = 0
+    can_delete = False
+    fields = ('data_evento', 'estado_anterior', 'estado_novo', 'usuario', 'observacao')
+    readonly_fields = fields
+
+@admin.register(PedidoArquivado)
+class PedidoArquivadoAdmin(admin.ModelAdmin):
+    """Arquivo de pedidos antigos: só leitura"""
+    list_display = ('id', 'numero_pedido', 'usuario', 'estado', 'data_solicitacao', 'valor_total', 'data_arquivo')
+    list_filter = ('estado', 'data_solicitacao')
+    search_fields = ('numero_pedido', 'usuario__username', 'usuario__email')
+    date_hierarchy = 'data_solicitacao'
+    list_select_related = ('usuario',)
+    inlines = [ItemPedidoArquivadoInline, PedidoEventoArquivadoInline]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
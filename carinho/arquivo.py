@@ -0,0 +1,190 @@
+# carinho/arquivo.py
+"""
+Arquivo de pedidos antigos.
+
+Pedidos entregues ou cancelados há mais de `ARQUIVO_PEDIDOS_MESES` meses
+saem de PedidoEntrega/Carrinho/ItemCarrinho/PedidoEvento para
+PedidoArquivado/ItemPedidoArquivado/PedidoEventoArquivado, em lotes, cada
+um na sua transação. Os eventos são o registo de auditoria: mudam de
+tabela com o mesmo id, nunca se perdem.
+As tabelas quentes ficam só com o que as filas, contagens e filtros por
+estado realmente usam.
+
+Quem lê por intervalo de datas (histórico do cliente, relatórios) só junta
+o arquivo quando o intervalo começa antes de `data_limite_arquivo()`: todos
+os pedidos arquivados são mais antigos do que essa data.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from index.invalidacao import agrupar_invalidacoes, invalidar
+
+from .models import (
+    Carrinho, ItemCarrinho, ItemPedidoArquivado, PedidoArquivado,
+    PedidoEntrega, PedidoEvento, PedidoEventoArquivado,
+)
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_ARQUIVAVEIS = ['entregue', 'cancelado']
+TAMANHO_LOTE = 500
+
+
+def data_limite_arquivo():
+    """Pedidos solicitados antes desta data podem estar no arquivo"""
+    meses = getattr(settings, 'ARQUIVO_PEDIDOS_MESES', 6)
+    return timezone.now() - timedelta(days=30 * meses)
+
+
+def arquivo_necessario(inicio):
+    """Indica se um intervalo que começa em `inicio` (None = sem início) chega ao arquivo"""
+    return inicio is None or inicio < data_limite_arquivo()
+
+
+def arquivar_pedidos(lote=TAMANHO_LOTE, max_lotes=None):
+    """
+    Move para o arquivo, em lotes de `lote` pedidos, todos os pedidos
+    arquiváveis anteriores ao limite. Retorna {'pedidos': n, 'itens': n}.
+    """
+    limite = data_limite_arquivo()
+    totais = {'pedidos': 0, 'itens': 0}
+    lotes = 0
+
+    while max_lotes is None or lotes < max_lotes:
+        pedidos, itens = _arquivar_lote(limite, lote)
+        lotes += 1
+        totais['pedidos'] += pedidos
+        totais['itens'] += itens
+        if pedidos < lote:
+            break
+
+    if totais['pedidos']:
+        logger.info(f"Arquivados {totais['pedidos']} pedidos e {totais['itens']} itens")
+    return totais
+
+
+@agrupar_invalidacoes()
+def _arquivar_lote(limite, lote):
+    with transaction.atomic():
+        ids = list(
+            PedidoEntrega.objects.filter(
+                estado__in=ESTADOS_ARQUIVAVEIS,
+                data_solicitacao__lt=limite,
+            ).order_by('id').select_for_update(skip_locked=True).values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            return 0, 0
+
+        pedidos = list(
+            PedidoEntrega.objects.filter(pk__in=ids).com_totais().select_related('carrinho')
+        )
+        carrinho_ids = [pedido.carrinho_id for pedido in pedidos]
+        itens_por_carrinho = {}
+        for item in ItemCarrinho.objects.filter(
+            carrinho_id__in=carrinho_ids
+        ).select_related('produto').order_by('data_adicao'):
+            itens_por_carrinho.setdefault(item.carrinho_id, []).append(item)
+
+        arquivados = []
+        itens_arquivados = []
+        for pedido in pedidos:
+            arquivados.append(PedidoArquivado(
+                id=pedido.id,
+                usuario_id=pedido.carrinho.usuario_id,
+                carrinho_id_original=pedido.carrinho_id,
+                numero_pedido=pedido.numero_pedido,
+                endereco_entrega=pedido.endereco_entrega,
+                observacoes=pedido.observacoes,
+                estado=pedido.estado,
+                data_criacao_carrinho=pedido.carrinho.data_criacao,
+                data_solicitacao=pedido.data_solicitacao,
+                data_atualizacao=pedido.data_atualizacao,
+                qtd_itens=pedido.qtd_itens,
+                valor_subtotal=pedido.valor_subtotal,
+                valor_taxa=pedido.valor_taxa,
+                valor_total=pedido.valor_total,
+            ))
+            for item in itens_por_carrinho.get(pedido.carrinho_id, []):
+                itens_arquivados.append(ItemPedidoArquivado(
+                    pedido_id=pedido.id,
+                    produto_id=item.produto_id,
+                    nome_produto=item.produto.nome,
+                    quantidade=item.quantidade,
+                    preco_unitario=item.produto.preco,
+                    valor=item.produto.preco * item.quantidade,
+                    data_adicao=item.data_adicao,
+                ))
+
+        PedidoArquivado.objects.bulk_create(arquivados)
+        ItemPedidoArquivado.objects.bulk_create(itens_arquivados)
+        PedidoEventoArquivado.objects.bulk_create([
+            PedidoEventoArquivado(
+                id=evento.id,
+                pedido_id=evento.pedido_id,
+                estado_anterior=evento.estado_anterior,
+                estado_novo=evento.estado_novo,
+                usuario_id=evento.usuario_id,
+                observacao=evento.observacao,
+                data_evento=evento.data_evento,
+            )
+            for evento in PedidoEvento.objects.filter(pedido_id__in=ids)
+        ], batch_size=lote)
+
+        # As notificações ficam na outbox, só perdem a ligação ao pedido
+        from index.models import NotificacaoEmail
+        NotificacaoEmail.objects.filter(pedido_id__in=ids).update(pedido=None)
+
+        # DELETE direto, sem o collector do ORM: os sinais de cada item/pedido
+        # fariam uma consulta por linha e o cache é invalidado abaixo.
+        _apagar(PedidoEvento, 'pedido_id', ids)
+        _apagar(ItemCarrinho, 'carrinho_id', carrinho_ids)
+        _apagar(PedidoEntrega, 'id', ids)
+        _apagar(Carrinho, 'id', carrinho_ids)
+
+        for pedido in pedidos:
+            invalidar(*pedido.chaves_cache())
+
+    return len(pedidos), len(itens_arquivados)
+
+
+def _apagar(modelo, coluna, valores):
+    tabela = connection.ops.quote_name(modelo._meta.db_table)
+    marcadores = ', '.join(['%s'] * len(valores))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {tabela} WHERE {connection.ops.quote_name(coluna)} IN ({marcadores})',
+            valores
+        )
+        return cursor.rowcount
+
+
+def consulta_arquivo_usuario(usuario):
+    """Pedidos arquivados do usuário com itens, na ordem do histórico"""
+    return PedidoArquivado.objects.filter(usuario=usuario).prefetch_related(
+        Prefetch('itens', queryset=ItemPedidoArquivado.objects.select_related('produto'))
+    ).order_by('-data_solicitacao', '-id')
+
+
+def pedidos_arquivados_no_periodo(inicio, fim):
+    """Pedidos arquivados no intervalo (vazio, sem consulta, se o intervalo não chega ao arquivo)"""
+    if not arquivo_necessario(inicio):
+        return PedidoArquivado.objects.none()
+    return PedidoArquivado.objects.filter(data_solicitacao__range=(inicio, fim))
+
+
+def resumo_arquivo_usuario(usuario):
+    """Totais dos pedidos arquivados do usuário numa só consulta"""
+    return PedidoArquivado.objects.filter(usuario=usuario).aggregate(
+        total_pedidos=Count('id'),
+        pedidos_entregues=Count('id', filter=Q(estado='entregue')),
+        total_gasto=Coalesce(
+            Sum('valor_total', filter=Q(estado='entregue')), Decimal('0.00')
+        ),
+    )
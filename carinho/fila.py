@@ -0,0 +1,123 @@
+# carinho/fila.py
+"""
+Fila de pedidos ativos para a cozinha/expedição.
+
+O cursor de alterações assenta nos ids de `PedidoEvento`, mas o id é
+atribuído no INSERT e não no commit: uma transação mais lenta pode tornar
+visível um id menor do que outros já entregues. Por isso o cursor tem a
+forma "base.id1.id2...": todos os eventos com id <= base já foram vistos, e
+os ids seguintes listados também. Cada leitura relê os eventos acima da
+base (janela de sobreposição) e ignora os já vistos. A base só avança
+sobre eventos com mais de JANELA_ATRASO, tempo que se assume maior do que
+qualquer transação que grave eventos.
+"""
+from datetime import timedelta
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import ItemCarrinho, PedidoEntrega, PedidoEvento
+from .transicoes import ESTADOS_ATIVOS
+
+JANELA_ATRASO = timedelta(minutes=2)
+
+
+def _consulta_fila():
+    """Pedidos com totais anotados e itens pré-carregados (1 consulta + 1 prefetch)"""
+    return PedidoEntrega.objects.com_totais().select_related(
+        'carrinho__usuario'
+    ).prefetch_related(
+        Prefetch(
+            'carrinho__itens',
+            queryset=ItemCarrinho.objects.select_related('produto').only(
+                'carrinho_id', 'quantidade', 'produto__nome', 'produto__preco'
+            ).order_by('data_adicao')
+        )
+    ).order_by('data_solicitacao', 'id')
+
+
+def serializar_pedido(pedido):
+    usuario = pedido.carrinho.usuario
+    return {
+        'id': pedido.id,
+        'numero': pedido.numero_pedido,
+        'estado': pedido.estado,
+        'estado_display': pedido.get_estado_display(),
+        'cliente': usuario.get_full_name() or usuario.username,
+        'endereco': pedido.endereco_entrega,
+        'observacoes': pedido.observacoes,
+        'data_solicitacao': pedido.data_solicitacao.isoformat(),
+        'quantidade_itens': pedido.qtd_itens,
+        'total': f'{pedido.valor_total:.2f}',
+        'itens': [
+            {'produto': item.produto.nome, 'quantidade': item.quantidade}
+            for item in pedido.carrinho.itens.all()
+        ],
+    }
+
+
+def formatar_cursor(base, vistos=()):
+    return '.'.join(str(evento_id) for evento_id in [base, *sorted(vistos)])
+
+
+def ler_cursor(texto):
+    """(base, ids vistos acima da base). ValueError se o cursor não servir."""
+    base, *vistos = (int(parte) for parte in texto.split('.'))
+    if base < 0 or any(evento_id <= base for evento_id in vistos):
+        raise ValueError(f'cursor inválido: {texto}')
+    return base, frozenset(vistos)
+
+
+def cursor_atual():
+    """Cursor que conta com todos os eventos visíveis neste momento"""
+    limite = timezone.now() - JANELA_ATRASO
+    vistos = []
+    eventos = PedidoEvento.objects.order_by('-id').values_list('id', 'data_evento')
+    for evento_id, data_evento in eventos.iterator(chunk_size=100):
+        if data_evento < limite:
+            return formatar_cursor(evento_id, vistos)
+        vistos.append(evento_id)
+    return formatar_cursor(0, vistos)
+
+
+def obter_fila():
+    """Fotografia completa da fila: {'cursor', 'pedidos'}"""
+    cursor = cursor_atual()
+    pedidos = _consulta_fila().filter(estado__in=ESTADOS_ATIVOS)
+    return {
+        'cursor': cursor,
+        'completo': True,
+        'pedidos': [serializar_pedido(p) for p in pedidos],
+        'removidos': [],
+    }
+
+
+def obter_alteracoes(cursor):
+    """
+    Pedidos alterados depois do cursor (base, vistos). Os que saíram da fila
+    (entregues, cancelados) vêm em 'removidos'. Retorna None se nada mudou.
+    """
+    base, vistos = cursor
+    limite = timezone.now() - JANELA_ATRASO
+    eventos = PedidoEvento.objects.filter(id__gt=base).order_by('id').values_list(
+        'id', 'pedido_id', 'data_evento'
+    )
+    nova_base, pedido_ids, ids = base, set(), []
+    for evento_id, pedido_id, data_evento in eventos:
+        ids.append(evento_id)
+        if evento_id not in vistos:
+            pedido_ids.add(pedido_id)
+        if data_evento < limite:
+            nova_base = evento_id
+    
+    if not pedido_ids:
+        return None
+    
+    pedidos = list(_consulta_fila().filter(id__in=pedido_ids, estado__in=ESTADOS_ATIVOS))
+    ativos = {p.id for p in pedidos}
+    return {
+        'cursor': formatar_cursor(nova_base, [evento_id for evento_id in ids if evento_id > nova_base]),
+        'completo': False,
+        'pedidos': [serializar_pedido(p) for p in pedidos],
+        'removidos': sorted(pedido_ids - ativos),
+    }
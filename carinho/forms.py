@@ -1,5 +1,5 @@
 from django import forms
-from django.core.cache import cache
+from index.invalidacao import invalidar
 from .models import ItemCarrinho, PedidoEntrega
 
 class AdicionarAoCarrinhoForm(forms.ModelForm):
@@ -21,14 +21,10 @@ class AdicionarAoCarrinhoForm(forms.ModelForm):
         # Salva o item no carrinho
         instance = super().save(commit=commit)
         
-        if commit and instance.usuario:
-            # Invalida o cache do carrinho após adicionar item
-            cache_key = f"carrinho_{instance.usuario.id}"
-            cache.delete(cache_key)
-            
-            # Invalida cache do total do carrinho
-            total_cache_key = f"carrinho_total_{instance.usuario.id}"
-            cache.delete(total_cache_key)
+        if commit:
+            usuario_id = instance.carrinho.usuario_id
+            # Invalida o cache do carrinho e do total após adicionar item
+            invalidar(f"carrinho_{usuario_id}", f"carrinho_total_{usuario_id}")
         
         return instance
 
@@ -57,14 +53,9 @@ class PedidoEntregaForm(forms.ModelForm):
         # Salva o pedido de entrega
         instance = super().save(commit=commit)
         
-        if commit and instance.pedido and instance.pedido.usuario:
-            # Invalida cache de pedidos do usuário
-            cache_key = f"pedidos_{instance.pedido.usuario.id}"
-            cache.delete(cache_key)
-            
-            # Invalida cache específico do pedido
-            pedido_cache_key = f"pedido_{instance.pedido.id}"
-            cache.delete(pedido_cache_key)
+        if commit and instance.pk:
+            # Invalida cache de pedidos do usuário e do pedido
+            invalidar(f"pedidos_{instance.carrinho.usuario_id}", f"pedido_{instance.pk}")
         
         return instance
 
@@ -84,17 +75,13 @@ class AtualizarItemForm(forms.ModelForm):
         # Atualiza o item do carrinho
         instance = super().save(commit=commit)
         
-        if commit and instance.usuario:
-            # Invalida o cache do carrinho após atualizar item
-            cache_key = f"carrinho_{instance.usuario.id}"
-            cache.delete(cache_key)
-            
-            # Invalida cache do total do carrinho
-            total_cache_key = f"carrinho_total_{instance.usuario.id}"
-            cache.delete(total_cache_key)
-            
-            # Invalida cache de itens específicos se necessário
-            item_cache_key = f"carrinho_item_{instance.id}"
-            cache.delete(item_cache_key)
+        if commit:
+            usuario_id = instance.carrinho.usuario_id
+            # Invalida o cache do carrinho, do total e do item atualizado
+            invalidar(
+                f"carrinho_{usuario_id}",
+                f"carrinho_total_{usuario_id}",
+                f"carrinho_item_{instance.id}",
+            )
         
         return instance
\ No newline at end of file
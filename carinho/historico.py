@@ -0,0 +1,118 @@
+# carinho/historico.py
+"""
+Histórico de pedidos com paginação por cursor (keyset) sobre
+(data_solicitacao, id): cada página custa o mesmo número de consultas,
+independentemente de quantos pedidos o cliente já fez.
+
+Pedidos arquivados (carinho/arquivo.py) só são consultados quando a página
+pode chegar a eles: se a página quente ficar completa com pedidos mais
+recentes do que o limite do arquivo, o arquivo nem é lido.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import F, Prefetch, Q, DecimalField, ExpressionWrapper
+
+from .arquivo import consulta_arquivo_usuario, data_limite_arquivo
+from .models import ItemCarrinho, PedidoEntrega
+
+TAMANHO_PAGINA = 10
+
+
+def codificar_cursor(pedido):
+    valor = f'{pedido.data_solicitacao.isoformat()}|{pedido.id}'
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (data_solicitacao, id) ou None se o cursor for inválido"""
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        data, pedido_id = base64.urlsafe_b64decode(cursor + preenchimento).decode().split('|')
+        return datetime.fromisoformat(data), int(pedido_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def _consulta_historico(usuario):
+    itens = ItemCarrinho.objects.select_related('produto').annotate(
+        valor=ExpressionWrapper(
+            F('quantidade') * F('produto__preco'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+    ).order_by('data_adicao')
+    
+    return PedidoEntrega.objects.filter(
+        carrinho__usuario=usuario
+    ).com_totais().select_related(
+        'carrinho'
+    ).prefetch_related(
+        Prefetch('carrinho__itens', queryset=itens)
+    ).order_by('-data_solicitacao', '-id')
+
+
+def _depois_do_cursor(pedidos, posicao):
+    data, pedido_id = posicao
+    return pedidos.filter(
+        Q(data_solicitacao__lt=data) | Q(data_solicitacao=data, id__lt=pedido_id)
+    )
+
+
+def obter_pagina_historico(usuario, cursor=None, tamanho=TAMANHO_PAGINA):
+    """
+    Página do histórico a seguir ao cursor (2 consultas: pedidos + itens,
+    mais 1 ou 2 para o arquivo quando a página chega a ele).
+    Retorna {'pedidos': [...], 'proximo_cursor': str ou None, 'versao': str},
+    onde 'versao' muda sempre que algum pedido da página é atualizado.
+    """
+    pedidos = _consulta_historico(usuario)
+    
+    posicao = decodificar_cursor(cursor) if cursor else None
+    if posicao:
+        pedidos = _depois_do_cursor(pedidos, posicao)
+    
+    pedidos = list(pedidos[:tamanho + 1])
+    
+    if len(pedidos) <= tamanho or pedidos[-1].data_solicitacao < data_limite_arquivo():
+        arquivados = consulta_arquivo_usuario(usuario)
+        if posicao:
+            arquivados = _depois_do_cursor(arquivados, posicao)
+        pedidos = sorted(
+            pedidos + list(arquivados[:tamanho + 1]),
+            key=lambda pedido: (pedido.data_solicitacao, pedido.id),
+            reverse=True,
+        )[:tamanho + 1]
+    proximo_cursor = None
+    if len(pedidos) > tamanho:
+        pedidos = pedidos[:tamanho]
+        proximo_cursor = codificar_cursor(pedidos[-1])
+    
+    versao = max((p.data_atualizacao for p in pedidos), default=None)
+    return {
+        'pedidos': pedidos,
+        'proximo_cursor': proximo_cursor,
+        'versao': versao.strftime('%Y%m%d%H%M%S%f') if versao else '',
+    }
+
+
+def serializar_pedido_historico(pedido):
+    return {
+        'id': pedido.id,
+        'numero': pedido.numero_pedido,
+        'estado': pedido.estado,
+        'estado_display': pedido.get_estado_display(),
+        'arquivado': getattr(pedido, 'arquivado', False),
+        'data_solicitacao': pedido.data_solicitacao.isoformat(),
+        'subtotal': f'{pedido.valor_subtotal:.2f}',
+        'taxa_entrega': f'{pedido.valor_taxa:.2f}',
+        'total': f'{pedido.valor_total:.2f}',
+        'itens': [
+            {
+                'produto': item.produto.nome if item.produto else item.nome_produto,
+                'categoria': item.produto.get_categoria_display() if item.produto else '',
+                'quantidade': item.quantidade,
+                'valor': f'{item.valor:.2f}',
+            }
+            for item in pedido.carrinho.itens.all()
+        ],
+    }
@@ -0,0 +1,192 @@
+# carinho/limpeza.py
+"""
+Recolha de carrinhos abandonados.
+
+Carrinhos sem pedido vão-se acumulando: fechados/cancelados que nunca
+viraram pedido, abertos esquecidos, abertos duplicados de antes da
+restrição de unicidade e carrinhos com estados inventados pelo fallback
+de `obter_carrinho_inteligente`. Aqui eles são normalizados, fundidos ou
+apagados em lotes limitados (`DELETE ... WHERE id IN (SELECT ... LIMIT n)`),
+cada lote na sua transação curta, para nunca segurar locks longos.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from index.invalidacao import agrupar_invalidacoes, invalidar, invalidar_padroes
+
+from .models import Carrinho, ItemCarrinho, PedidoEntrega
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 1000
+ESTADOS_VALIDOS = [estado for estado, _ in Carrinho.ESTADO_CHOICES]
+
+
+def _dias(nome, padrao):
+    return timezone.now() - timedelta(days=getattr(settings, nome, padrao))
+
+
+def _sem_pedido(queryset):
+    return queryset.filter(
+        ~Exists(PedidoEntrega.objects.filter(carrinho_id=OuterRef('pk')))
+    )
+
+
+def carrinhos_fechados_sem_pedido():
+    """Fechados/cancelados que nunca viraram pedido e já não mudam"""
+    return _sem_pedido(Carrinho.objects.filter(
+        estado__in=['fechado', 'cancelado'],
+        data_atualizacao__lt=_dias('CARRINHO_FECHADO_DIAS', 7),
+    ))
+
+
+def carrinhos_abertos_abandonados():
+    """Abertos sem alterações nem itens novos há CARRINHO_ABANDONADO_DIAS"""
+    limite = _dias('CARRINHO_ABANDONADO_DIAS', 60)
+    return _sem_pedido(Carrinho.objects.filter(
+        estado='aberto',
+        data_atualizacao__lt=limite,
+    ).filter(
+        ~Exists(ItemCarrinho.objects.filter(carrinho_id=OuterRef('pk'), data_adicao__gte=limite))
+    ))
+
+
+def _executar_em_lotes(sql_base, subconsulta, lote):
+    """
+    Repete `sql_base` (com um marcador {sub} para a subconsulta de ids,
+    limitada a `lote`) até afetar menos de `lote` linhas.
+    Retorna (linhas_afetadas, lotes).
+    """
+    sub_sql, sub_params = subconsulta.order_by('pk').values('pk')[:lote].query.sql_with_params()
+    sql = sql_base.format(sub=sub_sql)
+    total = lotes = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, sub_params)
+            afetadas = cursor.rowcount
+        total += afetadas
+        lotes += 1
+        if afetadas < lote:
+            return total, lotes
+
+
+def apagar_carrinhos(queryset, lote=TAMANHO_LOTE):
+    """
+    Apaga em lotes os carrinhos da queryset e os seus itens.
+    Retorna {'carrinhos': n, 'itens': n, 'lotes': n}.
+    """
+    qn = connection.ops.quote_name
+    tabela_itens = qn(ItemCarrinho._meta.db_table)
+    tabela_carrinhos = qn(Carrinho._meta.db_table)
+
+    # Itens primeiro (em lotes de itens), depois só carrinhos já vazios:
+    # um item adicionado entretanto deixa o carrinho de fora deste ciclo.
+    itens, lotes_itens = _executar_em_lotes(
+        f'DELETE FROM {tabela_itens} WHERE id IN ({{sub}})',
+        ItemCarrinho.objects.filter(carrinho__in=queryset.values('pk')),
+        lote,
+    )
+    carrinhos, lotes_carrinhos = _executar_em_lotes(
+        f'DELETE FROM {tabela_carrinhos} WHERE id IN ({{sub}})',
+        queryset.filter(~Exists(ItemCarrinho.objects.filter(carrinho_id=OuterRef('pk')))),
+        lote,
+    )
+    return {'carrinhos': carrinhos, 'itens': itens, 'lotes': lotes_itens + lotes_carrinhos}
+
+
+def normalizar_estados(lote=TAMANHO_LOTE):
+    """
+    Carrinhos com estados fora de ESTADO_CHOICES passam a 'fechado' (se
+    tiverem pedido) ou 'cancelado' (se não tiverem, ficando para a recolha).
+    """
+    qn = connection.ops.quote_name
+    tabela = qn(Carrinho._meta.db_table)
+    invalidos = Carrinho.objects.exclude(estado__in=ESTADOS_VALIDOS)
+    com_pedido = invalidos.filter(Exists(PedidoEntrega.objects.filter(carrinho_id=OuterRef('pk'))))
+
+    fechados, _ = _executar_em_lotes(
+        f"UPDATE {tabela} SET estado = 'fechado' WHERE id IN ({{sub}})", com_pedido, lote
+    )
+    cancelados, _ = _executar_em_lotes(
+        f"UPDATE {tabela} SET estado = 'cancelado' WHERE id IN ({{sub}})", _sem_pedido(invalidos), lote
+    )
+    return fechados + cancelados
+
+
+@agrupar_invalidacoes()
+def fundir_carrinho(destino, origens):
+    """Move os itens das `origens` para `destino` (somando quantidades) e apaga as origens"""
+    with transaction.atomic():
+        existentes = {item.produto_id: item for item in destino.itens.select_for_update()}
+        movidos = []
+        somados = {}
+        for item in ItemCarrinho.objects.filter(carrinho__in=origens).select_for_update():
+            if item.produto_id in existentes:
+                somado = existentes[item.produto_id]
+                somado.quantidade += item.quantidade
+                somados[somado.pk] = somado
+            else:
+                item.carrinho = destino
+                existentes[item.produto_id] = item
+                movidos.append(item)
+
+        if movidos:
+            ItemCarrinho.objects.filter(pk__in=[item.pk for item in movidos]).update(carrinho=destino)
+        if somados:
+            ItemCarrinho.objects.bulk_update(somados.values(), ['quantidade'])
+        ItemCarrinho.objects.filter(carrinho__in=origens).delete()
+        origens_ids = [carrinho.pk for carrinho in origens]
+        Carrinho.objects.filter(pk__in=origens_ids).delete()
+
+        destino.limpar_cache()
+        for carrinho_id in origens_ids:
+            invalidar(
+                f'carrinho_{carrinho_id}_total_itens',
+                f'carrinho_{carrinho_id}_subtotal',
+                f'carrinho_{carrinho_id}_taxa_entrega',
+                f'carrinho_{carrinho_id}_total',
+                f'carrinho_{carrinho_id}_itens',
+            )
+    return len(origens_ids)
+
+
+def fundir_carrinhos_duplicados():
+    """
+    Para cada usuário com mais de um carrinho aberto (sem pedido), junta
+    tudo no mais recente. Retorna [(usuario_id, carrinho_mantido, fundidos)].
+    """
+    abertos = _sem_pedido(Carrinho.objects.filter(estado='aberto'))
+    usuarios = list(abertos.order_by().values('usuario_id').annotate(
+        total=Count('id')
+    ).filter(total__gt=1).values_list('usuario_id', flat=True))
+
+    resultado = []
+    for usuario_id in usuarios:
+        carrinhos = list(abertos.filter(usuario_id=usuario_id).order_by('-data_criacao', '-id'))
+        principal, antigos = carrinhos[0], carrinhos[1:]
+        resultado.append((usuario_id, principal.pk, fundir_carrinho(principal, antigos)))
+    return resultado
+
+
+def recolher_carrinhos(lote=TAMANHO_LOTE):
+    """
+    Executa a limpeza completa e retorna as contagens de cada etapa.
+    """
+    relatorio = {
+        'estados_normalizados': normalizar_estados(lote),
+        'carrinhos_fundidos': sum(fundidos for _, _, fundidos in fundir_carrinhos_duplicados()),
+        'fechados': apagar_carrinhos(carrinhos_fechados_sem_pedido(), lote),
+        'abandonados': apagar_carrinhos(carrinhos_abertos_abandonados(), lote),
+    }
+
+    if relatorio['abandonados']['carrinhos']:
+        # O carrinho aberto fica em cache por usuário: não deixar lá um apagado
+        invalidar_padroes('carrinho_aberto_usuario_*')
+
+    logger.info(f"Recolha de carrinhos: {relatorio}")
+    return relatorio
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from carinho.arquivo import TAMANHO_LOTE, arquivar_pedidos, data_limite_arquivo
+
+
+class Command(BaseCommand):
+    help = 'Move pedidos entregues/cancelados antigos (com carrinhos e itens) para o arquivo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE,
+                            help='Pedidos por transação')
+        parser.add_argument('--max-lotes', type=int, default=None,
+                            help='Para depois deste número de lotes')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Arquivando pedidos anteriores a {data_limite_arquivo():%d/%m/%Y}...')
+        totais = arquivar_pedidos(lote=options['lote'], max_lotes=options['max_lotes'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{totais['pedidos']} pedidos e {totais['itens']} itens arquivados"
+        ))
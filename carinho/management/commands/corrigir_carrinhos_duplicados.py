@@ -0,0 +1,28 @@
+# carinho/management/commands/corrigir_carrinhos_duplicados.py
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from carinho.limpeza import fundir_carrinhos_duplicados
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Corrige carrinhos duplicados para usuários'
+    
+    def handle(self, *args, **options):
+        corrigidos = fundir_carrinhos_duplicados()
+        nomes = dict(
+            User.objects.filter(id__in=[usuario_id for usuario_id, _, _ in corrigidos])
+            .values_list('id', 'username')
+        )
+        
+        for usuario_id, carrinho_id, fundidos in corrigidos:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'✓ {nomes.get(usuario_id, usuario_id)}: mantido carrinho #{carrinho_id}, '
+                    f'fundidos {fundidos} carrinhos antigos'
+                )
+            )
+        
+        if not corrigidos:
+            self.stdout.write('Nenhum carrinho duplicado encontrado.')
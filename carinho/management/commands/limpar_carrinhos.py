@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from carinho.limpeza import TAMANHO_LOTE, recolher_carrinhos
+
+
+class Command(BaseCommand):
+    help = 'Normaliza, funde e apaga em lotes os carrinhos abandonados sem pedido'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE,
+                            help='Linhas por DELETE/UPDATE')
+
+    def handle(self, *args, **options):
+        relatorio = recolher_carrinhos(lote=options['lote'])
+        fechados, abandonados = relatorio['fechados'], relatorio['abandonados']
+
+        self.stdout.write(f"Estados inválidos normalizados: {relatorio['estados_normalizados']}")
+        self.stdout.write(f"Carrinhos duplicados fundidos: {relatorio['carrinhos_fundidos']}")
+        self.stdout.write(
+            f"Fechados sem pedido apagados: {fechados['carrinhos']} "
+            f"({fechados['itens']} itens, {fechados['lotes']} lotes)"
+        )
+        self.stdout.write(
+            f"Abertos abandonados apagados: {abandonados['carrinhos']} "
+            f"({abandonados['itens']} itens, {abandonados['lotes']} lotes)"
+        )
+        linhas = (
+            fechados['carrinhos'] + fechados['itens']
+            + abandonados['carrinhos'] + abandonados['itens']
+            + relatorio['carrinhos_fundidos']
+        )
+        self.stdout.write(self.style.SUCCESS(f'{linhas} linhas recuperadas'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from carinho.popularidade import reconciliar_popularidade
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a popularidade dos produtos (Redis) a partir das entregas no banco'
+
+    def handle(self, *args, **options):
+        total = reconciliar_popularidade()
+        self.stdout.write(self.style.SUCCESS(f'Popularidade reconciliada: {total} produtos'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carinho', '0007_alter_itemcarrinho_unique_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado_anterior', models.CharField(blank=True, choices=[('pendente', 'Pendente'), ('confirmado', 'Confirmado'), ('preparacao', 'Em Preparação'), ('despachado', 'Despachado'), ('entregue', 'Entregue'), ('cancelado', 'Cancelado')], max_length=15, verbose_name='Estado Anterior')),
+                ('estado_novo', models.CharField(choices=[('pendente', 'Pendente'), ('confirmado', 'Confirmado'), ('preparacao', 'Em Preparação'), ('despachado', 'Despachado'), ('entregue', 'Entregue'), ('cancelado', 'Cancelado')], max_length=15, verbose_name='Novo Estado')),
+                ('observacao', models.CharField(blank=True, max_length=255, verbose_name='Observação')),
+                ('data_evento', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data do Evento')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='carinho.pedidoentrega', verbose_name='Pedido')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Alterado por')),
+            ],
+            options={
+                'verbose_name': 'Evento do Pedido',
+                'verbose_name_plural': 'Eventos dos Pedidos',
+                'ordering': ['data_evento', 'id'],
+                'indexes': [models.Index(fields=['pedido', 'data_evento'], name='carinho_evento_pedido_idx')],
+            },
+        ),
+    ]
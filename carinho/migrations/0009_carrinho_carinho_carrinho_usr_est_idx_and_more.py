@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carinho', '0008_pedidoevento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='carrinho',
+            index=models.Index(fields=['usuario', 'estado'], name='carinho_carrinho_usr_est_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoentrega',
+            index=models.Index(fields=['estado', 'data_solicitacao'], name='carinho_pedido_estado_data_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carinho', '0009_carrinho_carinho_carrinho_usr_est_idx_and_more'),
+        ('menu', '0008_produto_menu_produto_status_ordem_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('carrinho_id_original', models.BigIntegerField(verbose_name='Carrinho Original')),
+                ('numero_pedido', models.CharField(blank=True, max_length=20, verbose_name='Número do Pedido')),
+                ('endereco_entrega', models.TextField(verbose_name='Endereço de Entrega')),
+                ('observacoes', models.TextField(blank=True, verbose_name='Observações')),
+                ('estado', models.CharField(choices=[('pendente', 'Pendente'), ('confirmado', 'Confirmado'), ('preparacao', 'Em Preparação'), ('despachado', 'Despachado'), ('entregue', 'Entregue'), ('cancelado', 'Cancelado')], max_length=15, verbose_name='Estado do Pedido')),
+                ('data_criacao_carrinho', models.DateTimeField(verbose_name='Data de Criação do Carrinho')),
+                ('data_solicitacao', models.DateTimeField(verbose_name='Data de Solicitação')),
+                ('data_atualizacao', models.DateTimeField(verbose_name='Última Atualização')),
+                ('data_arquivo', models.DateTimeField(auto_now_add=True, verbose_name='Data de Arquivo')),
+                ('qtd_itens', models.PositiveIntegerField(default=0)),
+                ('valor_subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('valor_taxa', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('valor_total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pedidos_arquivados', to=settings.AUTH_USER_MODEL, verbose_name='Cliente')),
+            ],
+            options={
+                'verbose_name': 'Pedido Arquivado',
+                'verbose_name_plural': 'Pedidos Arquivados',
+                'ordering': ['-data_solicitacao', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemPedidoArquivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome_produto', models.CharField(max_length=200)),
+                ('quantidade', models.PositiveIntegerField()),
+                ('preco_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('data_adicao', models.DateTimeField()),
+                ('produto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='menu.produto')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='carinho.pedidoarquivado')),
+            ],
+            options={
+                'verbose_name': 'Item de Pedido Arquivado',
+                'verbose_name_plural': 'Itens de Pedidos Arquivados',
+                'ordering': ['data_adicao'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarquivado',
+            index=models.Index(fields=['usuario', 'data_solicitacao'], name='carinho_arq_usuario_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarquivado',
+            index=models.Index(fields=['data_solicitacao'], name='carinho_arq_data_idx'),
+        ),
+    ]
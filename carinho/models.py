@@ -4,8 +4,21 @@ from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.db import IntegrityError, transaction
 from django.core.cache import cache
+from django.db.models.functions import Coalesce
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+from index.invalidacao import agrupar_invalidacoes, invalidar
+from index.rastreamento import RastreamentoCamposMixin
+
+# Regras da taxa de entrega (usadas também nas anotações SQL)
+LIMITE_ENTREGA_GRATIS = Decimal('5000.00')
+TAXA_ENTREGA_PADRAO = Decimal('1000.00')
+
+class CarrinhoQuerySet(models.QuerySet):
+    def com_totais(self):
+        """Anota quantidade, subtotal, taxa e total calculados na própria consulta"""
+        return _anotar_totais(self, 'itens')
 
 class Carrinho(models.Model):
     ESTADO_CHOICES = [
@@ -37,6 +50,8 @@ class Carrinho(models.Model):
         verbose_name='Estado do Carrinho'
     )
     
+    objects = CarrinhoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Carrinho'
         verbose_name_plural = 'Carrinhos'
@@ -48,6 +63,9 @@ class Carrinho(models.Model):
                 name='carrinho_aberto_unico_por_usuario'
             )
         ]
+        indexes = [
+            models.Index(fields=['usuario', 'estado'], name='carinho_carrinho_usr_est_idx'),
+        ]
     
     @classmethod
     def obter_carrinho_aberto(cls, usuario):
@@ -122,10 +140,10 @@ class Carrinho(models.Model):
         taxa = cache.get(cache_key)
         
         if taxa is None:
-            if self.subtotal >= Decimal('5000.00'):
+            if self.subtotal >= LIMITE_ENTREGA_GRATIS:
                 taxa = Decimal('0.00')
             else:
-                taxa = Decimal('1000.00')
+                taxa = TAXA_ENTREGA_PADRAO
             cache.set(cache_key, taxa, 300)  # 5 minutos
         
         return taxa
@@ -161,8 +179,9 @@ class Carrinho(models.Model):
             f'carrinho_{self.id}_itens',
             f'usuario_{self.usuario.id}_carrinho_ativo'
         ]
-        cache.delete_many(cache_keys)
+        invalidar(*cache_keys)
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         """Sobrescreve save para limpar cache quando necessário"""
         if self.pk:  # Se é uma atualização
@@ -221,29 +240,65 @@ class ItemCarrinho(models.Model):
             f'carrinho_{self.carrinho.id}_total',
             f'carrinho_{self.carrinho.id}_itens'
         ]
-        cache.delete_many(cache_keys)
+        invalidar(*cache_keys)
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         """Sobrescreve save para limpar cache"""
         super().save(*args, **kwargs)
         self.limpar_cache()
     
+    @agrupar_invalidacoes()
     def delete(self, *args, **kwargs):
         """Sobrescreve delete para limpar cache"""
         carrinho_id = self.carrinho.id
         super().delete(*args, **kwargs)
         
         # Limpa cache do carrinho após deletar item
-        cache_keys = [
+        invalidar(
             f'carrinho_{carrinho_id}_total_itens',
             f'carrinho_{carrinho_id}_subtotal',
             f'carrinho_{carrinho_id}_taxa_entrega',
             f'carrinho_{carrinho_id}_total',
             f'carrinho_{carrinho_id}_itens'
-        ]
-        cache.delete_many(cache_keys)
+        )
+
+def _anotar_totais(queryset, itens):
+    """
+    Anota qtd_itens, valor_subtotal, valor_taxa e valor_total calculados na
+    própria consulta; `itens` é o caminho até ItemCarrinho ('itens' ou 'carrinho__itens').
+    """
+    valor_decimal = models.DecimalField(max_digits=12, decimal_places=2)
+    subtotal = Coalesce(
+        models.Sum(
+            models.F(f'{itens}__quantidade') * models.F(f'{itens}__produto__preco'),
+            output_field=valor_decimal
+        ),
+        models.Value(Decimal('0.00')),
+        output_field=valor_decimal
+    )
+    return queryset.annotate(
+        qtd_itens=Coalesce(models.Sum(f'{itens}__quantidade'), 0),
+        valor_subtotal=subtotal,
+    ).annotate(
+        valor_taxa=models.Case(
+            models.When(valor_subtotal__gte=LIMITE_ENTREGA_GRATIS, then=models.Value(Decimal('0.00'))),
+            default=models.Value(TAXA_ENTREGA_PADRAO),
+            output_field=valor_decimal
+        ),
+    ).annotate(
+        valor_total=models.ExpressionWrapper(
+            models.F('valor_subtotal') + models.F('valor_taxa'),
+            output_field=valor_decimal
+        ),
+    )
 
-class PedidoEntrega(models.Model):
+class PedidoEntregaQuerySet(models.QuerySet):
+    def com_totais(self):
+        """Anota quantidade, subtotal, taxa e total calculados na própria consulta"""
+        return _anotar_totais(self, 'carrinho__itens')
+
+class PedidoEntrega(RastreamentoCamposMixin, models.Model):
     ESTADO_PEDIDO_CHOICES = [
         ('pendente', 'Pendente'),
         ('confirmado', 'Confirmado'),
@@ -298,10 +353,15 @@ class PedidoEntrega(models.Model):
         verbose_name='Admin Notificado'
     )
     
+    objects = PedidoEntregaQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Pedido de Entrega'
         verbose_name_plural = 'Pedidos de Entrega'
         ordering = ['-data_solicitacao']
+        indexes = [
+            models.Index(fields=['estado', 'data_solicitacao'], name='carinho_pedido_estado_data_idx'),
+        ]
     
     def __str__(self):
         """CORRIGIDO: User padrão não tem campo 'nome'"""
@@ -357,30 +417,264 @@ class PedidoEntrega(models.Model):
         
         return pedidos
     
-    def limpar_cache(self):
-        """Limpa cache relacionado a este pedido"""
-        cache_keys = [
+    def chaves_cache(self):
+        """Chaves de cache que dependem deste pedido"""
+        return [
             f'pedido_{self.id}_total',
             'pedidos_ativos',
-            f'pedidos_usuario_{self.carrinho.usuario.id}',
+            f'pedidos_usuario_{self.carrinho.usuario_id}',
             'estatisticas_pedidos',
             'total_pedidos_hoje'
         ]
-        cache.delete_many(cache_keys)
     
+    def limpar_cache(self):
+        """Limpa cache relacionado a este pedido"""
+        invalidar(*self.chaves_cache())
+    
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         if not self.numero_pedido:
             self.numero_pedido = f"P{self.carrinho.usuario.id:04d}-{self.carrinho.id:04d}"
         
-        # Limpa cache antes de salvar se for atualização de estado
-        if self.pk:
-            pedido_antigo = PedidoEntrega.objects.get(pk=self.pk)
-            if pedido_antigo.estado != self.estado:
-                self.limpar_cache()
-        
         super().save(*args, **kwargs)
         self.limpar_cache()
 
+class PedidoEvento(models.Model):
+    """Registo imutável (append-only) das mudanças de estado de um pedido"""
+    
+    pedido = models.ForeignKey(
+        PedidoEntrega,
+        on_delete=models.CASCADE,
+        related_name='eventos',
+        verbose_name='Pedido'
+    )
+    
+    estado_anterior = models.CharField(
+        max_length=15,
+        choices=PedidoEntrega.ESTADO_PEDIDO_CHOICES,
+        blank=True,
+        verbose_name='Estado Anterior'
+    )
+    
+    estado_novo = models.CharField(
+        max_length=15,
+        choices=PedidoEntrega.ESTADO_PEDIDO_CHOICES,
+        verbose_name='Novo Estado'
+    )
+    
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Alterado por'
+    )
+    
+    observacao = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Observação'
+    )
+    
+    data_evento = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Data do Evento'
+    )
+    
+    class Meta:
+        verbose_name = 'Evento do Pedido'
+        verbose_name_plural = 'Eventos dos Pedidos'
+        ordering = ['data_evento', 'id']
+        indexes = [
+            models.Index(fields=['pedido', 'data_evento'], name='carinho_evento_pedido_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Pedido #{self.pedido_id}: {self.estado_anterior or '-'} → {self.estado_novo}"
+    
+    def save(self, *args, **kwargs):
+        """Eventos só podem ser criados, nunca alterados"""
+        if self.pk:
+            raise ValueError('Eventos de pedido são imutáveis.')
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError('Eventos de pedido são imutáveis.')
+
+class PedidoArquivado(models.Model):
+    """
+    Pedido entregue ou cancelado movido para o arquivo (ver carinho/arquivo.py).
+    Guarda o carrinho achatado e os totais do momento do arquivo; o id é o
+    mesmo do PedidoEntrega original.
+    """
+    
+    id = models.BigIntegerField(primary_key=True)
+    
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='pedidos_arquivados',
+        verbose_name='Cliente'
+    )
+    
+    carrinho_id_original = models.BigIntegerField(
+        verbose_name='Carrinho Original'
+    )
+    
+    numero_pedido = models.CharField(
+        max_length=20,
+        blank=True,
+        verbose_name='Número do Pedido'
+    )
+    
+    endereco_entrega = models.TextField(
+        verbose_name='Endereço de Entrega'
+    )
+    
+    observacoes = models.TextField(
+        blank=True,
+        verbose_name='Observações'
+    )
+    
+    estado = models.CharField(
+        max_length=15,
+        choices=PedidoEntrega.ESTADO_PEDIDO_CHOICES,
+        verbose_name='Estado do Pedido'
+    )
+    
+    data_criacao_carrinho = models.DateTimeField(
+        verbose_name='Data de Criação do Carrinho'
+    )
+    
+    data_solicitacao = models.DateTimeField(
+        verbose_name='Data de Solicitação'
+    )
+    
+    data_atualizacao = models.DateTimeField(
+        verbose_name='Última Atualização'
+    )
+    
+    data_arquivo = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Data de Arquivo'
+    )
+    
+    # Totais congelados (mesmos nomes das anotações de com_totais)
+    qtd_itens = models.PositiveIntegerField(default=0)
+    valor_subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    valor_taxa = models.DecimalField(max_digits=12, decimal_places=2)
+    valor_total = models.DecimalField(max_digits=12, decimal_places=2)
+    
+    arquivado = True
+    
+    class Meta:
+        verbose_name = 'Pedido Arquivado'
+        verbose_name_plural = 'Pedidos Arquivados'
+        ordering = ['-data_solicitacao', '-id']
+        indexes = [
+            models.Index(fields=['usuario', 'data_solicitacao'], name='carinho_arq_usuario_data_idx'),
+            models.Index(fields=['data_solicitacao'], name='carinho_arq_data_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Pedido {self.numero_pedido or self.id} (arquivado)"
+    
+    @property
+    def carrinho(self):
+        """Mesma interface de PedidoEntrega nos templates (pedido.carrinho.itens)"""
+        return self
+
+class ItemPedidoArquivado(models.Model):
+    pedido = models.ForeignKey(
+        PedidoArquivado,
+        on_delete=models.CASCADE,
+        related_name='itens'
+    )
+    
+    produto = models.ForeignKey(
+        'menu.Produto',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    
+    nome_produto = models.CharField(max_length=200)
+    quantidade = models.PositiveIntegerField()
+    preco_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    data_adicao = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Item de Pedido Arquivado'
+        verbose_name_plural = 'Itens de Pedidos Arquivados'
+        ordering = ['data_adicao']
+    
+    def __str__(self):
+        return f"{self.quantidade}x {self.nome_produto}"
+
+class PedidoEventoArquivado(models.Model):
+    """Evento de um pedido arquivado (mesmo id do PedidoEvento original), só de leitura"""
+    
+    id = models.BigIntegerField(primary_key=True)
+    
+    pedido = models.ForeignKey(
+        PedidoArquivado,
+        on_delete=models.CASCADE,
+        related_name='eventos',
+        verbose_name='Pedido'
+    )
+    
+    estado_anterior = models.CharField(
+        max_length=15,
+        choices=PedidoEntrega.ESTADO_PEDIDO_CHOICES,
+        blank=True,
+        verbose_name='Estado Anterior'
+    )
+    
+    estado_novo = models.CharField(
+        max_length=15,
+        choices=PedidoEntrega.ESTADO_PEDIDO_CHOICES,
+        verbose_name='Novo Estado'
+    )
+    
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Alterado por'
+    )
+    
+    observacao = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Observação'
+    )
+    
+    data_evento = models.DateTimeField(
+        verbose_name='Data do Evento'
+    )
+    
+    class Meta:
+        verbose_name = 'Evento de Pedido Arquivado'
+        verbose_name_plural = 'Eventos de Pedidos Arquivados'
+        ordering = ['data_evento', 'id']
+        indexes = [
+            models.Index(fields=['pedido', 'data_evento'], name='carinho_arq_evento_pedido_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Pedido #{self.pedido_id}: {self.estado_anterior or '-'} → {self.estado_novo}"
+    
+    def save(self, *args, **kwargs):
+        """Só o arquivo (bulk_create) cria eventos arquivados"""
+        raise ValueError('Eventos de pedido são imutáveis.')
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError('Eventos de pedido são imutáveis.')
+
 # Signal handlers para limpeza automática de cache
 @receiver([post_save, post_delete], sender=ItemCarrinho)
 def limpar_cache_item_carrinho(sender, instance, **kwargs):
@@ -0,0 +1,190 @@
+# carinho/popularidade.py
+"""
+Popularidade dos produtos a partir das vendas entregues.
+
+Um único sorted set no Redis (`popularidade:produtos`) guarda, por produto,
+a soma das quantidades entregues com decaimento exponencial no tempo
+(meia-vida de POPULARIDADE_MEIA_VIDA_DIAS). Em vez de envelhecer todas as
+pontuações, cada venda nova entra com um peso que cresce com o tempo
+(2 ** (dias desde EPOCA / meia-vida)): a ordem relativa é a mesma e cada
+entrega custa um ZINCRBY, o top-N um ZREVRANGE.
+
+Todas as noites `reconciliar_popularidade` recalcula o conjunto a partir
+do SQL (eventos de entrega da janela recente) e troca-o atomicamente,
+corrigindo entregas perdidas com o Redis em baixo. Sem Redis, o top-N é
+calculado no banco com os mesmos pesos e fica em cache.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, IntegerField, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from index.conexao_redis import obter_redis
+
+from .models import ItemCarrinho, PedidoEvento
+
+logger = logging.getLogger(__name__)
+
+CHAVE_REDIS = 'popularidade:produtos'
+# Origem dos pesos; as pontuações só cabem num float por uns 19 anos com
+# meia-vida de 7 dias, e a reconciliação recalcula-as todas as noites.
+EPOCA = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+# Entregas mais antigas do que isto já pesam menos de 1/256
+MEIAS_VIDAS_NA_JANELA = 8
+
+
+def _meia_vida_dias():
+    return getattr(settings, 'POPULARIDADE_MEIA_VIDA_DIAS', 7)
+
+
+def peso(momento):
+    """Peso de uma venda feita em `momento` (dobra a cada meia-vida)"""
+    dias = (momento - EPOCA).total_seconds() / 86400
+    return 2.0 ** (dias / _meia_vida_dias())
+
+
+def _quantidades_por_produto(pedido_ids):
+    return dict(
+        ItemCarrinho.objects.filter(carrinho__pedido_entrega__in=pedido_ids)
+        .order_by().values('produto_id').annotate(total=Sum('quantidade'))
+        .values_list('produto_id', 'total')
+    )
+
+
+def registrar_entregas(pedido_ids):
+    """
+    Soma à popularidade os itens dos pedidos acabados de entregar.
+    As quantidades são lidas já (na transação); o Redis só é escrito
+    depois do commit.
+    """
+    quantidades = _quantidades_por_produto(pedido_ids)
+    if not quantidades:
+        return
+    transaction.on_commit(lambda: _incrementar(quantidades, peso(timezone.now())))
+
+
+def _incrementar(quantidades, fator):
+    cliente = obter_redis()
+    if cliente is None:
+        return
+    try:
+        pipe = cliente.pipeline(transaction=False)
+        for produto_id, quantidade in quantidades.items():
+            pipe.zincrby(CHAVE_REDIS, quantidade * fator, produto_id)
+        pipe.execute()
+    except Exception as e:
+        # A reconciliação noturna recupera a entrega
+        logger.warning(f"Falha ao atualizar a popularidade: {e}")
+
+
+def calcular_pontuacoes():
+    """{produto_id: pontuação} a partir dos eventos de entrega da janela recente (SQL)"""
+    desde = timezone.now() - timedelta(days=_meia_vida_dias() * MEIAS_VIDAS_NA_JANELA)
+    vendas = PedidoEvento.objects.filter(
+        estado_novo='entregue', data_evento__gte=desde,
+    ).order_by().values(
+        'pedido__carrinho__itens__produto_id', dia=TruncDate('data_evento'),
+    ).annotate(
+        total=Sum('pedido__carrinho__itens__quantidade'),
+    ).values_list('pedido__carrinho__itens__produto_id', 'dia', 'total')
+
+    pontuacoes = defaultdict(float)
+    for produto_id, dia, total in vendas:
+        if produto_id is None:
+            continue
+        meio_dia = datetime(dia.year, dia.month, dia.day, 12, tzinfo=dt_timezone.utc)
+        pontuacoes[produto_id] += total * peso(meio_dia)
+    return dict(pontuacoes)
+
+
+def reconciliar_popularidade():
+    """Reconstrói o sorted set a partir do SQL. Retorna o número de produtos."""
+    pontuacoes = calcular_pontuacoes()
+    cache.delete('popularidade_sql')
+
+    cliente = obter_redis()
+    if cliente is None:
+        return len(pontuacoes)
+
+    temporaria = f'{CHAVE_REDIS}:reconciliacao'
+    pipe = cliente.pipeline(transaction=True)
+    pipe.delete(temporaria)
+    if pontuacoes:
+        pipe.zadd(temporaria, pontuacoes)
+        pipe.rename(temporaria, CHAVE_REDIS)
+    else:
+        pipe.delete(CHAVE_REDIS)
+    pipe.execute()
+    logger.info(f"Popularidade reconciliada: {len(pontuacoes)} produtos")
+    return len(pontuacoes)
+
+
+def _ids_redis(quantidade):
+    """Top-N do sorted set, ou None se não houver Redis ou o conjunto ainda não existir"""
+    cliente = obter_redis()
+    if cliente is None:
+        return None
+    try:
+        pipe = cliente.pipeline(transaction=True)
+        pipe.exists(CHAVE_REDIS)
+        pipe.zrevrange(CHAVE_REDIS, 0, quantidade - 1)
+        existe, membros = pipe.execute()
+        # Sem conjunto (Redis novo ou limpo, antes da reconciliação) o SQL responde
+        if not existe:
+            return None
+        return [int(membro) for membro in membros]
+    except Exception as e:
+        logger.warning(f"Falha ao ler a popularidade: {e}")
+        return None
+
+
+def _ids_sql():
+    ids = cache.get('popularidade_sql')
+    if ids is None:
+        pontuacoes = calcular_pontuacoes()
+        ids = sorted(pontuacoes, key=pontuacoes.get, reverse=True)
+        cache.set('popularidade_sql', ids, 60 * 60)  # 1 hora
+    return ids
+
+
+def ids_mais_populares(quantidade):
+    """Ids dos produtos mais vendidos (recentemente), do mais para o menos popular"""
+    ids = _ids_redis(quantidade)
+    if ids is None:
+        ids = _ids_sql()[:quantidade]
+    return ids
+
+
+def obter_produtos_populares(limite=8):
+    """
+    Produtos ativos e com estoque mais populares. Completa com a ordem do
+    menu quando ainda não há vendas suficientes.
+    """
+    from menu.models import Produto
+
+    cache_key = f'produtos_populares_{limite}'
+    produtos = cache.get(cache_key)
+
+    if produtos is None:
+        # Pede mais do que o limite: alguns podem estar inativos/sem estoque
+        ids = ids_mais_populares(limite * 3)
+        disponiveis = Produto.objects.filter(status='ativo', estoque__gt=0)
+        produtos = []
+        if ids:
+            produtos = list(disponiveis.filter(pk__in=ids).order_by(
+                Case(*[When(pk=pk, then=posicao) for posicao, pk in enumerate(ids)],
+                     output_field=IntegerField())
+            )[:limite])
+        if len(produtos) < limite:
+            produtos += list(disponiveis.exclude(pk__in=[p.pk for p in produtos]).order_by(
+                'ordem', 'nome'
+            )[:limite - len(produtos)])
+        cache.set(cache_key, produtos, 60 * 15)  # 15 minutos
+
+    return produtos
@@ -0,0 +1,109 @@
+// Estado do usuário sobreposto às páginas do catálogo.
+// As páginas são renderizadas (e cacheadas) iguais para todos do mesmo
+// perfil; o que é de cada usuário vem de /carrinho/estado/ e é aplicado aqui:
+//   [data-usuario-nome]            -> nome do usuário (navbar)
+//   [data-mensagens]               -> mensagens pendentes (alertas)
+//   [data-carrinho-total]          -> total de itens (badge / resumo)
+//   [data-produto-carrinho="<id>"] -> aviso "no carrinho", com
+//        [data-quantidade] e form[data-remover] dentro
+//   form[data-favorito="<id>"]     -> adicionar/remover favorito, com
+//        data-url-adicionar, data-url-remover e [data-rotulo] dentro
+//   input[name=csrfmiddlewaretoken] -> token do usuário atual
+(function () {
+    const script = document.currentScript;
+    const url = script.dataset.url;
+    const urlRemover = script.dataset.remover;
+    const ICONES_MENSAGEM = { success: 'check-circle', error: 'exclamation-triangle' };
+
+    function alerta(mensagem) {
+        const elemento = document.createElement('div');
+        elemento.className = 'alert alert-' + mensagem.tipo + ' alert-dismissible fade show';
+        elemento.setAttribute('role', 'alert');
+
+        const conteudo = document.createElement('div');
+        conteudo.className = 'd-flex align-items-center';
+        const icone = document.createElement('i');
+        icone.className = 'fas fa-' + (ICONES_MENSAGEM[mensagem.tipo] || 'info-circle') + ' me-3 fa-lg';
+        const texto = document.createElement('div');
+        texto.textContent = mensagem.texto;
+        conteudo.append(icone, texto);
+
+        const fechar = document.createElement('button');
+        fechar.type = 'button';
+        fechar.className = 'btn-close btn-close-white';
+        fechar.dataset.bsDismiss = 'alert';
+
+        elemento.append(conteudo, fechar);
+        return elemento;
+    }
+
+    function aplicar(estado) {
+        document.querySelectorAll('input[name="csrfmiddlewaretoken"]').forEach(function (campo) {
+            campo.value = estado.csrf;
+        });
+
+        document.querySelectorAll('[data-usuario-nome]').forEach(function (elemento) {
+            elemento.textContent = estado.usuario;
+        });
+
+        // As mensagens só vêm uma vez: vão para o primeiro contentor da página
+        const mensagens = document.querySelector('[data-mensagens]');
+        if (mensagens) {
+            estado.mensagens.forEach(function (mensagem) {
+                mensagens.appendChild(alerta(mensagem));
+            });
+        }
+
+        document.querySelectorAll('[data-carrinho-total]').forEach(function (elemento) {
+            if (elemento.dataset.carrinhoTotal === 'texto') {
+                elemento.textContent = estado.total_itens > 0 ? estado.total_itens + ' itens' : 'Vazio';
+            } else {
+                elemento.textContent = estado.total_itens;
+                elemento.hidden = estado.total_itens === 0;
+            }
+        });
+
+        document.querySelectorAll('[data-produto-carrinho]').forEach(function (elemento) {
+            const item = estado.itens[elemento.dataset.produtoCarrinho];
+            elemento.hidden = !item;
+            if (!item) return;
+            elemento.querySelectorAll('[data-quantidade]').forEach(function (quantidade) {
+                quantidade.textContent = item.quantidade;
+            });
+            elemento.querySelectorAll('form[data-remover]').forEach(function (form) {
+                form.action = urlRemover.replace(/0\/$/, item.item + '/');
+            });
+        });
+
+        document.querySelectorAll('form[data-favorito]').forEach(function (form) {
+            const favorito = estado.favoritos.includes(Number(form.dataset.favorito));
+            form.action = favorito ? form.dataset.urlRemover : form.dataset.urlAdicionar;
+            const botao = form.querySelector('button');
+            botao.classList.toggle('favorited', favorito);
+            botao.title = favorito ? 'Remover dos favoritos' : 'Adicionar aos favoritos';
+            const icone = botao.querySelector('i');
+            icone.classList.toggle('fas', favorito);
+            icone.classList.toggle('far', !favorito);
+            form.querySelectorAll('[data-rotulo]').forEach(function (rotulo) {
+                rotulo.textContent = favorito ? rotulo.dataset.sim : rotulo.dataset.nao;
+            });
+        });
+    }
+
+    function carregar() {
+        fetch(url, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+            .then(function (resposta) { return resposta.ok ? resposta.json() : null; })
+            .then(function (estado) { if (estado) aplicar(estado); })
+            .catch(function (erro) { console.error('Erro ao carregar o carrinho:', erro); });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', carregar);
+    } else {
+        carregar();
+    }
+    // Voltar com o botão "anterior" mostra a página da bfcache: atualiza
+    window.addEventListener('pageshow', function (evento) {
+        if (evento.persisted) carregar();
+    });
+})();
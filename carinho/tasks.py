@@ -0,0 +1,26 @@
+from celery import shared_task
+
+from .arquivo import arquivar_pedidos
+from .limpeza import recolher_carrinhos
+from .popularidade import reconciliar_popularidade
+
+# Lotes por execução, para não prender o worker
+MAX_LOTES_POR_EXECUCAO = 50
+
+
+@shared_task
+def arquivar_pedidos_antigos():
+    """Move para o arquivo os pedidos finalizados além do período de retenção"""
+    return arquivar_pedidos(max_lotes=MAX_LOTES_POR_EXECUCAO)
+
+
+@shared_task
+def limpar_carrinhos_abandonados():
+    """Recolhe carrinhos abandonados/fechados sem pedido"""
+    return recolher_carrinhos()
+
+
+@shared_task
+def reconciliar_popularidade_produtos():
+    """Recalcula a popularidade no Redis a partir das entregas no banco"""
+    return reconciliar_popularidade()
@@ -0,0 +1,190 @@
+# carinho/tempo_real.py
+"""
+Envio em tempo real (Server-Sent Events) das mudanças de estado dos pedidos.
+
+As transições publicam no Redis (`pedido:<id>:estado`) depois do commit.
+Cada processo ASGI mantém UMA única ligação pub/sub (psubscribe) e
+distribui as mensagens pelas filas das ligações SSE abertas, por isso uma
+ligação parada custa apenas uma asyncio.Queue. Sem Redis, as ligações
+passam a consultar a base de dados a cada INTERVALO_CONSULTA segundos.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+
+from index.conexao_redis import obter_redis_async, publicar
+
+logger = logging.getLogger(__name__)
+
+PADRAO_CANAIS = 'pedido:*:estado'
+INTERVALO_HEARTBEAT = 20  # segundos
+INTERVALO_CONSULTA = 15  # segundos, só sem Redis
+DURACAO_MAXIMA = 60 * 30  # 30 minutos; o EventSource volta a ligar sozinho
+RETRY_CLIENTE_MS = 5000
+ESPERA_RELIGAR_REDIS = 30  # segundos entre tentativas de voltar a subscrever
+
+# Sinal enviado às filas quando a ligação ao Redis cai
+REDIS_INDISPONIVEL = object()
+
+
+def canal_pedido(pedido_id):
+    return f'pedido:{pedido_id}:estado'
+
+
+def publicar_estados(eventos):
+    """
+    Agenda, para depois do commit, a publicação dos eventos de estado.
+    `eventos` é uma lista de PedidoEvento já gravados.
+    """
+    from .models import PedidoEntrega
+    
+    nomes = dict(PedidoEntrega.ESTADO_PEDIDO_CHOICES)
+    mensagens = [
+        (canal_pedido(evento.pedido_id), json.dumps({
+            'evento': evento.id,
+            'estado': evento.estado_novo,
+            'estado_display': nomes.get(evento.estado_novo, evento.estado_novo),
+        }))
+        for evento in eventos
+    ]
+    transaction.on_commit(lambda: publicar(mensagens))
+
+
+class CentralEventos:
+    """Multiplexa uma única subscrição Redis por processo"""
+    
+    def __init__(self):
+        self._filas = defaultdict(set)
+        self._tarefa = None
+        self._proxima_ligacao = 0
+    
+    def inscrever(self, pedido_id=None):
+        """Fila com as mensagens de um pedido (ou de todos, se pedido_id=None)"""
+        fila = asyncio.Queue(maxsize=10)
+        self._filas[pedido_id].add(fila)
+        if self._tarefa is None or self._tarefa.done():
+            loop = asyncio.get_running_loop()
+            if loop.time() >= self._proxima_ligacao:
+                self._tarefa = loop.create_task(self._ouvir())
+            else:
+                self._entregar(fila, REDIS_INDISPONIVEL)
+        return fila
+    
+    def cancelar(self, pedido_id, fila):
+        filas = self._filas.get(pedido_id)
+        if filas:
+            filas.discard(fila)
+            if not filas:
+                del self._filas[pedido_id]
+    
+    async def _ouvir(self):
+        cliente = None
+        try:
+            cliente = obter_redis_async()
+            async with cliente.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.psubscribe(PADRAO_CANAIS)
+                async for mensagem in pubsub.listen():
+                    if mensagem.get('type') != 'pmessage':
+                        continue
+                    self._distribuir(mensagem['channel'], mensagem['data'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Pub/sub de pedidos indisponível: {e}")
+        finally:
+            self._proxima_ligacao = asyncio.get_running_loop().time() + ESPERA_RELIGAR_REDIS
+            for filas in list(self._filas.values()):
+                for fila in list(filas):
+                    self._entregar(fila, REDIS_INDISPONIVEL)
+            if cliente is not None:
+                try:
+                    await cliente.aclose()
+                except Exception:
+                    pass
+    
+    def _distribuir(self, canal, dados):
+        if isinstance(canal, bytes):
+            canal = canal.decode()
+        try:
+            pedido_id = int(canal.split(':')[1])
+            dados = json.loads(dados)
+        except (IndexError, ValueError):
+            return
+        for fila in list(self._filas.get(pedido_id, ())) + list(self._filas.get(None, ())):
+            self._entregar(fila, dados)
+    
+    @staticmethod
+    def _entregar(fila, dados):
+        try:
+            fila.put_nowait(dados)
+        except asyncio.QueueFull:
+            # Cliente lento: descartar o mais antigo, só interessa o último estado
+            fila.get_nowait()
+            fila.put_nowait(dados)
+
+
+central_eventos = CentralEventos()
+
+
+def formatar_evento(dados):
+    """Formata uma mensagem SSE"""
+    linhas = []
+    if dados.get('evento'):
+        linhas.append(f"id: {dados['evento']}")
+    linhas.append('event: estado')
+    linhas.append(f"data: {json.dumps(dados)}")
+    return '\n'.join(linhas) + '\n\n'
+
+
+async def _estado_atual(pedido_id):
+    from .models import PedidoEntrega, PedidoEvento
+    
+    estado = await PedidoEntrega.objects.filter(pk=pedido_id).values_list(
+        'estado', flat=True
+    ).afirst()
+    evento = await PedidoEvento.objects.filter(pedido_id=pedido_id).order_by(
+        '-id'
+    ).values_list('id', flat=True).afirst()
+    nomes = dict(PedidoEntrega.ESTADO_PEDIDO_CHOICES)
+    return {'evento': evento, 'estado': estado, 'estado_display': nomes.get(estado, estado)}
+
+
+async def fluxo_estados(pedido_id, estados_finais):
+    """Gerador assíncrono das mensagens SSE de um pedido"""
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + DURACAO_MAXIMA
+    
+    atual = await _estado_atual(pedido_id)
+    yield f"retry: {RETRY_CLIENTE_MS}\n" + formatar_evento(atual)
+    if atual['estado'] in estados_finais:
+        return
+    
+    fila = central_eventos.inscrever(pedido_id)
+    consultar_bd = False
+    try:
+        while loop.time() < limite:
+            espera = INTERVALO_CONSULTA if consultar_bd else INTERVALO_HEARTBEAT
+            try:
+                dados = await asyncio.wait_for(fila.get(), timeout=espera)
+            except asyncio.TimeoutError:
+                if not consultar_bd:
+                    yield ': ping\n\n'
+                    continue
+                dados = await _estado_atual(pedido_id)
+                if dados['estado'] == atual['estado']:
+                    yield ': ping\n\n'
+                    continue
+            
+            if dados is REDIS_INDISPONIVEL:
+                consultar_bd = True
+                continue
+            
+            atual = dados
+            yield formatar_evento(dados)
+            if dados['estado'] in estados_finais:
+                return
+    finally:
+        central_eventos.cancelar(pedido_id, fila)
@@ -1,3 +1,638 @@
-from django.test import TestCase
+import importlib.util
+from datetime import date, timedelta
 
-# Create your tests here.
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from balanco.models import RelatorioBalanco
+from menu.models import Favorito, Produto
+from .arquivo import arquivar_pedidos
+from .fila import JANELA_ATRASO, cursor_atual, formatar_cursor, ler_cursor, obter_alteracoes
+from .historico import TAMANHO_PAGINA, obter_pagina_historico
+from .limpeza import fundir_carrinho, recolher_carrinhos
+from .popularidade import calcular_pontuacoes, obter_produtos_populares
+from .tempo_real import RETRY_CLIENTE_MS
+from .transicoes import TransicaoInvalida, obter_metricas_sla, transicionar, transicionar_em_lote
+from .models import (
+    Carrinho, ItemCarrinho, ItemPedidoArquivado, PedidoArquivado, PedidoEntrega, PedidoEvento,
+    PedidoEventoArquivado,
+)
+
+# Pedidos (com carrinho e totais anotados) + itens com produto
+CONSULTAS_POR_PAGINA = 2
+# Última página: procura no arquivo (vazio, sem consulta de itens)
+CONSULTAS_ARQUIVO = 1
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class HistoricoPedidosTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        produtos = [
+            Produto.objects.create(nome=f'Produto {i}', preco=1500, categoria='Bebidas', estoque=100)
+            for i in range(3)
+        ]
+        for i in range(TAMANHO_PAGINA * 2 + 3):
+            carrinho = Carrinho.objects.create(usuario=cls.usuario, estado='fechado')
+            for produto in produtos[:i % 3 + 1]:
+                ItemCarrinho.objects.create(carrinho=carrinho, produto=produto, quantidade=2)
+            PedidoEntrega.objects.create(
+                carrinho=carrinho, endereco_entrega='Rua 1', numero_pedido=f'PED-{i}'
+            )
+
+    def test_numero_de_consultas_constante_por_pagina(self):
+        cursor = None
+        vistos = []
+        while True:
+            with CaptureQueriesContext(connection) as consultas:
+                pagina = obter_pagina_historico(self.usuario, cursor)
+                for pedido in pagina['pedidos']:
+                    vistos.append(pedido.id)
+                    pedido.valor_total
+                    [item.produto.nome for item in pedido.carrinho.itens.all()]
+            esperadas = CONSULTAS_POR_PAGINA
+            if not pagina['proximo_cursor']:
+                esperadas += CONSULTAS_ARQUIVO
+            self.assertEqual(len(consultas), esperadas)
+            cursor = pagina['proximo_cursor']
+            if not cursor:
+                break
+
+        esperados = list(
+            PedidoEntrega.objects.order_by('-data_solicitacao', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(vistos, esperados)
+
+    def test_totais_anotados(self):
+        pedido = obter_pagina_historico(self.usuario)['pedidos'][0]
+        self.assertEqual(pedido.valor_subtotal, pedido.carrinho.subtotal)
+        self.assertEqual(pedido.valor_total, pedido.carrinho.total)
+
+    def test_cursor_invalido_retorna_primeira_pagina(self):
+        primeira = obter_pagina_historico(self.usuario)
+        invalida = obter_pagina_historico(self.usuario, 'invalido')
+        self.assertEqual(
+            [p.id for p in invalida['pedidos']], [p.id for p in primeira['pedidos']]
+        )
+
+    def test_json_para_scroll_infinito(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('historico_pedidos_json'))
+        dados = resposta.json()
+        self.assertEqual(len(dados['pedidos']), TAMANHO_PAGINA)
+
+        resposta = self.client.get(
+            reverse('historico_pedidos_json'), {'cursor': dados['proximo_cursor']}
+        )
+        self.assertEqual(len(resposta.json()['pedidos']), TAMANHO_PAGINA)
+
+    def test_pagina_html_com_link_para_proxima_pagina(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('historico_pedidos'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, resposta.context['proximo_cursor'])
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    ARQUIVO_PEDIDOS_MESES=6,
+)
+class ArquivoPedidosTest(TestCase):
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        self.produto = Produto.objects.create(nome='Sumo', preco=1500, categoria='Bebidas', estoque=100)
+        self.antigos = [self._criar_pedido(f'ANT-{i}', 'entregue', dias=400 + i) for i in range(5)]
+        self.antigo_ativo = self._criar_pedido('ANT-ATIVO', 'pendente', dias=500)
+        self.recentes = [self._criar_pedido(f'REC-{i}', 'entregue', dias=i) for i in range(3)]
+
+    def _criar_pedido(self, numero, estado, dias):
+        carrinho = Carrinho.objects.create(usuario=self.usuario, estado='fechado')
+        ItemCarrinho.objects.create(carrinho=carrinho, produto=self.produto, quantidade=2)
+        pedido = PedidoEntrega.objects.create(
+            carrinho=carrinho, endereco_entrega='Rua 1', numero_pedido=numero, estado=estado
+        )
+        PedidoEvento.objects.create(pedido=pedido, estado_novo=estado)
+        PedidoEntrega.objects.filter(pk=pedido.pk).update(
+            data_solicitacao=timezone.now() - timedelta(days=dias)
+        )
+        return pedido
+
+    def test_move_apenas_pedidos_finalizados_antigos(self):
+        total_antes = PedidoEntrega.objects.filter(pk=self.antigos[0].pk).com_totais().get().valor_total
+
+        self.assertEqual(arquivar_pedidos(lote=2), {'pedidos': 5, 'itens': 5})
+
+        ids_antigos = {p.id for p in self.antigos}
+        self.assertFalse(PedidoEntrega.objects.filter(pk__in=ids_antigos).exists())
+        self.assertFalse(Carrinho.objects.filter(pk__in=[p.carrinho_id for p in self.antigos]).exists())
+        self.assertFalse(PedidoEvento.objects.filter(pedido_id__in=ids_antigos).exists())
+        self.assertEqual(set(PedidoArquivado.objects.values_list('id', flat=True)), ids_antigos)
+        self.assertEqual(ItemPedidoArquivado.objects.count(), 5)
+        self.assertEqual(PedidoArquivado.objects.get(pk=self.antigos[0].pk).valor_total, total_antes)
+        self.assertTrue(PedidoEntrega.objects.filter(pk=self.antigo_ativo.pk).exists())
+
+        self.assertEqual(arquivar_pedidos(), {'pedidos': 0, 'itens': 0})
+
+    def test_eventos_passam_para_o_arquivo_e_contam_no_sla(self):
+        despacho = timezone.now() - timedelta(days=400)
+        PedidoEvento.objects.create(
+            pedido=self.antigos[0], estado_anterior='preparacao', estado_novo='despachado',
+            data_evento=despacho
+        )
+        PedidoEvento.objects.create(
+            pedido=self.antigos[0], estado_anterior='despachado', estado_novo='entregue',
+            data_evento=despacho + timedelta(minutes=30)
+        )
+        ids_antigos = {p.id for p in self.antigos}
+        eventos = set(PedidoEvento.objects.filter(pedido_id__in=ids_antigos).values_list('id', flat=True))
+        cache.clear()
+        metricas = obter_metricas_sla(dias=800)
+        self.assertEqual(metricas['entrega']['media_minutos'], 30.0)
+
+        arquivar_pedidos()
+
+        self.assertEqual(set(PedidoEventoArquivado.objects.values_list('id', flat=True)), eventos)
+        cache.clear()
+        self.assertEqual(obter_metricas_sla(dias=800), metricas)
+        self.assertEqual(obter_metricas_sla(dias=30)['entrega']['pedidos'], 0)
+
+    def test_historico_junta_o_arquivo(self):
+        esperados = list(
+            PedidoEntrega.objects.order_by('-data_solicitacao', '-id').values_list('id', flat=True)
+        )
+        arquivar_pedidos()
+
+        vistos, cursor = [], None
+        while True:
+            pagina = obter_pagina_historico(self.usuario, cursor, tamanho=2)
+            vistos += [pedido.id for pedido in pagina['pedidos']]
+            cursor = pagina['proximo_cursor']
+            if not cursor:
+                break
+        self.assertEqual(vistos, esperados)
+
+    def test_pagina_recente_completa_nao_le_o_arquivo(self):
+        arquivar_pedidos()
+        with self.assertNumQueries(CONSULTAS_POR_PAGINA):
+            pagina = obter_pagina_historico(self.usuario, tamanho=2)
+        self.assertEqual([p.id for p in pagina['pedidos']], [p.id for p in self.recentes[:2]])
+
+    def test_relatorio_inclui_arquivo_so_quando_o_periodo_chega_a_ele(self):
+        hoje = date.today()
+        relatorio = RelatorioBalanco.objects.create(data_inicio=hoje - timedelta(days=800), data_fim=hoje)
+        relatorio.buscar_dados_carrinho()
+        entregues_antes = relatorio.total_pedidos_entregues
+
+        arquivar_pedidos()
+        relatorio = RelatorioBalanco.objects.create(data_inicio=hoje - timedelta(days=800), data_fim=hoje)
+        relatorio.buscar_dados_carrinho()
+        self.assertEqual(relatorio.total_pedidos_entregues, entregues_antes)
+        self.assertEqual(relatorio.total_pedidos_periodo, 9)
+
+        recente = RelatorioBalanco.objects.create(data_inicio=hoje - timedelta(days=30), data_fim=hoje)
+        with CaptureQueriesContext(connection) as consultas:
+            recente.buscar_dados_carrinho()
+        self.assertFalse(any('carinho_pedidoarquivado' in q['sql'] for q in consultas))
+        self.assertEqual(recente.total_pedidos_entregues, 3)
+
+    def test_perfil_soma_o_total_gasto_do_arquivo(self):
+        total_pedido = PedidoEntrega.objects.filter(pk=self.recentes[0].pk).com_totais().get().valor_total
+        arquivar_pedidos()
+        self.client.force_login(self.usuario)
+
+        response = self.client.get(reverse('perfil'))
+        self.assertEqual(response.context['total_gasto'], total_pedido * 8)
+        self.assertEqual(response.context['total_pedidos'], 9)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CARRINHO_FECHADO_DIAS=7,
+    CARRINHO_ABANDONADO_DIAS=60,
+)
+class LimpezaCarrinhosTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.usuario = User.objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        self.outro = User.objects.create_user(
+            username='outro', email='outro@teste.com', password='senha', nome='Outro'
+        )
+        self.sumo = Produto.objects.create(nome='Sumo', preco=500, categoria='Bebidas', estoque=100)
+        self.agua = Produto.objects.create(nome='Água', preco=200, categoria='Bebidas', estoque=100)
+
+    def _carrinho(self, usuario, estado, dias=0, itens=()):
+        carrinho = Carrinho.objects.create(usuario=usuario, estado=estado)
+        for produto, quantidade in itens:
+            ItemCarrinho.objects.create(carrinho=carrinho, produto=produto, quantidade=quantidade)
+        antigo = timezone.now() - timedelta(days=dias)
+        Carrinho.objects.filter(pk=carrinho.pk).update(data_atualizacao=antigo)
+        ItemCarrinho.objects.filter(carrinho=carrinho).update(data_adicao=antigo)
+        return carrinho
+
+    def test_recolhe_apenas_carrinhos_sem_pedido(self):
+        mortos = [self._carrinho(self.usuario, 'cancelado', 10, [(self.sumo, 1)]) for _ in range(3)]
+        abandonado = self._carrinho(self.outro, 'aberto', 90, [(self.sumo, 1), (self.agua, 2)])
+        inventado = self._carrinho(self.usuario, 'novo', 30)
+        recente = self._carrinho(self.usuario, 'fechado', 1)
+        aberto = self._carrinho(self.usuario, 'aberto', 90, [(self.sumo, 1)])
+        ItemCarrinho.objects.create(carrinho=aberto, produto=self.agua, quantidade=1)
+        com_pedido = self._carrinho(self.usuario, 'fechado', 90, [(self.sumo, 1)])
+        PedidoEntrega.objects.create(carrinho=com_pedido, endereco_entrega='Rua 1')
+
+        relatorio = recolher_carrinhos(lote=2)
+
+        self.assertEqual(relatorio['estados_normalizados'], 1)
+        self.assertEqual(relatorio['fechados'], {'carrinhos': 4, 'itens': 3, 'lotes': 5})
+        self.assertEqual(relatorio['abandonados']['carrinhos'], 1)
+        self.assertEqual(relatorio['abandonados']['itens'], 2)
+        apagados = [c.pk for c in mortos] + [abandonado.pk, inventado.pk]
+        self.assertFalse(Carrinho.objects.filter(pk__in=apagados).exists())
+        self.assertEqual(
+            set(Carrinho.objects.values_list('pk', flat=True)), {recente.pk, aberto.pk, com_pedido.pk}
+        )
+
+    def test_fundir_soma_quantidades(self):
+        destino = self._carrinho(self.usuario, 'aberto', itens=[(self.sumo, 1)])
+        origem = self._carrinho(self.usuario, 'cancelado', itens=[(self.sumo, 2), (self.agua, 3)])
+
+        self.assertEqual(fundir_carrinho(destino, [origem]), 1)
+
+        self.assertFalse(Carrinho.objects.filter(pk=origem.pk).exists())
+        self.assertEqual(
+            dict(destino.itens.values_list('produto__nome', 'quantidade')), {'Sumo': 3, 'Água': 3}
+        )
+
+    def test_comandos(self):
+        self._carrinho(self.usuario, 'cancelado', 10, [(self.sumo, 1)])
+        saida = StringIO()
+        call_command('limpar_carrinhos', stdout=saida)
+        self.assertIn('Fechados sem pedido apagados: 1 (1 itens', saida.getvalue())
+
+        saida = StringIO()
+        call_command('corrigir_carrinhos_duplicados', stdout=saida)
+        self.assertIn('Nenhum carrinho duplicado', saida.getvalue())
+
+    def test_refazer_pedido_reutiliza_carrinho_aberto(self):
+        aberto = self._carrinho(self.usuario, 'aberto', itens=[(self.sumo, 1)])
+        fechado = self._carrinho(self.usuario, 'fechado', itens=[(self.sumo, 2), (self.agua, 1)])
+        pedido = PedidoEntrega.objects.create(carrinho=fechado, endereco_entrega='Rua 1')
+
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('refazer_pedido', args=[pedido.id]))
+
+        self.assertEqual(Carrinho.objects.filter(usuario=self.usuario, estado='aberto').count(), 1)
+        self.assertEqual(
+            dict(aberto.itens.values_list('produto__nome', 'quantidade')), {'Sumo': 3, 'Água': 1}
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AdminPedidosTest(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            username='admin', email='admin@teste.com', password='senha', nome='Admin'
+        )
+        self.client.force_login(self.admin)
+        self.produtos = [
+            Produto.objects.create(nome=f'Produto {i}', preco=1500, categoria='Bebidas', estoque=100)
+            for i in range(3)
+        ]
+
+    def _criar_pedidos(self, quantidade):
+        for i in range(quantidade):
+            carrinho = Carrinho.objects.create(usuario=self.admin, estado='fechado')
+            for produto in self.produtos:
+                ItemCarrinho.objects.create(carrinho=carrinho, produto=produto, quantidade=i + 1)
+            PedidoEntrega.objects.create(carrinho=carrinho, endereco_entrega='Rua 1')
+
+    def _consultas(self, url):
+        self.client.get(url)  # aquece os context processors em cache
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return len(consultas)
+
+    def test_changelists_com_numero_fixo_de_consultas(self):
+        for nome in ('admin:carinho_pedidoentrega_changelist', 'admin:carinho_carrinho_changelist'):
+            self._criar_pedidos(2)
+            poucas = self._consultas(reverse(nome))
+            self._criar_pedidos(15)
+            self.assertEqual(self._consultas(reverse(nome)), poucas)
+
+    def test_totais_anotados_no_changelist(self):
+        self._criar_pedidos(1)
+        resposta = self.client.get(reverse('admin:carinho_pedidoentrega_changelist'))
+        carrinho = Carrinho.objects.get()
+        self.assertContains(resposta, f'KZ {carrinho.total:.2f}')
+
+    def test_formulario_do_pedido_usa_fragmentos_em_cache(self):
+        self._criar_pedidos(1)
+        url = reverse('admin:carinho_pedidoentrega_change', args=[PedidoEntrega.objects.get().pk])
+        resposta = self.client.get(url)
+        self.assertContains(resposta, 'Produto 2')
+        self.assertContains(resposta, 'Total de itens')
+
+        # Segunda vez: os itens já não são consultados
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(url)
+        self.assertFalse(any('AS "valor"' in q['sql'] for q in consultas))
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    POPULARIDADE_MEIA_VIDA_DIAS=7,
+)
+class PopularidadeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        self.hamburguer, self.batata, self.sumo = [
+            Produto.objects.create(nome=nome, preco=1000, categoria='Lanches', estoque=50, ordem=ordem)
+            for ordem, nome in enumerate(['Hambúrguer', 'Batata', 'Sumo'])
+        ]
+
+    def _entregar(self, quantidades, dias=0):
+        carrinho = Carrinho.objects.create(usuario=self.usuario, estado='fechado')
+        for produto, quantidade in quantidades.items():
+            ItemCarrinho.objects.create(carrinho=carrinho, produto=produto, quantidade=quantidade)
+        pedido = PedidoEntrega.objects.create(
+            carrinho=carrinho, endereco_entrega='Rua 1', numero_pedido=f'POP-{carrinho.pk}', estado='despachado'
+        )
+        transicionar(pedido, 'entregue')
+        PedidoEvento.objects.filter(pedido=pedido).update(data_evento=timezone.now() - timedelta(days=dias))
+
+    def test_vendas_recentes_pesam_mais(self):
+        # 4 unidades há 3 meias-vidas valem 0,5; 1 unidade hoje vale 1
+        self._entregar({self.batata: 4}, dias=21)
+        self._entregar({self.sumo: 1})
+
+        pontuacoes = calcular_pontuacoes()
+        self.assertAlmostEqual(pontuacoes[self.batata.id] / pontuacoes[self.sumo.id], 0.5, places=1)
+        self.assertEqual(obter_produtos_populares(3), [self.sumo, self.batata, self.hamburguer])
+
+    @skipUnless(importlib.util.find_spec('fakeredis'), 'fakeredis não instalado')
+    def test_conjunto_inexistente_no_redis_usa_o_sql(self):
+        import fakeredis
+
+        self._entregar({self.sumo: 3})
+        with mock.patch('carinho.popularidade.obter_redis', return_value=fakeredis.FakeRedis()):
+            self.assertEqual(obter_produtos_populares(2), [self.sumo, self.hamburguer])
+
+    def test_sem_vendas_usa_ordem_do_menu_e_ignora_indisponiveis(self):
+        self.assertEqual(obter_produtos_populares(2), [self.hamburguer, self.batata])
+
+        self._entregar({self.sumo: 2})
+        Produto.objects.filter(pk=self.sumo.pk).update(estoque=0)
+        cache.clear()
+        self.assertEqual(Produto.obter_produtos_populares(2), [self.hamburguer, self.batata])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EstadoCarrinhoTest(TestCase):
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        self.sumo = Produto.objects.create(nome='Sumo', preco=800, categoria='Bebidas', estoque=10)
+        self.burger = Produto.objects.create(nome='Burger', preco=3500, categoria='hamburguer', estoque=10)
+        aberto = Carrinho.objects.create(usuario=self.usuario, estado='aberto')
+        self.item = ItemCarrinho.objects.create(carrinho=aberto, produto=self.sumo, quantidade=3)
+        fechado = Carrinho.objects.create(usuario=self.usuario, estado='fechado')
+        ItemCarrinho.objects.create(carrinho=fechado, produto=self.burger, quantidade=1)
+
+    def test_itens_do_carrinho_aberto_numa_consulta(self):
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('estado_carrinho'))
+        dados = resposta.json()
+
+        self.assertEqual(dados['itens'], {str(self.sumo.pk): {'item': self.item.pk, 'quantidade': 3}})
+        self.assertEqual(dados['total_itens'], 3)
+        self.assertTrue(dados['csrf'])
+        self.assertIn('no-cache', resposta['Cache-Control'])
+        # Além da sessão e do usuário, uma só consulta aos itens
+        self.assertEqual(len([c for c in consultas if 'carinho_itemcarrinho' in c['sql']]), 1)
+
+    def test_favoritos_nome_e_mensagens_pendentes(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorito.objects.create(usuario=self.usuario, produto=self.burger)
+            self.client.post(reverse('adicionar_favorito', args=[self.sumo.pk]))
+
+        dados = self.client.get(reverse('estado_carrinho')).json()
+        self.assertEqual(dados['usuario'], 'Cliente')
+        self.assertEqual(dados['favoritos'], sorted([self.sumo.pk, self.burger.pk]))
+        self.assertEqual(len(dados['mensagens']), 1)
+        self.assertEqual(dados['mensagens'][0]['tipo'], 'success')
+        # Entregues uma só vez
+        self.assertEqual(self.client.get(reverse('estado_carrinho')).json()['mensagens'], [])
+
+    def test_anonimo_sem_itens(self):
+        dados = self.client.get(reverse('estado_carrinho')).json()
+        self.assertEqual((dados['autenticado'], dados['itens'], dados['total_itens']), (False, {}, 0))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TransicoesTest(TestCase):
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        self.sumo = Produto.objects.create(nome='Sumo', preco=800, categoria='Bebidas', estoque=10)
+
+    def _pedido(self, estado='pendente', quantidade=2):
+        carrinho = Carrinho.objects.create(usuario=self.usuario, estado='fechado')
+        ItemCarrinho.objects.create(carrinho=carrinho, produto=self.sumo, quantidade=quantidade)
+        return PedidoEntrega.objects.create(carrinho=carrinho, endereco_entrega='Rua 1', estado=estado)
+
+    def test_transicao_invalida_levanta_e_nao_regista(self):
+        pedido = self._pedido('entregue')
+        with self.assertRaises(TransicaoInvalida):
+            transicionar(pedido, 'cancelado')
+        self.assertFalse(PedidoEvento.objects.filter(pedido=pedido).exists())
+        self.assertEqual(PedidoEntrega.objects.get(pk=pedido.pk).estado, 'entregue')
+
+    def test_cancelar_regista_um_evento_e_devolve_estoque(self):
+        pedido = self._pedido(quantidade=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            evento = transicionar(pedido, 'cancelado', usuario=self.usuario)
+
+        self.assertEqual(list(PedidoEvento.objects.filter(pedido=pedido)), [evento])
+        self.assertEqual((evento.estado_anterior, evento.estado_novo), ('pendente', 'cancelado'))
+        self.sumo.refresh_from_db()
+        self.assertEqual(self.sumo.estoque, 13)
+
+    def test_em_lote_ignora_invalidos_e_regista_um_evento_por_pedido(self):
+        validos = [self._pedido('pendente'), self._pedido('confirmado')]
+        invalido = self._pedido('despachado')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = transicionar_em_lote(validos + [invalido], 'cancelado')
+
+        self.assertEqual(resultado, (2, 1))
+        self.assertEqual(
+            sorted(PedidoEvento.objects.values_list('pedido_id', flat=True)), sorted(p.pk for p in validos)
+        )
+        self.assertEqual(PedidoEntrega.objects.get(pk=invalido.pk).estado, 'despachado')
+        self.sumo.refresh_from_db()
+        self.assertEqual(self.sumo.estoque, 14)
+
+    def test_eventos_sao_imutaveis(self):
+        evento = PedidoEvento.objects.create(pedido=self._pedido(), estado_novo='pendente')
+        evento.observacao = 'alterado'
+        with self.assertRaises(ValueError):
+            evento.save()
+        with self.assertRaises(ValueError):
+            evento.delete()
+        self.assertTrue(PedidoEvento.objects.filter(pk=evento.pk, observacao='').exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EventosPedidoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        modelo = get_user_model()
+        cls.dono = modelo.objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        cls.outro = modelo.objects.create_user(
+            username='outro', email='outro@teste.com', password='senha', nome='Outro'
+        )
+        cls.staff = modelo.objects.create_user(
+            username='staff', email='staff@teste.com', password='senha', nome='Staff', is_staff=True
+        )
+        cls.pedido = PedidoEntrega.objects.create(
+            carrinho=Carrinho.objects.create(usuario=cls.dono, estado='fechado'),
+            endereco_entrega='Rua 1', estado='entregue'
+        )
+        cls.evento = PedidoEvento.objects.create(
+            pedido=cls.pedido, estado_anterior='despachado', estado_novo='entregue'
+        )
+        cls.url = reverse('eventos_pedido', args=[cls.pedido.id])
+
+    async def _ler(self, response):
+        return [parte.decode() if isinstance(parte, bytes) else parte async for parte in response.streaming_content]
+
+    async def test_anonimo_e_outro_usuario_sao_recusados(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+        await self.async_client.aforce_login(self.outro)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_dono_recebe_estado_atual_no_primeiro_frame(self):
+        await self.async_client.aforce_login(self.dono)
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        # Estado final: um único frame e a ligação termina
+        frames = await self._ler(response)
+        self.assertEqual(len(frames), 1)
+        self.assertTrue(frames[0].startswith(f'retry: {RETRY_CLIENTE_MS}\nid: {self.evento.id}\nevent: estado\n'))
+        self.assertIn('"estado": "entregue"', frames[0])
+        self.assertIn('"estado_display": "Entregue"', frames[0])
+
+    async def test_staff_ve_pedido_de_outro_usuario(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('"estado": "entregue"', (await self._ler(response))[0])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FilaPedidosTest(TestCase):
+    def setUp(self):
+        modelo = get_user_model()
+        self.cliente = modelo.objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        self.staff = modelo.objects.create_user(
+            username='staff', email='staff@teste.com', password='senha', nome='Staff', is_staff=True
+        )
+        self.pendente = self._pedido('pendente')
+        self.preparacao = self._pedido('preparacao')
+
+    def _pedido(self, estado):
+        carrinho = Carrinho.objects.create(usuario=self.cliente, estado='fechado')
+        pedido = PedidoEntrega.objects.create(carrinho=carrinho, endereco_entrega='Rua 1', estado=estado)
+        PedidoEvento.objects.create(pedido=pedido, estado_novo=estado)
+        return pedido
+
+    def _mudar(self, pedido, estado):
+        PedidoEntrega.objects.filter(pk=pedido.pk).update(estado=estado)
+        return PedidoEvento.objects.create(pedido=pedido, estado_anterior=pedido.estado, estado_novo=estado)
+
+    def test_cursor_devolve_alterados_e_removidos(self):
+        cursor = ler_cursor(cursor_atual())
+        self.assertIsNone(obter_alteracoes(cursor))
+
+        self._mudar(self.pendente, 'confirmado')
+        self._mudar(self.preparacao, 'cancelado')
+        alteracoes = obter_alteracoes(cursor)
+
+        self.assertEqual([p['id'] for p in alteracoes['pedidos']], [self.pendente.id])
+        self.assertEqual(alteracoes['pedidos'][0]['estado'], 'confirmado')
+        self.assertEqual(alteracoes['removidos'], [self.preparacao.id])
+        self.assertIsNone(obter_alteracoes(ler_cursor(alteracoes['cursor'])))
+
+    def test_evento_confirmado_tarde_nao_se_perde(self):
+        atrasado = self._mudar(self.pendente, 'confirmado')
+        seguinte = self._mudar(self.preparacao, 'despachado')
+        # A leitura anterior viu o evento seguinte, mas o de id menor ainda não estava confirmado
+        base = PedidoEvento.objects.filter(id__lt=atrasado.id).latest('id').id
+        cursor = formatar_cursor(base, [seguinte.id])
+
+        alteracoes = obter_alteracoes(ler_cursor(cursor))
+        self.assertEqual([p['id'] for p in alteracoes['pedidos']], [self.pendente.id])
+        self.assertEqual(ler_cursor(alteracoes['cursor']), (base, {atrasado.id, seguinte.id}))
+
+    def test_base_avanca_sobre_eventos_antigos(self):
+        PedidoEvento.objects.update(data_evento=timezone.now() - JANELA_ATRASO * 2)
+        ultimo = PedidoEvento.objects.latest('id').id
+        self.assertEqual(cursor_atual(), str(ultimo))
+
+        evento = self._mudar(self.pendente, 'confirmado')
+        alteracoes = obter_alteracoes(ler_cursor('0'))
+        self.assertEqual(alteracoes['cursor'], f'{ultimo}.{evento.id}')
+
+    def test_cursor_invalido(self):
+        for texto in ('', 'x', '5.3', '-1'):
+            with self.assertRaises(ValueError):
+                ler_cursor(texto)
+
+    async def test_feed_so_para_staff(self):
+        url = reverse('feed_fila_pedidos')
+        self.assertEqual((await self.async_client.get(url)).status_code, 403)
+        await self.async_client.aforce_login(self.cliente)
+        self.assertEqual((await self.async_client.get(url, {'cursor': '0'})).status_code, 403)
+
+        await self.async_client.aforce_login(self.staff)
+        completo = (await self.async_client.get(url)).json()
+        self.assertTrue(completo['completo'])
+        self.assertEqual({p['id'] for p in completo['pedidos']}, {self.pendente.id, self.preparacao.id})
+
+        alteracoes = (await self.async_client.get(url, {'cursor': '0'})).json()
+        self.assertFalse(alteracoes['completo'])
+        self.assertEqual(len(alteracoes['pedidos']), 2)
@@ -0,0 +1,217 @@
+# carinho/transicoes.py
+"""
+Máquina de estados dos pedidos de entrega.
+
+Todas as mudanças de `PedidoEntrega.estado` devem passar por aqui: as
+transições são validadas, cada mudança fica registada em `PedidoEvento`
+e o cache é invalidado uma única vez, depois do commit (mesmo em lote).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, QuerySet, Window
+from django.db.models.functions import Lead
+from django.utils import timezone
+
+from index.invalidacao import invalidar
+
+from .arquivo import arquivo_necessario
+from .models import PedidoEntrega, PedidoEvento, PedidoEventoArquivado
+from .popularidade import registrar_entregas
+from .tempo_real import publicar_estados
+
+TRANSICOES_PERMITIDAS = {
+    'pendente': {'confirmado', 'cancelado'},
+    'confirmado': {'preparacao', 'cancelado'},
+    'preparacao': {'despachado', 'cancelado'},
+    'despachado': {'entregue'},
+    'entregue': set(),
+    'cancelado': set(),
+}
+
+ESTADOS_ATIVOS = ['pendente', 'confirmado', 'preparacao', 'despachado']
+
+# Etapas medidas para SLA: (estado de início, estado de fim)
+ETAPAS_SLA = {
+    'confirmacao': ('pendente', 'confirmado'),
+    'preparacao': ('preparacao', 'despachado'),
+    'entrega': ('despachado', 'entregue'),
+}
+
+
+class TransicaoInvalida(Exception):
+    """Transição de estado não permitida para o pedido"""
+
+
+def pode_transicionar(estado_atual, novo_estado):
+    """Indica se a máquina de estados permite a transição"""
+    return novo_estado in TRANSICOES_PERMITIDAS.get(estado_atual, set())
+
+
+def registrar_criacao(pedido, usuario=None):
+    """Regista o evento inicial de um pedido acabado de criar"""
+    evento = PedidoEvento.objects.create(
+        pedido=pedido,
+        estado_anterior='',
+        estado_novo=pedido.estado,
+        usuario=usuario,
+    )
+    publicar_estados([evento])
+    return evento
+
+
+def transicionar(pedido, novo_estado, usuario=None, observacao=''):
+    """
+    Muda o estado de um pedido, validando a transição e registando o evento.
+    Levanta TransicaoInvalida se a transição não for permitida.
+    """
+    with transaction.atomic():
+        atual = PedidoEntrega.objects.select_for_update().only('estado').get(pk=pedido.pk)
+
+        if not pode_transicionar(atual.estado, novo_estado):
+            raise TransicaoInvalida(
+                f'Não é possível passar o pedido #{pedido.pk} de '
+                f'"{atual.estado}" para "{novo_estado}".'
+            )
+
+        estado_anterior = atual.estado
+        pedido.estado = novo_estado
+        pedido.save()
+
+        evento = PedidoEvento.objects.create(
+            pedido=pedido,
+            estado_anterior=estado_anterior,
+            estado_novo=novo_estado,
+            usuario=usuario,
+            observacao=observacao,
+        )
+
+        if novo_estado == 'cancelado':
+            _restaurar_estoque([pedido.pk])
+        elif novo_estado == 'entregue':
+            registrar_entregas([pedido.pk])
+
+        publicar_estados([evento])
+
+    return evento
+
+
+def transicionar_em_lote(pedidos, novo_estado, usuario=None, observacao=''):
+    """
+    Aplica a mesma transição a vários pedidos com um único UPDATE, um único
+    INSERT de eventos e uma única invalidação de cache.
+    Pedidos cuja transição não é permitida são ignorados.
+    Retorna (quantidade_atualizada, quantidade_ignorada).
+    """
+    if isinstance(pedidos, QuerySet):
+        ids = list(pedidos.values_list('pk', flat=True))
+    else:
+        ids = [getattr(pedido, 'pk', pedido) for pedido in pedidos]
+
+    with transaction.atomic():
+        bloqueados = list(
+            PedidoEntrega.objects.select_for_update(of=('self',))
+            .select_related('carrinho')
+            .filter(pk__in=ids)
+        )
+        validos = [p for p in bloqueados if pode_transicionar(p.estado, novo_estado)]
+
+        if validos:
+            agora = timezone.now()
+            PedidoEntrega.objects.filter(
+                pk__in=[p.pk for p in validos]
+            ).update(estado=novo_estado, data_atualizacao=agora)
+
+            eventos = PedidoEvento.objects.bulk_create([
+                PedidoEvento(
+                    pedido=p,
+                    estado_anterior=p.estado,
+                    estado_novo=novo_estado,
+                    usuario=usuario,
+                    observacao=observacao,
+                    data_evento=agora,
+                )
+                for p in validos
+            ])
+
+            if novo_estado == 'cancelado':
+                _restaurar_estoque([p.pk for p in validos])
+            elif novo_estado == 'entregue':
+                registrar_entregas([p.pk for p in validos])
+
+            publicar_estados(eventos)
+
+            for p in validos:
+                invalidar(*p.chaves_cache())
+
+    return len(validos), len(bloqueados) - len(validos)
+
+
+def _restaurar_estoque(pedido_ids):
+    """Devolve ao estoque os produtos dos pedidos cancelados"""
+    from menu.estoque import devolver_estoque
+    from .models import ItemCarrinho
+
+    quantidades = defaultdict(int)
+    for produto_id, quantidade in ItemCarrinho.objects.filter(
+        carrinho__pedido_entrega__in=pedido_ids
+    ).values_list('produto_id', 'quantidade'):
+        quantidades[produto_id] += quantidade
+
+    devolver_estoque(quantidades)
+
+
+def obter_metricas_sla(dias=30):
+    """
+    Calcula a duração média e máxima de cada etapa (confirmação, preparação,
+    entrega) a partir do registo de eventos, usando a função de janela LEAD
+    para emparelhar cada evento com o seguinte do mesmo pedido. Os eventos
+    arquivados entram quando o intervalo chega ao arquivo.
+    """
+    cache_key = f'metricas_sla_pedidos_{dias}'
+    metricas = cache.get(cache_key)
+
+    if metricas is None:
+        inicio = timezone.now() - timedelta(days=dias)
+        duracoes = defaultdict(list)
+        _acumular_duracoes(
+            PedidoEvento.objects.filter(pedido__data_solicitacao__gte=inicio), duracoes
+        )
+        if arquivo_necessario(inicio):
+            _acumular_duracoes(
+                PedidoEventoArquivado.objects.filter(pedido__data_solicitacao__gte=inicio),
+                duracoes
+            )
+
+        metricas = {}
+        for etapa in ETAPAS_SLA:
+            valores = duracoes.get(etapa, [])
+            metricas[etapa] = {
+                'pedidos': len(valores),
+                'media_minutos': round(sum(valores) / len(valores) / 60, 1) if valores else None,
+                'maximo_minutos': round(max(valores) / 60, 1) if valores else None,
+            }
+
+        cache.set(cache_key, metricas, 300)  # 5 minutos
+
+    return metricas
+
+
+def _acumular_duracoes(eventos, duracoes):
+    """Junta a `duracoes` a duração de cada etapa SLA dos eventos dados"""
+    janela = {
+        'partition_by': [F('pedido_id')],
+        'order_by': [F('data_evento').asc(), F('id').asc()],
+    }
+    eventos = eventos.annotate(
+        proximo_estado=Window(Lead('estado_novo'), **janela),
+        proxima_data=Window(Lead('data_evento'), **janela),
+    ).values_list('estado_novo', 'data_evento', 'proximo_estado', 'proxima_data')
+
+    etapas_por_par = {par: nome for nome, par in ETAPAS_SLA.items()}
+    for estado, data, proximo_estado, proxima_data in eventos:
+        etapa = etapas_por_par.get((estado, proximo_estado))
+        if etapa and proxima_data:
+            duracoes[etapa].append((proxima_data - data).total_seconds())
@@ -1,21 +1,29 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
-from django.http import JsonResponse
-from django.db import transaction
-from django.views.decorators.cache import cache_page
+from django.http import JsonResponse, HttpResponseForbidden, Http404, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import cache_page, never_cache
 from django.views.decorators.vary import vary_on_cookie
+from asgiref.sync import sync_to_async
+import asyncio
 from functools import wraps
 import logging
-import threading
+from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
 from .models import Carrinho, ItemCarrinho, PedidoEntrega
 from .forms import AdicionarAoCarrinhoForm, PedidoEntregaForm, AtualizarItemForm
-from menu.models import Produto
+from .transicoes import TransicaoInvalida, registrar_criacao, transicionar
+from .tempo_real import REDIS_INDISPONIVEL, central_eventos, fluxo_estados
+from .fila import formatar_cursor, ler_cursor, obter_alteracoes, obter_fila
+from .historico import obter_pagina_historico, serializar_pedido_historico
+from menu.estoque import EstoqueInsuficiente, estoque_atual, reservar_estoque
+from menu.models import Favorito, Produto
+from index.invalidacao import agrupar_invalidacoes, invalidar
 from django.views.decorators.http import require_http_methods
 from django.db import IntegrityError
 from datetime import time
@@ -64,8 +72,39 @@ def ver_carrinho(request):
     }
     return render(request, 'ver_carrinho.html', context)
 
+# SEM CACHE - estado do usuário sobreposto no navegador às páginas do
+# catálogo, que assim são iguais (e cacheadas) para todos do mesmo perfil
+@never_cache
+def estado_carrinho(request):
+    """Carrinho aberto (uma consulta), favoritos, nome e mensagens pendentes em JSON"""
+    itens = {}
+    favoritos = []
+    usuario = ''
+    if request.user.is_authenticated:
+        for item_id, produto_id, quantidade in ItemCarrinho.objects.filter(
+            carrinho__usuario=request.user, carrinho__estado='aberto'
+        ).values_list('id', 'produto_id', 'quantidade'):
+            itens[produto_id] = {'item': item_id, 'quantidade': quantidade}
+        favoritos = sorted(Favorito.ids_favoritos(request.user))
+        usuario = request.user.nome or request.user.username
+
+    return JsonResponse({
+        'autenticado': request.user.is_authenticated,
+        'usuario': usuario,
+        'itens': itens,
+        'total_itens': sum(item['quantidade'] for item in itens.values()),
+        'favoritos': favoritos,
+        # Lidas aqui, ficam consumidas: as páginas em cache já não as mostram
+        'mensagens': [
+            {'texto': str(mensagem), 'tipo': mensagem.tags} for mensagem in messages.get_messages(request)
+        ],
+        # Os formulários das páginas partilhadas recebem o token deste usuário
+        'csrf': get_token(request),
+    })
+
 # SEM CACHE - operação de escrita
 @login_required
+@agrupar_invalidacoes()
 def adicionar_ao_carrinho(request, produto_id):
     """Adiciona produto ao carrinho - VERSÃO CORRIGIDA"""
     try:
@@ -82,8 +121,9 @@ def adicionar_ao_carrinho(request, produto_id):
                 quantidade = form.cleaned_data['quantidade']
                 
                 # Verificar estoque
-                if quantidade > produto.estoque:
-                    messages.error(request, f'Estoque insuficiente. Disponível: {produto.estoque}')
+                disponivel = estoque_atual(produto)
+                if quantidade > disponivel:
+                    messages.error(request, f'Estoque insuficiente. Disponível: {disponivel}')
                     return redirect('detalhes_produto', pk=produto_id)
                 
                 # Adicionar ou atualizar item
@@ -95,7 +135,7 @@ def adicionar_ao_carrinho(request, produto_id):
                 
                 if not created:
                     nova_quantidade = item.quantidade + quantidade
-                    if nova_quantidade > produto.estoque:
+                    if nova_quantidade > disponivel:
                         messages.error(request, 'Quantidade excede estoque disponível.')
                         return redirect('detalhes_produto', pk=produto_id)
                     item.quantidade = nova_quantidade
@@ -116,6 +156,7 @@ def adicionar_ao_carrinho(request, produto_id):
 
 # SEM CACHE - operação de escrita
 @login_required
+@agrupar_invalidacoes()
 def atualizar_item_carrinho(request, item_id):
     """Atualiza quantidade de um item no carrinho - VERSÃO CORRIGIDA"""
     try:
@@ -133,8 +174,9 @@ def atualizar_item_carrinho(request, item_id):
                 nova_quantidade = form.cleaned_data['quantidade']
                 
                 # Verificar estoque
-                if nova_quantidade > item.produto.estoque:
-                    messages.error(request, f'Estoque insuficiente. Disponível: {item.produto.estoque}')
+                disponivel = estoque_atual(item.produto)
+                if nova_quantidade > disponivel:
+                    messages.error(request, f'Estoque insuficiente. Disponível: {disponivel}')
                 else:
                     if nova_quantidade == 0:
                         produto_nome = item.produto.nome
@@ -156,6 +198,7 @@ def atualizar_item_carrinho(request, item_id):
 
 # SEM CACHE - operação de escrita
 @login_required
+@agrupar_invalidacoes()
 def remover_do_carrinho(request, item_id):
     """Remove item do carrinho"""
     item = get_object_or_404(ItemCarrinho, id=item_id, carrinho__usuario=request.user)
@@ -169,6 +212,7 @@ def remover_do_carrinho(request, item_id):
 
 # SEM CACHE - operação de escrita
 @login_required
+@agrupar_invalidacoes()
 def limpar_carrinho(request):
     """Remove todos os itens do carrinho"""
     carrinho = obter_carrinho(request)
@@ -184,16 +228,29 @@ def limpar_carrinho(request):
 @cache_page(60 * 10)
 @vary_on_cookie
 def historico_pedidos(request):
-    """Histórico de pedidos do usuário"""
-    pedidos = PedidoEntrega.objects.filter(
-        carrinho__usuario=request.user
-    ).order_by('-data_solicitacao')
+    """Histórico de pedidos do usuário, paginado por cursor"""
+    pagina = obter_pagina_historico(request.user, request.GET.get('cursor'))
     
     context = {
-        'pedidos': pedidos,
+        'pedidos': pagina['pedidos'],
+        'proximo_cursor': pagina['proximo_cursor'],
+        'cursor': request.GET.get('cursor', ''),
+        'versao_pagina': pagina['versao'],
     }
     return render(request, 'historico_pedidos.html', context)
 
+# Cache para histórico em JSON (scroll infinito) - 10 minutos
+@login_required
+@cache_page(60 * 10)
+@vary_on_cookie
+def historico_pedidos_json(request):
+    """Página do histórico em JSON para scroll infinito"""
+    pagina = obter_pagina_historico(request.user, request.GET.get('cursor'))
+    return JsonResponse({
+        'pedidos': [serializar_pedido_historico(p) for p in pagina['pedidos']],
+        'proximo_cursor': pagina['proximo_cursor'],
+    })
+
 # Cache para detalhes do pedido - 15 minutos
 @login_required
 @cache_page(60 * 15)
@@ -211,6 +268,79 @@ def detalhes_pedido(request, pedido_id):
     }
     return render(request, 'detalhes_pedido.html', context)
 
+# SEM CACHE - ligação SSE de longa duração (servida via ASGI)
+async def eventos_pedido(request, pedido_id):
+    """Envia em tempo real (Server-Sent Events) as mudanças de estado do pedido"""
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        return HttpResponseForbidden()
+    
+    pedidos = PedidoEntrega.objects.filter(id=pedido_id)
+    if not usuario.is_staff:
+        pedidos = pedidos.filter(carrinho__usuario=usuario)
+    if not await pedidos.aexists():
+        raise Http404
+    
+    response = StreamingHttpResponse(
+        fluxo_estados(pedido_id, {'entregue', 'cancelado'}),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Não acumular no proxy (nginx)
+    return response
+
+# SEM CACHE - fila de pedidos para a cozinha/expedição
+@never_cache
+@staff_member_required
+def fila_pedidos(request):
+    """Ecrã da fila de pedidos ativos (atualizado via feed JSON)"""
+    return render(request, 'fila_pedidos.html', {'fila': obter_fila()})
+
+# Tempo máximo de espera do long-polling
+ESPERA_FEED_FILA = 25  # segundos
+INTERVALO_CONSULTA_FILA = 3  # segundos, só sem Redis
+
+@never_cache
+async def feed_fila_pedidos(request):
+    """
+    Feed JSON da fila. Sem ?cursor devolve a fila completa; com o cursor
+    da resposta anterior espera (long-polling) até haver eventos que ainda
+    não viu e devolve só os pedidos alterados.
+    """
+    usuario = await request.auser()
+    if not usuario.is_staff:
+        return HttpResponseForbidden()
+    
+    try:
+        cursor = ler_cursor(request.GET['cursor'])
+    except (KeyError, ValueError):
+        return JsonResponse(await sync_to_async(obter_fila)())
+    
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + ESPERA_FEED_FILA
+    fila = central_eventos.inscrever()
+    redis_disponivel = True
+    try:
+        while True:
+            alteracoes = await sync_to_async(obter_alteracoes)(cursor)
+            restante = limite - loop.time()
+            if alteracoes or restante <= 0:
+                break
+            
+            espera = restante if redis_disponivel else min(restante, INTERVALO_CONSULTA_FILA)
+            try:
+                mensagem = await asyncio.wait_for(fila.get(), timeout=espera)
+                if mensagem is REDIS_INDISPONIVEL:
+                    redis_disponivel = False
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        central_eventos.cancelar(None, fila)
+    
+    return JsonResponse(alteracoes or {
+        'cursor': formatar_cursor(*cursor), 'completo': False, 'pedidos': [], 'removidos': []
+    })
+
 # SEM CACHE - view de processo de pedido
 @require_http_methods(["GET", "POST"])
 def solicitar_entrega(request):
@@ -330,17 +460,24 @@ def criar_carrinho_estado_alternativo(request):
 def processar_pedido_final(request, form, carrinho):
     """Processa pedido e LIBERA a UNIQUE constraint"""
     try:
-        with transaction.atomic():
-            if hasattr(carrinho, 'pedido_entrega'):
-                messages.info(request, 'Este carrinho já tem um pedido.')
-                if 'carrinho_id' in request.session:
-                    del request.session['carrinho_id']
-                return redirect('solicitar_entrega')
-            
+        if hasattr(carrinho, 'pedido_entrega'):
+            messages.info(request, 'Este carrinho já tem um pedido.')
+            if 'carrinho_id' in request.session:
+                del request.session['carrinho_id']
+            return redirect('solicitar_entrega')
+        
+        # Baixa o estoque (Redis para produtos em promoção, senão a linha do produto)
+        quantidades = defaultdict(int)
+        for produto_id, quantidade in carrinho.itens.values_list('produto_id', 'quantidade'):
+            quantidades[produto_id] += quantidade
+        
+        # reservar_estoque abre a transação do pedido e devolve a reserva se não houver commit
+        with reservar_estoque(quantidades):
             pedido = form.save(commit=False)
             pedido.carrinho = carrinho
             pedido.numero_pedido = gerar_numero_pedido_unico()
             pedido.save()
+            registrar_criacao(pedido, usuario=request.user)
             
             carrinho.estado = 'fechado'
             carrinho.save()
@@ -349,30 +486,26 @@ def processar_pedido_final(request, form, carrinho):
             invalidar_cache_pedidos(request.user)
             invalidar_cache_carrinho(request.user)
             
-            threading.Thread(
-                target=processamento_final, 
-                args=(carrinho.id, pedido.id), 
-                daemon=True
-            ).start()
-            
-            if 'carrinho_id' in request.session:
-                del request.session['carrinho_id']
-            
-            messages.success(request, f'Pedido #{pedido.numero_pedido} realizado com sucesso!')
-            return redirect('detalhes_pedido', pedido_id=pedido.id)
+            # Gravado na mesma transação; enviado pelo worker após o commit
+            enviar_notificacao_admin(pedido)
+        
+        if 'carrinho_id' in request.session:
+            del request.session['carrinho_id']
+        
+        messages.success(request, f'Pedido #{pedido.numero_pedido} realizado com sucesso!')
+        return redirect('detalhes_pedido', pedido_id=pedido.id)
+    
+    except EstoqueInsuficiente as e:
+        produto = Produto.objects.filter(pk=e.produto_id).first()
+        nome = produto.nome if produto else 'um dos produtos'
+        messages.error(request, f'Estoque insuficiente para {nome}. Disponível: {e.disponivel}')
+        return redirect('ver_carrinho')
             
     except Exception as e:
         logger.error(f"❌ Erro em processar_pedido_final: {str(e)}")
         messages.error(request, 'Erro ao finalizar pedido.')
         return redirect('solicitar_entrega')
 
-def processamento_final(carrinho_id, pedido_id):
-    """Processamento final em background"""
-    try:
-        logger.info(f"✅ Pedido {pedido_id} processado - Carrinho {carrinho_id} fechado")
-    except Exception as e:
-        logger.error(f"❌ Erro em processamento_final: {str(e)}")
-
 # SEM CACHE - operação de escrita
 @login_required
 def cancelar_pedido(request, pedido_id):
@@ -384,21 +517,16 @@ def cancelar_pedido(request, pedido_id):
     )
     
     if pedido.estado == 'pendente':
-        pedido.estado = 'cancelado'
-        pedido.save()
-        
-        # Restaurar estoque dos produtos
-        for item in pedido.carrinho.itens.all():
-            produto = item.produto
-            produto.estoque += item.quantidade
-            if produto.status == 'esgotado':
-                produto.status = 'ativo'
-            produto.save()
-        
-        # Invalidar caches
-        invalidar_cache_pedidos(request.user)
-        
-        messages.success(request, f'Pedido #{pedido.id} cancelado com sucesso.')
+        try:
+            # A transição para 'cancelado' também devolve o estoque dos produtos
+            transicionar(pedido, 'cancelado', usuario=request.user)
+            
+            # Invalidar caches
+            invalidar_cache_pedidos(request.user)
+            
+            messages.success(request, f'Pedido #{pedido.id} cancelado com sucesso.')
+        except TransicaoInvalida:
+            messages.error(request, 'Este pedido não pode ser cancelado.')
     else:
         messages.error(request, 'Este pedido não pode ser cancelado.')
     
@@ -409,7 +537,7 @@ def cancelar_pedido(request, pedido_id):
 def alterar_estado_pedido(request, pedido_id):
     """Altera o estado de um pedido (para admin ou usuário)"""
     pedido = get_object_or_404(
-        PedidoEntrega, 
+        PedidoEntrega.objects.select_related('carrinho__usuario'), 
         id=pedido_id
     )
     
@@ -420,22 +548,28 @@ def alterar_estado_pedido(request, pedido_id):
     if request.method == 'POST':
         novo_estado = request.POST.get('estado')
         
-        if novo_estado in dict(PedidoEntrega.ESTADO_PEDIDO_CHOICES):
-            estado_anterior = pedido.estado
-            pedido.estado = novo_estado
-            pedido.save()
-            
-            # Invalidar cache de pedidos
-            invalidar_cache_pedidos(request.user)
-            
-            messages.success(request, f'Pedido #{pedido.id} alterado de {estado_anterior} para {novo_estado}.')
-        else:
+        if novo_estado not in dict(PedidoEntrega.ESTADO_PEDIDO_CHOICES):
             messages.error(request, 'Estado inválido.')
+        elif not request.user.is_staff and not (novo_estado == 'cancelado' and pedido.estado == 'pendente'):
+            # Clientes só podem cancelar pedidos ainda pendentes
+            messages.error(request, 'Você não tem permissão para alterar este pedido.')
+        else:
+            estado_anterior = pedido.estado
+            try:
+                transicionar(pedido, novo_estado, usuario=request.user)
+                
+                # Invalidar cache de pedidos
+                invalidar_cache_pedidos(pedido.carrinho.usuario)
+                
+                messages.success(request, f'Pedido #{pedido.id} alterado de {estado_anterior} para {novo_estado}.')
+            except TransicaoInvalida as e:
+                messages.error(request, str(e))
     
     return redirect('detalhes_pedido', pedido_id=pedido.id)
 
 # SEM CACHE - operação de escrita
 @login_required
+@agrupar_invalidacoes()
 def refazer_pedido(request, pedido_id):
     pedido_original = get_object_or_404(
         PedidoEntrega, 
@@ -443,17 +577,24 @@ def refazer_pedido(request, pedido_id):
         carrinho__usuario=request.user
     )
     
-    novo_carrinho = Carrinho.objects.create(
+    # Junta ao carrinho aberto em vez de criar mais um carrinho por pedido refeito
+    carrinho, _ = Carrinho.objects.get_or_create(
         usuario=request.user,
         estado='aberto'
     )
+    existentes = {item.produto_id: item for item in carrinho.itens.all()}
     
     for item in pedido_original.carrinho.itens.all():
-        ItemCarrinho.objects.create(
-            carrinho=novo_carrinho,
-            produto=item.produto,
-            quantidade=item.quantidade
-        )
+        if item.produto_id in existentes:
+            existente = existentes[item.produto_id]
+            existente.quantidade += item.quantidade
+            existente.save()
+        else:
+            ItemCarrinho.objects.create(
+                carrinho=carrinho,
+                produto_id=item.produto_id,
+                quantidade=item.quantidade
+            )
     
     # Invalidar cache do carrinho
     invalidar_cache_carrinho(request.user)
@@ -469,7 +610,7 @@ def atualizar_quantidade_ajax(request, item_id):
         item = get_object_or_404(ItemCarrinho, id=item_id, carrinho__usuario=request.user)
         quantidade = int(request.POST.get('quantidade', 1))
         
-        if 1 <= quantidade <= item.produto.estoque:
+        if 1 <= quantidade <= estoque_atual(item.produto):
             item.quantidade = quantidade
             item.save()
             
@@ -494,24 +635,18 @@ def atualizar_quantidade_ajax(request, item_id):
 # Funções de invalidação de cache
 def invalidar_cache_carrinho(usuario):
     """Invalida cache específico do carrinho do usuário"""
-    from django.core.cache import cache
-    cache_keys = [
+    invalidar(
         f'ver_carrinho_user_{usuario.id}',
         f'carrinho_details_user_{usuario.id}',
-    ]
-    for key in cache_keys:
-        cache.delete(key)
+    )
     logger.info(f"Cache do carrinho invalidado para usuário {usuario.id}")
 
 def invalidar_cache_pedidos(usuario):
     """Invalida cache de pedidos do usuário"""
-    from django.core.cache import cache
-    cache_keys = [
+    invalidar(
         f'historico_pedidos_user_{usuario.id}',
         f'pedidos_list_user_{usuario.id}',
-    ]
-    for key in cache_keys:
-        cache.delete(key)
+    )
     logger.info(f"Cache de pedidos invalidado para usuário {usuario.id}")
 
 # Funções auxiliares (sem cache necessário)
@@ -533,48 +668,44 @@ def gerar_numero_pedido_unico():
     return f"PED-{uuid.uuid4().hex[:8].upper()}"
 
 def enviar_notificacao_admin(pedido):
-    """Envia email de notificação para o admin"""
-    try:
-        subject = f'Novo Pedido de Entrega - #{pedido.id}'
-        
-        itens_texto = "\n".join([
-            f"- {item.quantidade}x {item.produto.nome} - €{item.subtotal:.2f}"
-            for item in pedido.carrinho.itens.all()
-        ])
-        
-        message = f'''
-        Novo pedido de entrega recebido:
-        
-        Pedido: #{pedido.id}
-        Cliente: {pedido.carrinho.usuario.get_full_name() or pedido.carrinho.usuario.username}
-        Email: {pedido.carrinho.usuario.email}
-        
-        Itens do Pedido:
-        {itens_texto}
-        
-        Subtotal: €{pedido.carrinho.subtotal:.2f}
-        Taxa de Entrega: €{pedido.carrinho.taxa_entrega:.2f}
-        Total: €{pedido.carrinho.total:.2f}
-        
-        Endereço de Entrega:
-        {pedido.endereco_entrega}
-        
-        Observações:
-        {pedido.observacoes or 'Nenhuma'}
-        
-        Data: {pedido.data_solicitacao.strftime("%d/%m/%Y %H:%M")}
-        '''
-        
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [settings.ADMIN_EMAIL],
-            fail_silently=False,
-        )
-        
-        pedido.notificado_admin = True
-        pedido.save()
-        
-    except Exception as e:
-        logger.error(f"Erro ao enviar notificação: {e}")
\ No newline at end of file
+    """Coloca na outbox o email de notificação para o admin"""
+    from index.notificacoes import enfileirar_email
+    
+    subject = f'Novo Pedido de Entrega - #{pedido.id}'
+    
+    itens_texto = "\n".join([
+        f"- {item.quantidade}x {item.produto.nome} - €{item.subtotal:.2f}"
+        for item in pedido.carrinho.itens.select_related('produto')
+    ])
+    
+    message = f'''
+    Novo pedido de entrega recebido:
+    
+    Pedido: #{pedido.id}
+    Cliente: {pedido.carrinho.usuario.get_full_name() or pedido.carrinho.usuario.username}
+    Email: {pedido.carrinho.usuario.email}
+    
+    Itens do Pedido:
+    {itens_texto}
+    
+    Subtotal: €{pedido.carrinho.subtotal:.2f}
+    Taxa de Entrega: €{pedido.carrinho.taxa_entrega:.2f}
+    Total: €{pedido.carrinho.total:.2f}
+    
+    Endereço de Entrega:
+    {pedido.endereco_entrega}
+    
+    Observações:
+    {pedido.observacoes or 'Nenhuma'}
+    
+    Data: {pedido.data_solicitacao.strftime("%d/%m/%Y %H:%M")}
+    '''
+    
+    # notificado_admin é marcado pelo worker depois do envio
+    return enfileirar_email(
+        subject,
+        message,
+        [settings.ADMIN_EMAIL],
+        tipo='pedido_admin',
+        pedido=pedido,
+    )
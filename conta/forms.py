@@ -3,6 +3,7 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.contrib.auth.forms import AuthenticationForm
 from django.core.cache import cache
+from index.invalidacao import invalidar
 import re
 from django.core.validators import MinLengthValidator
 from .models import Usuario
@@ -414,7 +415,7 @@ class RegistroUsuarioForm(forms.ModelForm):
             ]
             
             for key in cache_keys_to_delete:
-                cache.delete(key)
+                invalidar(key)
         
         return usuario
 
@@ -540,7 +541,7 @@ class EditarPerfilForm(forms.ModelForm):
             ]
             
             for key in cache_keys_to_delete:
-                cache.delete(key)
+                invalidar(key)
         
         return user
 
@@ -577,10 +578,10 @@ class AvatarForm(forms.ModelForm):
         if commit:
             # Invalidar cache do perfil após atualizar avatar
             cache_key = f"usuario_profile_{instance.id}"
-            cache.delete(cache_key)
+            invalidar(cache_key)
             
             # Invalidar cache da foto específica
             foto_cache_key = f"usuario_avatar_{instance.id}"
-            cache.delete(foto_cache_key)
+            invalidar(foto_cache_key)
         
         return instance
\ No newline at end of file
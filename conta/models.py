@@ -4,8 +4,11 @@ from django.utils import timezone
 from django.core.cache import cache
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from index.imagens import agendar_derivadas
+from index.invalidacao import agrupar_invalidacoes, invalidar
+from index.rastreamento import RastreamentoCamposMixin
 
-class Usuario(AbstractUser):
+class Usuario(RastreamentoCamposMixin, AbstractUser):
     # Remove o username padrão se quiser usar apenas email
     username = models.CharField(
         max_length=150,
@@ -141,11 +144,12 @@ class Usuario(AbstractUser):
         estatisticas = cache.get(cache_key)
         
         if estatisticas is None:
+            from carinho.arquivo import resumo_arquivo_usuario
             from carinho.models import PedidoEntrega, Carrinho
             
             total_pedidos = PedidoEntrega.objects.filter(
                 carrinho__usuario=self
-            ).count()
+            ).count() + resumo_arquivo_usuario(self)['total_pedidos']
             
             pedidos_ativos = PedidoEntrega.objects.filter(
                 carrinho__usuario=self,
@@ -180,30 +184,27 @@ class Usuario(AbstractUser):
             f'pedidos_usuario_{self.id}',
             f'carrinho_com_itens_usuario_{self.id}',
         ]
-        cache.delete_many(cache_keys)
+        invalidar(*cache_keys)
         
         # Também limpa caches globais que podem conter este usuário
-        cache.delete('todos_usuarios')
-        cache.delete('usuarios_ativos')
-        cache.delete('estatisticas_usuarios')
+        invalidar('todos_usuarios')
+        invalidar('usuarios_ativos')
+        invalidar('estatisticas_usuarios')
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         """Garante username único baseado no email e limpa cache"""
         # Limpa cache antes de salvar se for uma atualização
-        if self.pk:
-            try:
-                usuario_antigo = Usuario.objects.get(pk=self.pk)
-                # Se email mudou, limpa caches específicos
-                if usuario_antigo.email != self.email:
-                    cache.delete(f'usuario_email_{usuario_antigo.email.lower()}')
-            except Usuario.DoesNotExist:
-                pass
+        alterados = self.changed_fields if self.pk else set()
+        if 'email' in alterados:
+            # Se email mudou, limpa caches específicos
+            invalidar(f'usuario_email_{self.valor_original("email").lower()}')
         
         if not self.username and self.email:
             self.username = self.email.split('@')[0]
             
-        # Verifica se username já existe
-        if self.username:
+        # Verifica se username já existe (só em criações ou se o username mudou)
+        if self.username and (self._state.adding or 'username' in self.changed_fields):
             counter = 1
             original_username = self.username
             while Usuario.objects.filter(username=self.username).exclude(pk=self.pk).exists():
@@ -222,6 +223,7 @@ class Usuario(AbstractUser):
         # Limpa cache após salvar
         self.limpar_cache_usuario()
 
+    @agrupar_invalidacoes()
     def delete(self, *args, **kwargs):
         """Limpa cache antes de deletar"""
         self.limpar_cache_usuario()
@@ -231,14 +233,20 @@ class Usuario(AbstractUser):
 @receiver([post_save, post_delete], sender=Usuario)
 def limpar_cache_usuario_signals(sender, instance, **kwargs):
     """Limpa caches globais quando usuários são modificados"""
-    cache.delete('todos_usuarios')
-    cache.delete('usuarios_ativos')
-    cache.delete('estatisticas_usuarios')
+    invalidar('todos_usuarios')
+    invalidar('usuarios_ativos')
+    invalidar('estatisticas_usuarios')
     
     # Limpa cache de estatísticas se for criação/exclusão
     if kwargs.get('created') or kwargs.get('signal') == post_delete:
-        cache.delete('total_usuarios')
-        cache.delete('novos_usuarios_ultima_semana')
+        invalidar('total_usuarios')
+        invalidar('novos_usuarios_ultima_semana')
+
+@receiver(post_save, sender=Usuario)
+def gerar_derivadas_avatar(sender, instance, raw=False, **kwargs):
+    """Versões redimensionadas do avatar, geradas no worker"""
+    if not raw:
+        agendar_derivadas(instance.foto_perfil)
 
 # Funções utilitárias com cache
 def obter_estatisticas_usuarios():
@@ -306,15 +314,14 @@ def buscar_usuarios_por_nome(nome):
 # Método para limpar cache específico de usuários (útil para admin)
 def limpar_cache_usuarios_global():
     """Limpa todo o cache relacionado a usuários"""
-    from django.core.cache import cache
     # Não podemos listar todas as chaves, então focamos nas conhecidas
-    cache.delete_many([
+    invalidar(
         'todos_usuarios',
         'usuarios_ativos',
         'estatisticas_usuarios',
         'total_usuarios',
         'novos_usuarios_ultima_semana'
-    ])
+    )
     
     # Para caches específicos de usuários, precisaríamos de um padrão
     # Em produção, considere usar cache com prefixo específico
\ No newline at end of file
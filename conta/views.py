@@ -1,3 +1,4 @@
+from carinho.arquivo import resumo_arquivo_usuario
 from carinho.models import PedidoEntrega
 from django.utils import timezone
 from django.http import JsonResponse
@@ -14,6 +15,7 @@ from functools import wraps
 import os
 
 from .forms import RegistroUsuarioForm, LoginForm, EditarPerfilForm, AvatarForm
+from index.invalidacao import invalidar
 
 User = get_user_model()
 
@@ -126,23 +128,23 @@ def perfil(request):
         ).select_related('carrinho').prefetch_related('carrinho__itens__produto').order_by('-data_solicitacao')[:3]
         
         # Estatísticas do usuário
+        arquivo = resumo_arquivo_usuario(usuario)
         total_pedidos = PedidoEntrega.objects.filter(
             carrinho__usuario=usuario
-        ).count()
+        ).count() + arquivo['total_pedidos']
         
         pedidos_entregues = PedidoEntrega.objects.filter(
             carrinho__usuario=usuario,
             estado='entregue'
-        ).count()
+        ).count() + arquivo['pedidos_entregues']
         
-        # Calcular total gasto
-        total_gasto = 0
-        for pedido in ultimos_pedidos:
-            if hasattr(pedido.carrinho, 'total'):
-                total_gasto += pedido.carrinho.total
-            else:
-                # Fallback: calcular manualmente
-                total_gasto += sum(item.subtotal for item in pedido.carrinho.itens.all())
+        # Total gasto: pedidos entregues (totais calculados no SQL) + arquivados
+        total_gasto = arquivo['total_gasto'] + sum(
+            PedidoEntrega.objects.com_totais().filter(
+                carrinho__usuario=usuario,
+                estado='entregue'
+            ).values_list('valor_total', flat=True)
+        )
         
         perfil_data = {
             'ultimos_pedidos': ultimos_pedidos,
@@ -264,19 +266,17 @@ def get_municipios(request):
 # Funções de invalidação de cache
 def invalidar_cache_perfil(usuario):
     """Invalida cache específico do perfil do usuário"""
-    from django.core.cache import cache
     cache_keys = [
         f"perfil_data_user_{usuario.id}",
         f"perfil_user_{usuario.id}",
         f"dashboard_user_{usuario.id}",
     ]
     for key in cache_keys:
-        cache.delete(key)
+        invalidar(key)
     print(f"Cache do perfil invalidado para usuário {usuario.id}")
 
 def invalidar_todos_caches_usuario(usuario):
     """Invalida todos os caches relacionados ao usuário"""
-    from django.core.cache import cache
     cache_keys = [
         f"perfil_data_user_{usuario.id}",
         f"perfil_user_{usuario.id}", 
@@ -293,7 +293,7 @@ def invalidar_todos_caches_usuario(usuario):
         pass
     
     for key in cache_keys:
-        cache.delete(key)
+        invalidar(key)
     
     print(f"Todos os caches invalidados para usuário {usuario.id}")
 
@@ -338,7 +338,10 @@ def api_dados_usuario(request):
         'email': usuario.email,
         'telemovel': usuario.telemovel,
         'membro_desde': usuario.date_joined.strftime('%d/%m/%Y'),
-        'total_pedidos': PedidoEntrega.objects.filter(carrinho__usuario=usuario).count(),
+        'total_pedidos': (
+            PedidoEntrega.objects.filter(carrinho__usuario=usuario).count()
+            + resumo_arquivo_usuario(usuario)['total_pedidos']
+        ),
     }
     
     return JsonResponse(dados)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from django.core.cache import cache
+from index.invalidacao import invalidar
 from .models import Contacto
 import re
 
@@ -106,7 +107,7 @@ class ContactoForm(forms.ModelForm):
             ]
             
             for key in cache_keys_to_delete:
-                cache.delete(key)
+                invalidar(key)
             
             # Adicionar ao cache de submissões recentes (para prevenir spam)
             email = self.cleaned_data.get('email')
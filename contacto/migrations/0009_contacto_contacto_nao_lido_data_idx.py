@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacto', '0008_contacto_respondido'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contacto',
+            index=models.Index(condition=models.Q(('lido', False)), fields=['data_envio'], name='contacto_nao_lido_data_idx'),
+        ),
+    ]
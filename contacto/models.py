@@ -3,9 +3,11 @@ from django.core.validators import MinLengthValidator
 from django.core.cache import cache
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from index.invalidacao import agrupar_invalidacoes, invalidar
+from index.rastreamento import RastreamentoCamposMixin
 import re
 
-class Contacto(models.Model):
+class Contacto(RastreamentoCamposMixin, models.Model):
     ASSUNTO_CHOICES = [
         ('', 'Selecione o assunto'),
         ('suporte', 'Suporte Técnico'),
@@ -62,6 +64,12 @@ class Contacto(models.Model):
         verbose_name = 'Contacto'
         verbose_name_plural = 'Contactos'
         ordering = ['-data_envio']
+        indexes = [
+            models.Index(
+                fields=['data_envio'], condition=models.Q(lido=False),
+                name='contacto_nao_lido_data_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.nome} - {self.assunto}"
@@ -230,25 +238,24 @@ class Contacto(models.Model):
             'contactos_recentes_20',
             'contactos_recentes_50',
         ]
-        cache.delete_many(cache_keys)
+        invalidar(*cache_keys)
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         """Sobrescreve save para limpar cache"""
         # Limpa cache antes de salvar se for uma atualização
         if self.pk:
-            try:
-                contacto_antigo = Contacto.objects.get(pk=self.pk)
-                # Se assunto ou email mudaram, limpa caches específicos
-                if contacto_antigo.assunto != self.assunto:
-                    cache.delete(f'contactos_assunto_{contacto_antigo.assunto}')
-                if contacto_antigo.email.lower() != self.email.lower():
-                    cache.delete(f'contactos_email_{contacto_antigo.email.lower()}')
-            except Contacto.DoesNotExist:
-                pass
+            alterados = self.changed_fields
+            # Se assunto ou email mudaram, limpa caches específicos
+            if 'assunto' in alterados:
+                invalidar(f'contactos_assunto_{self.valor_original("assunto")}')
+            if 'email' in alterados:
+                invalidar(f'contactos_email_{self.valor_original("email").lower()}')
         
         super().save(*args, **kwargs)
         self.limpar_cache_contacto()
     
+    @agrupar_invalidacoes()
     def delete(self, *args, **kwargs):
         """Limpa cache antes de deletar"""
         self.limpar_cache_contacto()
@@ -261,8 +268,8 @@ def limpar_cache_contacto_signals(sender, instance, **kwargs):
     instance.limpar_cache_contacto()
     
     # Limpa caches adicionais
-    cache.delete('total_contactos_hoje')
-    cache.delete('contactos_ultima_semana')
+    invalidar('total_contactos_hoje')
+    invalidar('contactos_ultima_semana')
 
 # Funções utilitárias com cache
 def obter_total_contactos_hoje():
@@ -335,14 +342,14 @@ def buscar_contactos_por_termo(termo):
 # Função para limpar todo o cache de contactos (útil para admin)
 def limpar_cache_contactos_global():
     """Limpa todo o cache relacionado a contactos"""
-    cache.delete_many([
+    invalidar(
         'contactos_nao_lidos',
         'estatisticas_contactos',
         'total_contactos_hoje',
         'contactos_ultima_semana',
         'assuntos_frequentes_5',
         'assuntos_frequentes_10',
-    ])
+    )
     
     # Para caches dinâmicos, precisaríamos de um padrão
     # Em produção, considere usar cache com prefixo específico
\ No newline at end of file
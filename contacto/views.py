@@ -1,14 +1,12 @@
 from django.views.decorators.cache import cache_page
-from celery import shared_task
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.views.generic import FormView
 from django.db import transaction
 import re
 from .forms import ContactoForm
-from .models import Contacto
+from index.notificacoes import enfileirar_email
 
 # Compilar regex uma vez para reutilizar
 PHONE_CLEANER = re.compile(r'\D')
@@ -57,47 +55,8 @@ class ContactoView(FormView):
         return super().form_invalid(form)
     
     def enviar_email_async(self, contacto):
-        """Envia email de forma não bloqueante"""
-        try:
-            from threading import Thread
-            
-            def send_email_thread():
-                try:
-                    self._enviar_email_notificacao(contacto)
-                except Exception as e:
-                    # Log do erro sem afetar o usuário
-                    print(f"Erro ao enviar email: {e}")
-            
-            # Iniciar thread para envio de email
-            thread = Thread(target=send_email_thread)
-            thread.daemon = True
-            thread.start()
-            
-        except Exception as e:
-            print(f"Erro ao iniciar thread de email: {e}")
-    
-    def _enviar_email_notificacao(self, contacto):
-        """Método interno para enviar email"""
-        subject = f'Novo Contacto: {contacto.assunto}'
-        message = f'''
-Novo contacto recebido:
-
-Nome: {contacto.nome}
-E-mail: {contacto.email}
-Telemóvel: {contacto.telemovel}
-Assunto: {contacto.get_assunto_display()}
-Mensagem: {contacto.mensagem}
-
-Data: {contacto.data_envio}
-'''
-        
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [settings.CONTACT_EMAIL],
-            fail_silently=True,  # Não levantar exceção em produção
-        )
+        """Coloca o email na outbox; é enviado pelo worker após o commit"""
+        enviar_email_async(contacto)
 
 def contacto_sucesso(request):
     """View simples de sucesso com cache"""
@@ -135,25 +94,17 @@ def contacto_view(request):
     return render(request, 'contact.html', {'form': form})
 
 def enviar_email_async(contacto):
-    """Função auxiliar para envio assíncrono de email"""
-    try:
-        from threading import Thread
-        
-        def send_email():
-            try:
-                _enviar_email(contacto)
-            except Exception as e:
-                print(f"Erro ao enviar email: {e}")
-        
-        thread = Thread(target=send_email)
-        thread.daemon = True
-        thread.start()
-        
-    except Exception as e:
-        print(f"Erro ao iniciar thread: {e}")
+    """Coloca o email de contacto na outbox (na transação corrente)"""
+    subject, message = _montar_email(contacto)
+    return enfileirar_email(
+        subject,
+        message,
+        [settings.CONTACT_EMAIL],
+        tipo='contacto',
+    )
 
-def _enviar_email(contacto):
-    """Função interna para envio de email"""
+def _montar_email(contacto):
+    """Monta assunto e corpo do email de notificação"""
     subject = f'Novo Contacto: {contacto.assunto}'
     message = f'''
 Novo contacto recebido:
@@ -166,20 +117,8 @@ Mensagem: {contacto.mensagem}
 
 Data: {contacto.data_envio}
 '''
-    
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [settings.CONTACT_EMAIL],
-        fail_silently=True,
-    )
+    return subject, message
 
 @cache_page(60 * 15)  # Cache de 15 minutos
 def contacto_sucesso(request):
     return render(request, 'sucesso.html')
-
-@shared_task
-def enviar_email_contacto(contacto_id):
-    contacto = Contacto.objects.get(id=contacto_id)
-    # código do email...
\ No newline at end of file
@@ -1,3 +1,23 @@
 from django.contrib import admin
+from django.utils import timezone
+from .models import NotificacaoEmail
 
-# Register your models here.
+@admin.register(NotificacaoEmail)
+class NotificacaoEmailAdmin(admin.ModelAdmin):
+    list_display = ['assunto', 'tipo', 'estado', 'tentativas', 'proxima_tentativa', 'data_criacao', 'data_envio']
+    list_filter = ['estado', 'tipo', 'data_criacao']
+    search_fields = ['assunto', 'destinatarios']
+    readonly_fields = ['data_criacao', 'data_envio', 'tentativas', 'ultimo_erro']
+    raw_id_fields = ['pedido']
+    list_per_page = 20
+    
+    actions = ['reenviar']
+    
+    def reenviar(self, request, queryset):
+        updated = queryset.exclude(estado='enviado').update(
+            estado='pendente',
+            tentativas=0,
+            proxima_tentativa=timezone.now()
+        )
+        self.message_user(request, f'{updated} notificação(ões) recolocada(s) na fila.')
+    reenviar.short_description = "Recolocar na fila de envio"
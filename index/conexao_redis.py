@@ -0,0 +1,50 @@
+# index/conexao_redis.py
+"""
+Acesso direto ao Redis para o que o cache do Django não cobre
+(pub/sub, sorted sets, contadores). Todas as funções degradam sem erro
+quando o Redis não está disponível, tal como o cache (IGNORE_EXCEPTIONS).
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def obter_redis():
+    """Cliente Redis síncrono partilhado com o cache, ou None se indisponível"""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception as e:
+        logger.warning(f"Redis indisponível: {e}")
+        return None
+
+
+def obter_redis_async():
+    """Novo cliente Redis assíncrono (um por processo, para pub/sub)"""
+    import redis.asyncio as redis_async
+    return redis_async.from_url(settings.REDIS_URL)
+
+
+def publicar(mensagens):
+    """
+    Publica várias mensagens [(canal, dados)] num único pipeline.
+    Retorna False se o Redis não estiver disponível.
+    """
+    if not mensagens:
+        return True
+    
+    cliente = obter_redis()
+    if cliente is None:
+        return False
+    
+    try:
+        pipe = cliente.pipeline(transaction=False)
+        for canal, dados in mensagens:
+            pipe.publish(canal, dados)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Falha ao publicar no Redis: {e}")
+        return False
@@ -1,13 +1,14 @@
-import random
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.core.cache import cache
-from carinho.models import PedidoEntrega, ItemCarrinho
+from carinho.arquivo import resumo_arquivo_usuario
+from carinho.models import PedidoEntrega
 from menu.models import Produto, Favorito
+from menu.recomendacoes import recomendar_para_usuario
 # context_processors.py
 from sobre.models import VideoHistoria
+from index.invalidacao import invalidar, invalidar_padroes
 from datetime import timedelta
-from decimal import Decimal
 
 # Cache decorator para context processors
 def cache_context(timeout):
@@ -68,21 +69,22 @@ def dashboard_stats(request):
         if cached_stats is not None:
             return cached_stats
         
+        # Pedidos já arquivados entram nos totais de sempre
+        arquivo = resumo_arquivo_usuario(request.user)
+        
         # Total de pedidos
         total_pedidos = PedidoEntrega.objects.filter(
             carrinho__usuario=request.user
-        ).count()
+        ).count() + arquivo['total_pedidos']
         
         # Total de favoritos
-        total_favoritos = Favorito.objects.filter(
-            usuario=request.user
-        ).count()
+        total_favoritos = len(Favorito.ids_favoritos(request.user))
 
         # PEDIDOS ENTREGUES
         pedidos_entregues = PedidoEntrega.objects.filter(
             carrinho__usuario=request.user,
             estado='entregue'
-        ).count()
+        ).count() + arquivo['pedidos_entregues']
         
         # TOTAL GASTO - Correção aqui
         pedidos_entregues_queryset = PedidoEntrega.objects.filter(
@@ -91,7 +93,7 @@ def dashboard_stats(request):
         ).select_related('carrinho').prefetch_related('carrinho__itens__produto')
 
         # Calcular total gasto manualmente
-        total_gasto = Decimal('0.00')
+        total_gasto = arquivo['total_gasto']
         for pedido in pedidos_entregues_queryset:
             total_gasto += pedido.carrinho.total 
         
@@ -148,149 +150,24 @@ def obter_produtos_recomendados(usuario):
 
 def gerar_produtos_recomendados(usuario):
     """
-    Gera produtos recomendados baseado no histórico e preferências
+    Gera produtos recomendados a partir das co-compras dos itens recentes
+    e favoritos do usuário (ver menu/recomendacoes.py)
     """
     try:
-        # Cache para produtos disponíveis
-        cache_key_disponiveis = 'produtos_disponiveis_recomendacao'
-        produtos_disponiveis = cache.get(cache_key_disponiveis)
-        
-        if produtos_disponiveis is None:
-            produtos_disponiveis = Produto.objects.filter(estoque=True)
-            cache.set(cache_key_disponiveis, produtos_disponiveis, 60 * 30)  # 30 minutos
-        
-        if not produtos_disponiveis.exists():
-            return []
-        
-        # Tentativa 1: Baseado no histórico de pedidos do usuário
-        produtos_historicos = obter_produtos_do_historico(usuario)
-        
-        # Tentativa 2: Produtos populares (mais vendidos)
-        produtos_populares = obter_produtos_populares()
-        
-        # Tentativa 3: Produtos da mesma categoria dos favoritos
-        produtos_categoria_favoritos = obter_produtos_por_categoria_favoritos(usuario)
-        
-        # Combinar todas as fontes
-        candidatos = list(produtos_historicos) + list(produtos_populares) + list(produtos_categoria_favoritos)
-        
-        # Se não há candidatos suficientes, pega produtos aleatórios
-        if len(candidatos) < 3:
-            produtos_aleatorios = list(produtos_disponiveis.order_by('?')[:3])
-            return produtos_aleatorios
-        
-        # Remove duplicatas e pega 3 produtos
-        candidatos_unicos = list({produto.id: produto for produto in candidatos}.values())
-        
-        if len(candidatos_unicos) >= 3:
-            return random.sample(candidatos_unicos, 3)
-        else:
-            # Completa com produtos aleatórios se necessário
-            produtos_faltantes = 3 - len(candidatos_unicos)
-            produtos_adicionais = list(produtos_disponiveis.exclude(
-                id__in=[p.id for p in candidatos_unicos]
-            ).order_by('?')[:produtos_faltantes])
-            
-            return candidatos_unicos + produtos_adicionais
-            
+        return recomendar_para_usuario(usuario, 3)
     except Exception as e:
         print(f"Erro ao gerar recomendações: {e}")
-        # Fallback: produtos aleatórios
-        return list(Produto.objects.filter(estoque=True).order_by('?')[:3])
-
-def obter_produtos_do_historico(usuario):
-    """
-    Obtém produtos baseados no histórico de pedidos do usuário
-    """
-    try:
-        cache_key = f"produtos_historico_{usuario.id}"
-        produtos_historicos = cache.get(cache_key)
-        
-        if produtos_historicos is None:
-            # Últimos 30 dias
-            data_limite = timezone.now() - timedelta(days=30)
-            
-            # Produtos dos pedidos recentes do usuário
-            produtos_ids = ItemCarrinho.objects.filter(
-                carrinho__pedido_entrega__carrinho__usuario=usuario,
-                carrinho__pedido_entrega__data_solicitacao__gte=data_limite
-            ).values_list('produto_id', flat=True).distinct()
-            
-            produtos_historicos = Produto.objects.filter(
-                id__in=produtos_ids,
-                estoque=True
-            )[:6]  # Limita a 6 produtos
-            
-            cache.set(cache_key, produtos_historicos, 60 * 60 * 6)  # 6 horas
-        
-        return produtos_historicos
-        
-    except Exception as e:
-        print(f"Erro ao obter histórico: {e}")
-        return Produto.objects.none()
+        return list(Produto.obter_produtos_populares(3))
 
 def obter_produtos_populares():
     """
-    Obtém produtos populares (mais vendidos)
+    Obtém produtos populares (mais vendidos recentemente)
     """
     try:
-        cache_key = 'produtos_populares_recomendacao'
-        produtos_populares = cache.get(cache_key)
-        
-        if produtos_populares is None:
-            # Produtos mais vendidos (baseado em itens de carrinho em pedidos finalizados)
-            from django.db.models import Count
-            
-            produtos_populares_ids = ItemCarrinho.objects.filter(
-                carrinho__pedido_entrega__estado='entregue'
-            ).values('produto').annotate(
-                total_vendido=Count('id')
-            ).order_by('-total_vendido')[:6].values_list('produto', flat=True)
-            
-            produtos_populares = Produto.objects.filter(
-                id__in=produtos_populares_ids,
-                estoque=True
-            )
-            
-            cache.set(cache_key, produtos_populares, 60 * 60 * 12)  # 12 horas
-        
-        return produtos_populares
-        
+        return Produto.obter_produtos_populares(6)
     except Exception as e:
         print(f"Erro ao obter produtos populares: {e}")
-        return Produto.objects.none()
-
-def obter_produtos_por_categoria_favoritos(usuario):
-    """
-    Obtém produtos da mesma categoria dos favoritos do usuário
-    """
-    try:
-        cache_key = f"produtos_categoria_favoritos_{usuario.id}"
-        produtos_categoria = cache.get(cache_key)
-        
-        if produtos_categoria is None:
-            # Categorias dos produtos favoritos do usuário
-            categorias_favoritas = Favorito.objects.filter(
-                usuario=usuario
-            ).values_list('produto__categoria', flat=True).distinct()
-            
-            if categorias_favoritas:
-                produtos_categoria = Produto.objects.filter(
-                    categoria__in=categorias_favoritas,
-                    estoque=True
-                ).exclude(
-                    favorito__usuario=usuario  # Exclui produtos já favoritados
-                )[:6]
-            else:
-                produtos_categoria = Produto.objects.none()
-            
-            cache.set(cache_key, produtos_categoria, 60 * 60 * 6)  # 6 horas
-        
-        return produtos_categoria
-        
-    except Exception as e:
-        print(f"Erro ao obter produtos por categoria: {e}")
-        return Produto.objects.none()
+        return []
 
 # Funções de invalidação de cache
 def invalidar_cache_context_usuario(usuario_id):
@@ -304,7 +181,7 @@ def invalidar_cache_context_usuario(usuario_id):
     ]
     
     for key in cache_keys:
-        cache.delete(key)
+        invalidar(key)
     
     print(f"Cache de context invalidado para usuário {usuario_id}")
 
@@ -318,20 +195,20 @@ def invalidar_cache_context_global():
     ]
     
     for key in cache_keys:
-        cache.delete(key)
+        invalidar(key)
     
     # Limpa padrões
-    cache.delete_many_pattern('context_*')
-    cache.delete_many_pattern('produtos_*')
-    cache.delete_many_pattern('video_*')
+    invalidar_padroes('context_*')
+    invalidar_padroes('produtos_*')
+    invalidar_padroes('video_*')
     
     print("Cache de context global invalidado")
 
 def invalidar_todos_caches_context():
     """Invalida todos os caches relacionados a context processors"""
     invalidar_cache_context_global()
-    cache.delete_many_pattern('*_context')
-    cache.delete_many_pattern('context_*')
+    invalidar_padroes('*_context')
+    invalidar_padroes('context_*')
     print("Todos os caches de context invalidados")
 
 # Função para ser chamada quando dados mudam
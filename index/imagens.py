@@ -0,0 +1,195 @@
+# index/imagens.py
+"""
+Derivadas redimensionadas das imagens enviadas.
+
+Para cada original (ex.: `produtos/x.png`) são geradas, em
+`produtos/derivadas/`, versões WebP e JPEG nas LARGURAS fixas (nunca
+maiores do que o original), sem EXIF/ICC, e um manifesto `x.json` com as
+larguras geradas. A geração corre no worker (`gerar_derivadas_imagem`),
+agendada depois do commit do save do modelo; os templates usam o
+manifesto (em cache) para montar o `srcset` e, sem ele, mostram só o
+original.
+"""
+import json
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+LARGURAS = (160, 320, 640, 1024)
+# extensão: (formato do Pillow, opções de gravação)
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+PASTA_DERIVADAS = 'derivadas'
+
+# Campos de imagem com derivadas, por modelo
+CAMPOS_IMAGEM = {
+    'menu.Produto': 'imagem',
+    'blog.Publicacao': 'imagem_destaque',
+    'sobre.VideoHistoria': 'thumbnail',
+    'conta.Usuario': 'foto_perfil',
+}
+
+
+def _base_derivadas(nome):
+    pasta, arquivo = posixpath.split(nome)
+    return posixpath.join(pasta, PASTA_DERIVADAS, posixpath.splitext(arquivo)[0])
+
+
+def nome_derivada(nome, largura, extensao):
+    """'produtos/x.png', 320, 'webp' -> 'produtos/derivadas/x-320w.webp'"""
+    return f'{_base_derivadas(nome)}-{largura}w.{extensao}'
+
+
+def nome_manifesto(nome):
+    return f'{_base_derivadas(nome)}.json'
+
+
+def _chave_cache(nome):
+    return f'imagem_derivadas_{nome}'
+
+
+def _ler_manifesto(nome):
+    try:
+        with default_storage.open(nome_manifesto(nome), 'rb') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def obter_manifesto(nome):
+    """Manifesto das derivadas do original (None se ainda não foram geradas) com cache"""
+    if not nome:
+        return None
+    chave = _chave_cache(nome)
+    manifesto = cache.get(chave)
+
+    if manifesto is None:
+        manifesto = _ler_manifesto(nome)
+        if manifesto is None:
+            cache.set(chave, False, 300)  # Cache negativo por 5 minutos
+            return None
+        cache.set(chave, manifesto, 60 * 60 * 24)  # 24 horas
+    return manifesto or None
+
+
+def _larguras_para(largura_original):
+    larguras = [largura for largura in LARGURAS if largura < largura_original]
+    if largura_original < LARGURAS[-1]:
+        larguras.append(largura_original)
+    return larguras
+
+
+def _gravar(nome, conteudo):
+    if default_storage.exists(nome):
+        default_storage.delete(nome)
+    default_storage.save(nome, ContentFile(conteudo))
+
+
+def _preparar(imagem):
+    """Aplica a orientação do EXIF e converte para RGB/RGBA"""
+    imagem = ImageOps.exif_transpose(imagem)
+    transparente = imagem.mode in ('RGBA', 'LA') or (
+        imagem.mode == 'P' and 'transparency' in imagem.info
+    )
+    return imagem.convert('RGBA' if transparente else 'RGB')
+
+
+def _sem_transparencia(imagem):
+    if imagem.mode != 'RGBA':
+        return imagem
+    fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+    fundo.paste(imagem, mask=imagem.getchannel('A'))
+    return fundo
+
+
+def gerar_derivadas(nome, forcar=False):
+    """
+    Gera as derivadas do original `nome` no storage e retorna o manifesto.
+    Sem `forcar`, não refaz o que já tem manifesto.
+    """
+    if not forcar:
+        manifesto = _ler_manifesto(nome)
+        if manifesto is not None:
+            cache.set(_chave_cache(nome), manifesto, 60 * 60 * 24)
+            return manifesto
+
+    try:
+        with default_storage.open(nome, 'rb') as arquivo:
+            original = Image.open(arquivo)
+            original.load()
+    except (FileNotFoundError, UnidentifiedImageError) as e:
+        logger.warning(f"Imagem {nome} não pôde ser lida: {e}")
+        return None
+
+    imagem = _preparar(original)
+    largura_original, altura_original = imagem.size
+    larguras = _larguras_para(largura_original)
+
+    for largura in larguras:
+        altura = max(1, round(altura_original * largura / largura_original))
+        redimensionada = imagem if largura == largura_original else imagem.resize(
+            (largura, altura), Image.Resampling.LANCZOS
+        )
+        for extensao, (formato, opcoes) in FORMATOS.items():
+            saida = redimensionada if formato == 'WEBP' else _sem_transparencia(redimensionada)
+            buffer = BytesIO()
+            # Sem exif=/icc_profile=: o Pillow não copia metadados
+            saida.save(buffer, formato, **opcoes)
+            _gravar(nome_derivada(nome, largura, extensao), buffer.getvalue())
+
+    manifesto = {
+        'larguras': larguras,
+        'largura_original': largura_original,
+        'altura_original': altura_original,
+    }
+    _gravar(nome_manifesto(nome), json.dumps(manifesto).encode())
+    cache.set(_chave_cache(nome), manifesto, 60 * 60 * 24)
+    return manifesto
+
+
+def srcset(nome, extensao='jpg'):
+    """'url 160w, url 320w, ...' das derivadas, ou '' se ainda não existirem"""
+    manifesto = obter_manifesto(nome)
+    if not manifesto:
+        return ''
+    return ', '.join(
+        f'{default_storage.url(nome_derivada(nome, largura, extensao))} {largura}w'
+        for largura in manifesto['larguras']
+    )
+
+
+def agendar_derivadas(arquivo, tags=()):
+    """
+    Agenda a geração das derivadas de um campo de imagem para depois do
+    commit. As `tags` são invalidadas quando as derivadas ficam prontas.
+    """
+    nome = getattr(arquivo, 'name', None)
+    if not nome or obter_manifesto(nome):
+        return
+    tags = list(tags)
+    transaction.on_commit(lambda: enviar_derivadas(nome, tags=tags))
+
+
+def enviar_derivadas(nome, forcar=False, tags=()):
+    """Pede ao worker as derivadas de `nome` (ou gera já, em modo eager)"""
+    from .tasks import gerar_derivadas_imagem
+
+    try:
+        if settings.CELERY_TASK_ALWAYS_EAGER:
+            gerar_derivadas_imagem.apply(args=[nome, forcar, list(tags)])
+        else:
+            gerar_derivadas_imagem.delay(nome, forcar, list(tags))
+    except Exception as e:
+        # O comando gerar_derivadas_imagens recupera o que ficar para trás
+        logger.warning(f"Não foi possível agendar as derivadas de {nome}: {e}")
@@ -0,0 +1,127 @@
+# index/invalidacao.py
+"""
+Invalidação de cache agrupada e feita só depois do commit.
+
+Em vez de `cache.delete(...)` espalhados por saves, signals e views, o
+código chama `invalidar(...)`. As chaves (e tags/padrões) ficam num buffer
+e são apagadas de uma só vez, num único pipeline Redis:
+
+- dentro de uma transação: em `transaction.on_commit` (nunca antes do
+  commit, para que ninguém volte a pôr em cache dados ainda não gravados);
+- dentro de `agrupar_invalidacoes()`: à saída do bloco mais externo;
+- caso contrário: imediatamente.
+
+Tags são contadores de versão (`versao_tag`) que entram na chave de caches
+derivados; invalidar uma tag é um único INCR.
+"""
+import logging
+from contextlib import ContextDecorator
+
+from asgiref.local import Local
+from django.core.cache import cache
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_estado = Local()
+
+
+def _buffer():
+    if not hasattr(_estado, 'chaves'):
+        _estado.chaves = set()
+        _estado.tags = set()
+        _estado.padroes = set()
+        _estado.profundidade = 0
+    return _estado
+
+
+def _chave_tag(tag):
+    return f'tag_versao_{tag}'
+
+
+def invalidar(*chaves):
+    """Agenda a remoção das chaves de cache"""
+    _buffer().chaves.update(chave for chave in chaves if chave)
+    _agendar()
+
+
+def invalidar_tags(*tags):
+    """Agenda o incremento da versão das tags"""
+    _buffer().tags.update(tags)
+    _agendar()
+
+
+def invalidar_padroes(*padroes):
+    """Agenda a remoção das chaves que correspondem aos padrões (ex.: 'produtos_*')"""
+    _buffer().padroes.update(padroes)
+    _agendar()
+
+
+def versao_tag(tag):
+    """Versão atual da tag, para compor chaves de cache dependentes dela"""
+    chave = _chave_tag(tag)
+    versao = cache.get(chave)
+    if versao is None:
+        cache.add(chave, 1, None)
+        versao = cache.get(chave) or 1
+    return versao
+
+
+def _agendar():
+    if connection.in_atomic_block:
+        # Vários callbacks podem ficar registados; só o primeiro encontra
+        # o buffer cheio, os restantes não fazem nada.
+        transaction.on_commit(descarregar)
+    elif _buffer().profundidade == 0:
+        descarregar()
+
+
+def descarregar():
+    """Aplica de uma vez todas as invalidações pendentes"""
+    estado = _buffer()
+    chaves, tags, padroes = estado.chaves, estado.tags, estado.padroes
+    if not (chaves or tags or padroes):
+        return
+    estado.chaves, estado.tags, estado.padroes = set(), set(), set()
+
+    try:
+        cliente = getattr(cache, 'client', None)
+        if cliente is not None and hasattr(cliente, 'get_client'):
+            # django-redis: DEL e INCR no mesmo pipeline
+            pipe = cliente.get_client(write=True).pipeline(transaction=False)
+            if chaves:
+                pipe.delete(*[cliente.make_key(chave) for chave in chaves])
+            for tag in tags:
+                pipe.incr(cliente.make_key(_chave_tag(tag)))
+            pipe.execute()
+        else:
+            cache.delete_many(list(chaves))
+            for tag in tags:
+                try:
+                    cache.incr(_chave_tag(tag))
+                except ValueError:
+                    cache.set(_chave_tag(tag), 1, None)
+
+        if padroes and hasattr(cache, 'delete_pattern'):
+            for padrao in padroes:
+                cache.delete_pattern(padrao)
+    except Exception as e:
+        logger.warning(f"Falha ao invalidar cache: {e}")
+
+
+class agrupar_invalidacoes(ContextDecorator):
+    """
+    Junta as invalidações feitas dentro do bloco (ou da view decorada)
+    numa única descarga no fim.
+    """
+
+    def __enter__(self):
+        _buffer().profundidade += 1
+        return self
+
+    def __exit__(self, *exc):
+        estado = _buffer()
+        estado.profundidade -= 1
+        if estado.profundidade == 0:
+            _agendar()
+        return False
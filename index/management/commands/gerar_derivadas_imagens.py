@@ -0,0 +1,31 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from index.imagens import CAMPOS_IMAGEM, enviar_derivadas, gerar_derivadas
+
+
+class Command(BaseCommand):
+    help = 'Gera as derivadas (WebP/JPEG redimensionadas) das imagens já enviadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forcar', action='store_true',
+                            help='Refaz também as imagens que já têm derivadas')
+        parser.add_argument('--assincrono', action='store_true',
+                            help='Envia cada imagem para o worker em vez de processar aqui')
+
+    def handle(self, *args, **options):
+        total = falhas = 0
+        for rotulo, campo in CAMPOS_IMAGEM.items():
+            modelo = apps.get_model(rotulo)
+            nomes = modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True}).values_list(
+                campo, flat=True
+            ).distinct()
+            for nome in nomes.iterator():
+                total += 1
+                if options['assincrono']:
+                    enviar_derivadas(nome, forcar=options['forcar'])
+                elif gerar_derivadas(nome, forcar=options['forcar']) is None:
+                    falhas += 1
+                    self.stderr.write(f'{rotulo}: {nome} não pôde ser processada')
+
+        self.stdout.write(self.style.SUCCESS(f'{total} imagens processadas ({falhas} falhas)'))
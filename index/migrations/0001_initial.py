@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('carinho', '0008_pedidoevento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacaoEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('pedido_admin', 'Novo Pedido (Admin)'), ('contacto', 'Novo Contacto')], max_length=20, verbose_name='Tipo')),
+                ('assunto', models.CharField(max_length=255, verbose_name='Assunto')),
+                ('mensagem', models.TextField(verbose_name='Mensagem')),
+                ('destinatarios', models.CharField(help_text='Endereços separados por vírgula', max_length=500, verbose_name='Destinatários')),
+                ('estado', models.CharField(choices=[('pendente', 'Pendente'), ('enviado', 'Enviado'), ('falhou', 'Falhou')], default='pendente', max_length=10, verbose_name='Estado')),
+                ('tentativas', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('proxima_tentativa', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próxima Tentativa')),
+                ('ultimo_erro', models.TextField(blank=True, verbose_name='Último Erro')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('data_envio', models.DateTimeField(blank=True, null=True, verbose_name='Data de Envio')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notificacoes', to='carinho.pedidoentrega', verbose_name='Pedido')),
+            ],
+            options={
+                'verbose_name': 'Notificação por Email',
+                'verbose_name_plural': 'Notificações por Email',
+                'ordering': ['-data_criacao'],
+                'indexes': [models.Index(fields=['estado', 'proxima_tentativa'], name='index_notif_fila_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,96 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class NotificacaoEmail(models.Model):
+    """
+    Outbox transacional de emails: a mensagem é gravada na mesma transação
+    que a origina (pedido, contacto) e enviada depois por um worker Celery.
+    """
+    TIPO_CHOICES = [
+        ('pedido_admin', 'Novo Pedido (Admin)'),
+        ('contacto', 'Novo Contacto'),
+    ]
+    
+    ESTADO_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('enviado', 'Enviado'),
+        ('falhou', 'Falhou'),
+    ]
+    
+    tipo = models.CharField(
+        max_length=20,
+        choices=TIPO_CHOICES,
+        verbose_name='Tipo'
+    )
+    
+    assunto = models.CharField(
+        max_length=255,
+        verbose_name='Assunto'
+    )
+    
+    mensagem = models.TextField(
+        verbose_name='Mensagem'
+    )
+    
+    destinatarios = models.CharField(
+        max_length=500,
+        verbose_name='Destinatários',
+        help_text='Endereços separados por vírgula'
+    )
+    
+    pedido = models.ForeignKey(
+        'carinho.PedidoEntrega',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notificacoes',
+        verbose_name='Pedido'
+    )
+    
+    estado = models.CharField(
+        max_length=10,
+        choices=ESTADO_CHOICES,
+        default='pendente',
+        verbose_name='Estado'
+    )
+    
+    tentativas = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Tentativas'
+    )
+    
+    proxima_tentativa = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Próxima Tentativa'
+    )
+    
+    ultimo_erro = models.TextField(
+        blank=True,
+        verbose_name='Último Erro'
+    )
+    
+    data_criacao = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Data de Criação'
+    )
+    
+    data_envio = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Data de Envio'
+    )
+    
+    class Meta:
+        verbose_name = 'Notificação por Email'
+        verbose_name_plural = 'Notificações por Email'
+        ordering = ['-data_criacao']
+        indexes = [
+            models.Index(fields=['estado', 'proxima_tentativa'], name='index_notif_fila_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.assunto} ({self.get_estado_display()})"
+    
+    def lista_destinatarios(self):
+        return [email.strip() for email in self.destinatarios.split(',') if email.strip()]
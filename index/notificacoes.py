@@ -0,0 +1,145 @@
+# index/notificacoes.py
+"""
+Envio de emails através da outbox (`NotificacaoEmail`).
+
+`enfileirar_email` grava a mensagem na transação corrente e, só depois do
+commit, pede ao Celery que processe a fila. O processamento agrupa as
+mensagens numa única conexão SMTP, reagenda falhas com backoff exponencial
+e marca `notificado_admin` dos pedidos em lote.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import NotificacaoEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_TENTATIVAS = 5
+TAMANHO_LOTE = 50
+# Tempo durante o qual um lote fica reservado para o worker que o pegou
+TEMPO_RESERVA = timedelta(minutes=5)
+
+
+def enfileirar_email(assunto, mensagem, destinatarios, tipo, pedido=None):
+    """Grava o email na outbox e agenda o envio para depois do commit"""
+    if isinstance(destinatarios, (list, tuple)):
+        destinatarios = ','.join(destinatarios)
+    
+    notificacao = NotificacaoEmail.objects.create(
+        tipo=tipo,
+        assunto=assunto[:255],
+        mensagem=mensagem,
+        destinatarios=destinatarios,
+        pedido=pedido,
+    )
+    transaction.on_commit(agendar_processamento)
+    return notificacao
+
+
+def agendar_processamento():
+    """Pede ao worker que processe a outbox (ou executa já, em modo eager)"""
+    from .tasks import processar_outbox_emails
+    
+    try:
+        if settings.CELERY_TASK_ALWAYS_EAGER:
+            processar_outbox_emails.apply()
+        else:
+            processar_outbox_emails.delay()
+    except Exception as e:
+        # A mensagem continua na outbox; a varredura periódica trata dela
+        logger.warning(f"Não foi possível agendar o envio de emails: {e}")
+
+
+def calcular_backoff(tentativas):
+    """1, 2, 4, 8... minutos, limitado a 1 hora"""
+    return timedelta(minutes=min(2 ** max(tentativas - 1, 0), 60))
+
+
+def reservar_lote(limite=TAMANHO_LOTE):
+    """Reserva as próximas mensagens pendentes para este worker"""
+    agora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            NotificacaoEmail.objects.select_for_update(skip_locked=True).filter(
+                estado='pendente',
+                proxima_tentativa__lte=agora
+            ).order_by('id').values_list('id', flat=True)[:limite]
+        )
+        NotificacaoEmail.objects.filter(id__in=ids).update(
+            tentativas=F('tentativas') + 1,
+            proxima_tentativa=agora + TEMPO_RESERVA
+        )
+    return list(NotificacaoEmail.objects.filter(id__in=ids).order_by('id'))
+
+
+def processar_lote(limite=TAMANHO_LOTE):
+    """
+    Envia um lote da outbox usando uma única conexão SMTP.
+    Retorna (enviados, falhados). Erros de conexão são propagados para que
+    a tarefa Celery possa repetir com backoff.
+    """
+    from carinho.models import PedidoEntrega
+    
+    lote = reservar_lote(limite)
+    if not lote:
+        return 0, 0
+    
+    enviados, falhas = [], []
+    conexao = get_connection(fail_silently=False)
+    try:
+        conexao.open()
+    except Exception as e:
+        _reagendar(lote, str(e))
+        raise
+    
+    try:
+        for notificacao in lote:
+            email = EmailMessage(
+                notificacao.assunto,
+                notificacao.mensagem,
+                settings.DEFAULT_FROM_EMAIL,
+                notificacao.lista_destinatarios(),
+                connection=conexao,
+            )
+            try:
+                conexao.send_messages([email])
+                enviados.append(notificacao)
+            except Exception as e:
+                falhas.append((notificacao, str(e)))
+    finally:
+        conexao.close()
+    
+    agora = timezone.now()
+    if enviados:
+        NotificacaoEmail.objects.filter(
+            id__in=[n.id for n in enviados]
+        ).update(estado='enviado', data_envio=agora, ultimo_erro='')
+        
+        pedidos_ids = {n.pedido_id for n in enviados if n.tipo == 'pedido_admin' and n.pedido_id}
+        if pedidos_ids:
+            PedidoEntrega.objects.filter(pk__in=pedidos_ids).update(notificado_admin=True)
+    
+    for notificacao, erro in falhas:
+        _reagendar([notificacao], erro)
+    
+    logger.info(f"Outbox: {len(enviados)} email(s) enviado(s), {len(falhas)} falha(s)")
+    return len(enviados), len(falhas)
+
+
+def _reagendar(notificacoes, erro):
+    """Agenda nova tentativa com backoff, ou desiste após MAX_TENTATIVAS"""
+    agora = timezone.now()
+    for notificacao in notificacoes:
+        notificacao.ultimo_erro = erro
+        notificacao.proxima_tentativa = agora + calcular_backoff(notificacao.tentativas)
+        if notificacao.tentativas >= MAX_TENTATIVAS:
+            notificacao.estado = 'falhou'
+    NotificacaoEmail.objects.bulk_update(
+        notificacoes, ['estado', 'proxima_tentativa', 'ultimo_erro']
+    )
@@ -0,0 +1,60 @@
+# index/plano_consultas.py
+"""
+Verificação do plano de execução (EXPLAIN) das consultas críticas.
+
+Usado nos testes para garantir que as consultas mais frequentes continuam a
+usar índices e não regridem para uma varredura sequencial da tabela:
+
+- SQLite: linha `SCAN <tabela>` sem `USING INDEX`/`USING COVERING INDEX`;
+- PostgreSQL: nó `Seq Scan on <tabela>` (com `enable_seqscan` desligado,
+  para que o planeador escolha o índice sempre que ele existir, mesmo com
+  as poucas linhas dos dados de teste).
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+_SCAN_SQLITE = re.compile(r'\bSCAN (?:TABLE )?(\w+)$', re.MULTILINE)
+_SCAN_POSTGRES = re.compile(r'Seq Scan on (\w+)')
+
+
+@contextmanager
+def _sem_seqscan():
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        yield
+
+
+def obter_plano(queryset):
+    """Texto do EXPLAIN da queryset no banco atual"""
+    with _sem_seqscan():
+        return queryset.explain()
+
+
+def varreduras_sequenciais(queryset):
+    """Tabelas percorridas sequencialmente pelo plano da queryset"""
+    plano = obter_plano(queryset)
+    padrao = _SCAN_POSTGRES if connection.vendor == 'postgresql' else _SCAN_SQLITE
+    return {tabela.strip('"') for tabela in padrao.findall(plano)}
+
+
+class PlanoConsultasMixin:
+    """Asserções de plano de execução para TestCase"""
+
+    def assertUsaIndice(self, queryset, tabelas=None):
+        """
+        Falha se alguma das tabelas (por omissão, a do modelo da queryset)
+        for lida com varredura sequencial.
+        """
+        tabelas = set(tabelas or [queryset.model._meta.db_table])
+        sequenciais = varreduras_sequenciais(queryset) & tabelas
+        if sequenciais:
+            self.fail(
+                f'Varredura sequencial em {", ".join(sorted(sequenciais))}:\n'
+                f'{obter_plano(queryset)}'
+            )
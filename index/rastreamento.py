@@ -0,0 +1,100 @@
+# index/rastreamento.py
+"""
+Rastreamento de campos alterados ("dirty fields").
+
+Os modelos que usam `RastreamentoCamposMixin` guardam os valores lidos da
+base de dados em `from_db`, por isso sabem o que mudou sem voltar a ler a
+linha antes de gravar, e gravam só essas colunas (`update_fields`).
+"""
+import copy
+
+# Tipos mutáveis cujo valor original tem de ser copiado (ex.: JSONField)
+_TIPOS_MUTAVEIS = (dict, list, set)
+
+
+class RastreamentoCamposMixin:
+    """
+    Mixin para modelos: expõe `changed_fields` e `valor_original(campo)`
+    e faz `save()` de instâncias carregadas da BD só com as colunas alteradas.
+    """
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._guardar_valores_originais()
+        return instance
+    
+    def _guardar_valores_originais(self, campos=None):
+        deferidos = self.get_deferred_fields()
+        originais = getattr(self, '_valores_originais', {}) if campos else {}
+        for field in self._meta.concrete_fields:
+            if field.attname in deferidos or (campos and field.attname not in campos):
+                continue
+            valor = getattr(self, field.attname)
+            if isinstance(valor, _TIPOS_MUTAVEIS):
+                valor = copy.deepcopy(valor)
+            originais[field.attname] = valor
+        self._valores_originais = originais
+    
+    @property
+    def changed_fields(self):
+        """Nomes dos campos alterados desde a leitura (ou último save)"""
+        originais = getattr(self, '_valores_originais', None)
+        if originais is None:
+            return set()
+        
+        deferidos = self.get_deferred_fields()
+        alterados = set()
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname in deferidos:
+                continue
+            if field.attname not in originais:
+                # Campo adiado na leitura mas atribuído depois
+                alterados.add(field.name)
+            elif getattr(self, field.attname) != originais[field.attname]:
+                alterados.add(field.name)
+        return alterados
+    
+    def valor_original(self, campo):
+        """Valor do campo tal como foi lido da base de dados"""
+        field = self._meta.get_field(campo)
+        originais = getattr(self, '_valores_originais', {})
+        return originais.get(field.attname, getattr(self, field.attname))
+    
+    def save(self, *args, ignorar_se_inalterado=False, **kwargs):
+        """
+        Instâncias lidas da BD gravam só as colunas alteradas (mais as
+        auto_now). Sem nada alterado grava a linha toda, como o save() do
+        Django, e os sinais disparam normalmente; com
+        `ignorar_se_inalterado=True` não escreve nada nem envia sinais.
+        """
+        rastreado = (
+            not self._state.adding
+            and self.pk is not None
+            and hasattr(self, '_valores_originais')
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and len(args) < 3  # update_fields passado por posição
+        )
+        if rastreado:
+            alterados = self.changed_fields
+            if alterados:
+                # Campos auto_now também têm de ser gravados
+                alterados.update(
+                    field.name for field in self._meta.concrete_fields
+                    if getattr(field, 'auto_now', False)
+                )
+                kwargs['update_fields'] = alterados
+            elif ignorar_se_inalterado:
+                return
+        
+        super().save(*args, **kwargs)
+        self._guardar_valores_originais()
+    
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields:
+            campos = {self._meta.get_field(campo).attname for campo in fields}
+            self._guardar_valores_originais(campos)
+        else:
+            self._guardar_valores_originais()
@@ -0,0 +1,38 @@
+# index/tasks.py
+from celery import shared_task
+
+from .notificacoes import TAMANHO_LOTE, processar_lote
+
+# Máximo de lotes processados por execução, para não prender o worker
+MAX_LOTES_POR_EXECUCAO = 20
+
+
+@shared_task(
+    autoretry_for=(OSError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    max_retries=5,
+)
+def processar_outbox_emails(limite=TAMANHO_LOTE):
+    """Esvazia a outbox de emails em lotes"""
+    total_enviados = total_falhas = 0
+    for _ in range(MAX_LOTES_POR_EXECUCAO):
+        enviados, falhas = processar_lote(limite)
+        total_enviados += enviados
+        total_falhas += falhas
+        if enviados + falhas < limite:
+            break
+    return {'enviados': total_enviados, 'falhas': total_falhas}
+
+
+@shared_task
+def gerar_derivadas_imagem(nome, forcar=False, tags=()):
+    """Gera as versões redimensionadas (WebP/JPEG) de uma imagem enviada"""
+    from .imagens import gerar_derivadas
+    from .invalidacao import invalidar_tags
+
+    manifesto = gerar_derivadas(nome, forcar=forcar)
+    if manifesto and tags:
+        # Caches que embutem os srcsets (ex.: snapshot do catálogo)
+        invalidar_tags(*tags)
+    return manifesto['larguras'] if manifesto else []
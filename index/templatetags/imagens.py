@@ -0,0 +1,30 @@
+from django import template
+
+from index import imagens
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(arquivo, extensao='jpg'):
+    """srcset das derivadas de um campo de imagem ('' se ainda não existirem)"""
+    return imagens.srcset(getattr(arquivo, 'name', None), extensao)
+
+
+@register.inclusion_tag('imagem_responsiva.html')
+def imagem_responsiva(arquivo, alt='', classe='', sizes='100vw', loading='lazy'):
+    """<picture> com WebP e JPEG nas larguras geradas, caindo para o original"""
+    nome = getattr(arquivo, 'name', None)
+    # Imagens do snapshot do catálogo já trazem os srcsets calculados
+    srcsets = getattr(arquivo, 'srcsets', None) or {
+        extensao: imagens.srcset(nome, extensao) for extensao in ('webp', 'jpg')
+    }
+    return {
+        'src': arquivo.url if nome else '',
+        'webp': srcsets['webp'],
+        'jpg': srcsets['jpg'],
+        'alt': alt,
+        'classe': classe,
+        'sizes': sizes,
+        'loading': loading,
+    }
@@ -1,3 +1,291 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from blog.models import Categoria as CategoriaBlog, Publicacao
+from carinho.models import Carrinho, PedidoEntrega
+from carinho.transicoes import ESTADOS_ATIVOS
+from contacto.models import Contacto
+from menu.models import TAG_CATALOGO, Produto
+from .imagens import gerar_derivadas, nome_derivada
+from .invalidacao import agrupar_invalidacoes, invalidar, versao_tag
+from .models import NotificacaoEmail
+from .notificacoes import MAX_TENTATIVAS, enfileirar_email, processar_lote
+from .plano_consultas import PlanoConsultasMixin
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RastreamentoCamposTest(TestCase):
+    def setUp(self):
+        Produto.objects.create(nome='Sumo', preco=500, categoria='Bebidas', estoque=10)
+        self.produto = Produto.objects.get(nome='Sumo')
+
+    def test_changed_fields(self):
+        self.assertEqual(self.produto.changed_fields, set())
+        self.produto.estoque = 7
+        self.assertEqual(self.produto.changed_fields, {'estoque'})
+        self.assertEqual(self.produto.valor_original('estoque'), 10)
+
+    def test_save_grava_so_campos_alterados_sem_reler_a_linha(self):
+        self.produto.estoque = 7
+        with CaptureQueriesContext(connection) as consultas:
+            self.produto.save()
+        sql = [q['sql'] for q in consultas.captured_queries]
+        self.assertFalse(any(s.startswith('SELECT') for s in sql))
+        update = next(s for s in sql if s.startswith('UPDATE'))
+        self.assertIn('"estoque"', update)
+        self.assertNotIn('"nome"', update)
+        self.assertEqual(self.produto.changed_fields, set())
+
+    def test_save_sem_alteracoes_grava_normalmente(self):
+        recebidos = []
+        receptor = lambda sender, update_fields, **kwargs: recebidos.append(update_fields)
+        post_save.connect(receptor, sender=Produto)
+        self.addCleanup(post_save.disconnect, receptor, sender=Produto)
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.produto.save()
+        self.assertIn('"nome"', next(q['sql'] for q in consultas if q['sql'].startswith('UPDATE')))
+        self.assertEqual(recebidos, [None])
+
+    def test_save_ignorar_se_inalterado(self):
+        with self.assertNumQueries(0):
+            self.produto.save(ignorar_se_inalterado=True)
+        self.produto.estoque = 7
+        self.produto.save(ignorar_se_inalterado=True)
+        self.assertEqual(Produto.objects.get(pk=self.produto.pk).estoque, 7)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class InvalidacaoCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidacao_so_depois_do_commit(self):
+        cache.set('produtos_ativos', ['antigo'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Produto.objects.create(nome='Sumo', preco=500, categoria='Bebidas', estoque=10)
+            self.assertEqual(cache.get('produtos_ativos'), ['antigo'])
+        self.assertIsNone(cache.get('produtos_ativos'))
+
+    def test_save_incrementa_tag_do_catalogo(self):
+        versao = versao_tag(TAG_CATALOGO)
+        with self.captureOnCommitCallbacks(execute=True):
+            Produto.objects.create(nome='Sumo', preco=500, categoria='Bebidas', estoque=10)
+        self.assertEqual(versao_tag(TAG_CATALOGO), versao + 1)
+
+    def test_agrupar_descarrega_no_fim_do_bloco(self):
+        cache.set('chave', 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            with agrupar_invalidacoes():
+                invalidar('chave')
+                self.assertEqual(cache.get('chave'), 1)
+        self.assertIsNone(cache.get('chave'))
+
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    CELERY_TASK_ALWAYS_EAGER=True,
+)
+class OutboxEmailsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        self.pedido = PedidoEntrega.objects.create(
+            carrinho=Carrinho.objects.create(usuario=usuario, estado='fechado'),
+            endereco_entrega='Rua 1', numero_pedido='PED-1'
+        )
+
+    def _enfileirar(self, **extra):
+        return enfileirar_email('Novo pedido', 'Corpo', ['admin@teste.com'], 'pedido_admin', **extra)
+
+    def test_grava_na_transacao_e_so_envia_depois_do_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            notificacao = self._enfileirar(pedido=self.pedido)
+            self.assertTrue(NotificacaoEmail.objects.filter(pk=notificacao.pk).exists())
+            self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_rollback_descarta_a_mensagem(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self._enfileirar(pedido=self.pedido)
+                    raise RuntimeError('falhou')
+        self.assertEqual(callbacks, [])
+        self.assertFalse(NotificacaoEmail.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_lote_envia_e_marca_notificado_admin(self):
+        self._enfileirar(pedido=self.pedido)
+        enfileirar_email('Contacto', 'Corpo', 'admin@teste.com', 'contacto')
+
+        self.assertEqual(processar_lote(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(NotificacaoEmail.objects.exclude(estado='enviado').exists())
+        self.pedido.refresh_from_db()
+        self.assertTrue(self.pedido.notificado_admin)
+        self.assertEqual(processar_lote(), (0, 0))
+
+    def test_falha_reagenda_com_backoff_e_desiste(self):
+        notificacao = self._enfileirar(pedido=self.pedido)
+        envio = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+
+        with mock.patch(envio, side_effect=OSError('smtp')):
+            for tentativa in range(1, MAX_TENTATIVAS + 1):
+                antes = timezone.now()
+                self.assertEqual(processar_lote(), (0, 1))
+                notificacao.refresh_from_db()
+                self.assertEqual(notificacao.tentativas, tentativa)
+                self.assertEqual(notificacao.ultimo_erro, 'smtp')
+                if tentativa < MAX_TENTATIVAS:
+                    self.assertEqual(notificacao.estado, 'pendente')
+                    espera = notificacao.proxima_tentativa - antes
+                    self.assertAlmostEqual(espera.total_seconds(), 60 * 2 ** (tentativa - 1), delta=5)
+                    # Ainda não chegou a hora: fica fora do lote
+                    self.assertEqual(processar_lote(), (0, 0))
+                    NotificacaoEmail.objects.filter(pk=notificacao.pk).update(
+                        proxima_tentativa=timezone.now() - timedelta(seconds=1)
+                    )
+
+        self.assertEqual(notificacao.estado, 'falhou')
+        self.assertEqual(processar_lote(), (0, 0))
+        self.pedido.refresh_from_db()
+        self.assertFalse(self.pedido.notificado_admin)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PlanoConsultasTest(PlanoConsultasMixin, TestCase):
+    """As consultas mais frequentes não podem regredir para varredura sequencial"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        for i in range(20):
+            Produto.objects.create(
+                nome=f'Produto {i}', preco=1000, categoria='Bebidas', estoque=10,
+                status='ativo' if i % 4 else 'inativo', ordem=i,
+            )
+            carrinho = Carrinho.objects.create(usuario=cls.usuario, estado='fechado')
+            PedidoEntrega.objects.create(
+                carrinho=carrinho, endereco_entrega='Rua 1', numero_pedido=f'PED-{i}',
+                estado='entregue' if i % 3 else 'pendente',
+            )
+            Contacto.objects.create(
+                nome='Cliente', email='cliente@teste.com', telemovel='923000000',
+                assunto='Dúvida', mensagem='Mensagem', lido=bool(i % 2),
+            )
+        categoria = CategoriaBlog.objects.create(nome='Novidades', slug='novidades')
+        for i in range(20):
+            Publicacao.objects.create(
+                titulo=f'Publicação {i}', slug=f'publicacao-{i}', conteudo='Texto', resumo='Resumo',
+                autor=cls.usuario, categoria=categoria, publicado=bool(i % 2),
+            )
+
+    def test_fila_de_pedidos_por_estado(self):
+        self.assertUsaIndice(
+            PedidoEntrega.objects.filter(estado__in=ESTADOS_ATIVOS).order_by('data_solicitacao', 'id')
+        )
+
+    def test_historico_do_cliente(self):
+        self.assertUsaIndice(
+            PedidoEntrega.objects.filter(carrinho__usuario=self.usuario)
+            .order_by('-data_solicitacao', '-id'),
+            tabelas=['carinho_pedidoentrega', 'carinho_carrinho'],
+        )
+
+    def test_carrinho_do_usuario_por_estado(self):
+        self.assertUsaIndice(Carrinho.objects.filter(usuario=self.usuario, estado='fechado'))
+
+    def test_produtos_ativos_ordenados(self):
+        self.assertUsaIndice(Produto.objects.filter(status='ativo').order_by('ordem', 'nome'))
+
+    def test_publicacoes_recentes_e_populares(self):
+        self.assertUsaIndice(Publicacao.objects.filter(publicado=True).order_by('-data_publicacao'))
+        self.assertUsaIndice(Publicacao.objects.filter(publicado=True).order_by('-visualizacoes'))
+
+    def test_contactos_nao_lidos(self):
+        self.assertUsaIndice(Contacto.objects.filter(lido=False).order_by('-data_envio'))
+
+
+def _png(largura, altura):
+    """PNG com transparência e um bloco EXIF"""
+    imagem = Image.new('RGBA', (largura, altura), (200, 30, 30, 128))
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera Teste'
+    buffer = BytesIO()
+    imagem.save(buffer, 'PNG', exif=exif)
+    return buffer.getvalue()
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CELERY_TASK_ALWAYS_EAGER=True,
+)
+class DerivadasImagemTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = self.settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_gera_larguras_sem_metadados(self):
+        nome = default_storage.save('produtos/teste.png', SimpleUploadedFile('teste.png', _png(800, 400)))
+        manifesto = gerar_derivadas(nome)
+
+        self.assertEqual(manifesto['larguras'], [160, 320, 640, 800])
+        with default_storage.open(nome_derivada(nome, 320, 'webp')) as arquivo:
+            webp = Image.open(arquivo)
+            self.assertEqual((webp.format, webp.size), ('WEBP', (320, 160)))
+            self.assertNotIn('exif', webp.info)
+        with default_storage.open(nome_derivada(nome, 640, 'jpg')) as arquivo:
+            jpeg = Image.open(arquivo)
+            self.assertEqual((jpeg.format, jpeg.mode), ('JPEG', 'RGB'))
+            self.assertEqual(len(jpeg.getexif()), 0)
+
+    def test_save_agenda_e_templates_usam_srcset(self):
+        produto = Produto(nome='Burger', preco=2000, categoria='hamburguer', estoque=5)
+        produto.imagem = SimpleUploadedFile('burger.png', _png(300, 300))
+        html = Template('{% load imagens %}{% imagem_responsiva p.imagem alt=p.nome %}')
+
+        self.assertNotIn('srcset', html.render(Context({'p': produto})))
+        with self.captureOnCommitCallbacks(execute=True):
+            produto.save()
+
+        renderizado = html.render(Context({'p': produto}))
+        self.assertIn('type="image/webp"', renderizado)
+        self.assertIn(f'{nome_derivada(produto.imagem.name, 160, "webp")} 160w', renderizado)
+        self.assertIn(f'{nome_derivada(produto.imagem.name, 300, "jpg")} 300w', renderizado)
+
+    def test_comando_processa_imagens_existentes(self):
+        nome = default_storage.save('blog/capa.png', SimpleUploadedFile('capa.png', _png(200, 100)))
+        Produto.objects.bulk_create([Produto(nome='Capa', preco=1, categoria='Bebidas', imagem=nome)])
+
+        saida = StringIO()
+        call_command('gerar_derivadas_imagens', stdout=saida)
+        self.assertIn('1 imagens processadas (0 falhas)', saida.getvalue())
+        self.assertTrue(default_storage.exists(nome_derivada(nome, 200, 'webp')))
@@ -1,10 +1,15 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import HttpResponse, HttpResponseRedirect
+from django.shortcuts import render
+from django.urls import path, reverse
+from .forms import ImportarCatalogoForm
+from .importacao import FORMATOS, ErroImportacao, exportar_produtos, formato_do_arquivo, importar_produtos, ler_linhas
 from .models import Produto
 
 @admin.register(Produto)
 class ProdutoAdmin(admin.ModelAdmin):
     list_display = ['nome', 'categoria', 'preco', 'estoque', 'status', 'data_criacao']
-    list_filter = ['categoria', 'status', 'data_criacao']
+    list_filter = ['categoria', 'status', 'estoque_tempo_real', 'data_criacao']
     search_fields = ['nome', 'descricao']
     readonly_fields = ['data_criacao', 'data_atualizacao']
     list_editable = ['estoque', 'status']
@@ -14,7 +19,7 @@ class ProdutoAdmin(admin.ModelAdmin):
             'fields': ('nome', 'descricao_curta', 'descricao', 'categoria')
         }),
         ('Preço e Estoque', {
-            'fields': ('preco', 'estoque')
+            'fields': ('preco', 'estoque', 'estoque_tempo_real')
         }),
         ('Imagem e Status', {
             'fields': ('imagem', 'status')
@@ -23,4 +28,68 @@ class ProdutoAdmin(admin.ModelAdmin):
             'fields': ('data_criacao', 'data_atualizacao'),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+    
+    change_list_template = 'admin/menu/produto/change_list.html'
+    
+    # Importação/exportação do catálogo (CSV/JSON) em lote
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'importar/',
+                self.admin_site.admin_view(self.importar_catalogo),
+                name='menu_produto_importar',
+            ),
+            path(
+                'exportar/<str:formato>/',
+                self.admin_site.admin_view(self.exportar_catalogo),
+                name='menu_produto_exportar',
+            ),
+        ]
+        return custom_urls + urls
+    
+    def importar_catalogo(self, request):
+        """Upload de um CSV/JSON: simula ou aplica a diferença ao catálogo"""
+        if not self.has_change_permission(request) or not self.has_add_permission(request):
+            return HttpResponseRedirect(reverse('admin:menu_produto_changelist'))
+        
+        form = ImportarCatalogoForm(request.POST or None, request.FILES or None)
+        erros = []
+        if request.method == 'POST' and form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            simular = form.cleaned_data['simular']
+            try:
+                linhas = ler_linhas(arquivo.read(), formato_do_arquivo(arquivo.name))
+                resultado = importar_produtos(linhas, simular=simular)
+            except ErroImportacao as e:
+                erros = e.erros
+            else:
+                prefixo = 'Simulação: ' if simular else '✅ Catálogo importado: '
+                self.message_user(
+                    request,
+                    f"{prefixo}{resultado['criados']} criados, {resultado['atualizados']} atualizados, "
+                    f"{resultado['inalterados']} inalterados.",
+                    level=messages.INFO if simular else messages.SUCCESS,
+                )
+                if not simular:
+                    return HttpResponseRedirect(reverse('admin:menu_produto_changelist'))
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar catálogo',
+            'form': form,
+            'erros': erros,
+        }
+        return render(request, 'admin/menu/produto/importar.html', context)
+    
+    def exportar_catalogo(self, request, formato):
+        """Download do catálogo inteiro em CSV/JSON"""
+        if formato not in FORMATOS or not self.has_view_permission(request):
+            return HttpResponseRedirect(reverse('admin:menu_produto_changelist'))
+        
+        tipos = {'csv': 'text/csv', 'json': 'application/json'}
+        resposta = HttpResponse(exportar_produtos(formato), content_type=f'{tipos[formato]}; charset=utf-8')
+        resposta['Content-Disposition'] = f'attachment; filename="catalogo.{formato}"'
+        return resposta
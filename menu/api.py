@@ -0,0 +1,196 @@
+# menu/api.py
+"""
+Listagem de produtos em JSON para a app e o AJAX (`/menu/api/produtos/`).
+
+Parâmetros (todos opcionais):
+
+- `categoria`, `status`: listas separadas por vírgula, filtradas no SQL
+  (por omissão os status do menu: ativo e esgotado);
+- `fields`: colunas a devolver (o SELECT só lê as necessárias);
+- `limite`: produtos por página (até LIMITE_MAXIMO);
+- `cursor`: o `proximo` da página anterior. A paginação é por chave
+  (ordem, id), sem OFFSET: cada página é uma leitura do índice;
+- `updated_since`: só os produtos alterados depois deste instante (ISO
+  8601). Inclui todos os status, para a app saber o que deixou de estar
+  à venda; a próxima sincronização usa o maior `atualizado_ate` recebido.
+
+O corpo de cada página fica em cache por versão da tag do catálogo, e o
+ETag deriva só da versão e dos parâmetros: um pedido com If-None-Match
+responde 304 sem ir ao banco.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from index.invalidacao import versao_tag
+
+from .catalogo import IMAGEM_PADRAO, STATUS_NO_MENU
+from .models import TAG_CATALOGO, Produto
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+TEMPO_PAGINA = 60 * 5  # 5 minutos (a chave muda a cada versão)
+
+CATEGORIAS = {valor for valor, _ in Produto.CATEGORIA_CHOICES}
+STATUS = {valor for valor, _ in Produto.STATUS_CHOICES}
+
+# Campo da resposta -> colunas que precisa de ler
+CAMPOS = {
+    'id': ('id',),
+    'nome': ('nome',),
+    'descricao_curta': ('descricao_curta',),
+    'descricao': ('descricao',),
+    'categoria': ('categoria',),
+    'status': ('status',),
+    'preco': ('preco',),
+    'preco_formatado': ('preco',),
+    'em_estoque': ('estoque', 'status'),
+    'ordem': ('ordem',),
+    'imagem': ('imagem',),
+    'url': ('id',),
+    'data_atualizacao': ('data_atualizacao',),
+}
+# Sempre lidas: o cursor e o `atualizado_ate`
+COLUNAS_FIXAS = ('id', 'ordem', 'data_atualizacao')
+
+
+class ParametroInvalido(Exception):
+    pass
+
+
+def _lista(valor, validos, nome):
+    itens = [item.strip() for item in valor.split(',') if item.strip()]
+    invalidos = [item for item in itens if item not in validos]
+    if invalidos:
+        raise ParametroInvalido(f'{nome} inválido: {", ".join(invalidos)}')
+    return sorted(set(itens))
+
+
+def codificar_cursor(ordem, id_):
+    return base64.urlsafe_b64encode(f'{ordem}:{id_}'.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ordem, id_ = texto.split(':')
+        return int(ordem), int(id_)
+    except (ValueError, UnicodeDecodeError):
+        raise ParametroInvalido('cursor inválido')
+
+
+def ler_parametros(get):
+    """Valida e normaliza os parâmetros do pedido (ParametroInvalido se algum não servir)"""
+    parametros = {
+        'categoria': _lista(get.get('categoria', ''), CATEGORIAS, 'categoria'),
+        'status': _lista(get.get('status', ''), STATUS, 'status'),
+        'fields': _lista(get.get('fields', ''), CAMPOS, 'fields') or list(CAMPOS),
+        'cursor': None,
+        'updated_since': None,
+    }
+
+    try:
+        limite = int(get.get('limite', LIMITE_PADRAO))
+    except ValueError:
+        raise ParametroInvalido('limite inválido')
+    parametros['limite'] = min(max(limite, 1), LIMITE_MAXIMO)
+
+    if get.get('cursor'):
+        parametros['cursor'] = decodificar_cursor(get['cursor'])
+
+    if get.get('updated_since'):
+        try:
+            desde = parse_datetime(get['updated_since'])
+        except ValueError:
+            desde = None
+        if desde is None:
+            raise ParametroInvalido('updated_since inválido (use ISO 8601)')
+        if timezone.is_naive(desde):
+            desde = timezone.make_aware(desde)
+        parametros['updated_since'] = desde.isoformat()
+    return parametros
+
+
+def etag(parametros, versao=None):
+    """ETag da página: versão do catálogo + parâmetros normalizados"""
+    versao = versao if versao is not None else versao_tag(TAG_CATALOGO)
+    texto = json.dumps([versao, parametros], sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode()).hexdigest()[:32]
+
+
+def _serializadores(campos):
+    """Uma função por campo pedido, montada uma vez por página"""
+    prefixo_url = reverse('detalhes_produto', kwargs={'pk': 0})[:-2]
+
+    funcoes = {
+        # O DecimalField já vem quantizado (2 casas): str() dá o preço sem formatar floats
+        'preco': lambda linha: str(linha['preco']),
+        'preco_formatado': lambda linha: f"KZ {linha['preco']}",
+        'em_estoque': lambda linha: linha['estoque'] > 0 and linha['status'] == 'ativo',
+        'imagem': lambda linha: default_storage.url(linha['imagem']) if linha['imagem'] else IMAGEM_PADRAO,
+        'url': lambda linha: f"{prefixo_url}{linha['id']}/",
+        'data_atualizacao': lambda linha: linha['data_atualizacao'].isoformat(),
+    }
+    return [(campo, funcoes.get(campo) or (lambda linha, campo=campo: linha[campo])) for campo in campos]
+
+
+def consultar(parametros):
+    """QuerySet da página (uma consulta, só com as colunas necessárias)"""
+    produtos = Produto.objects.order_by('ordem', 'id')
+
+    if parametros['updated_since']:
+        produtos = produtos.filter(data_atualizacao__gt=parametros['updated_since'])
+        if parametros['status']:
+            produtos = produtos.filter(status__in=parametros['status'])
+    else:
+        produtos = produtos.filter(status__in=parametros['status'] or STATUS_NO_MENU)
+    if parametros['categoria']:
+        produtos = produtos.filter(categoria__in=parametros['categoria'])
+    if parametros['cursor']:
+        ordem, id_ = parametros['cursor']
+        produtos = produtos.filter(Q(ordem__gt=ordem) | Q(ordem=ordem, id__gt=id_))
+
+    colunas = set(COLUNAS_FIXAS)
+    for campo in parametros['fields']:
+        colunas.update(CAMPOS[campo])
+    # Uma linha a mais diz se há próxima página
+    return produtos.values(*sorted(colunas))[:parametros['limite'] + 1]
+
+
+def montar_pagina(parametros):
+    """Corpo JSON (bytes) da página"""
+    linhas = list(consultar(parametros))
+    proximo = None
+    if len(linhas) > parametros['limite']:
+        linhas = linhas[:parametros['limite']]
+        proximo = codificar_cursor(linhas[-1]['ordem'], linhas[-1]['id'])
+
+    serializadores = _serializadores(parametros['fields'])
+    dados = {
+        'produtos': [{campo: funcao(linha) for campo, funcao in serializadores} for linha in linhas],
+        'proximo': proximo,
+        'atualizado_ate': max((linha['data_atualizacao'] for linha in linhas), default=None),
+    }
+    if dados['atualizado_ate']:
+        dados['atualizado_ate'] = dados['atualizado_ate'].isoformat()
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def obter_pagina(parametros):
+    """Corpo da página da versão atual, com cache"""
+    versao = versao_tag(TAG_CATALOGO)
+    cache_key = f'api_produtos_v{versao}_{etag(parametros, versao)}'
+    corpo = cache.get(cache_key)
+
+    if corpo is None:
+        corpo = montar_pagina(parametros)
+        cache.set(cache_key, corpo, TEMPO_PAGINA)
+
+    return corpo
@@ -0,0 +1,142 @@
+# menu/autocompletar.py
+"""
+Índice em memória para o autocompletar da pesquisa.
+
+Cada processo guarda uma lista ordenada de (token, posição, produto_id)
+com os tokens sem acentos do nome dos produtos ativos, e os dados que a
+resposta leva (id, nome, preço, imagem). Um prefixo resolve-se com uma
+busca binária nessa lista, sem banco: o índice só é refeito quando a
+versão da tag do catálogo (`versao_tag(TAG_CATALOGO)`) muda ou, por
+segurança (o cache pode ser esvaziado e a versão voltar a 1), quando
+passa de IDADE_MAXIMA_INDICE.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.files.storage import default_storage
+
+from index.invalidacao import versao_tag
+
+from .busca import _PALAVRA, remover_acentos
+from .models import TAG_CATALOGO, Produto
+
+LIMITE_SUGESTOES = 8
+IDADE_MAXIMA_INDICE = 60 * 15  # 15 minutos
+IMAGEM_PADRAO = '/static/img/big.jpg'
+
+
+class IndicePrefixos:
+    """Tokens ordenados dos nomes dos produtos ativos"""
+
+    def __init__(self, versao, produtos):
+        self.versao = versao
+        self.criado_em = time.monotonic()
+        self.produtos = {}
+        # Ordem do menu (ordem, nome), usada para desempatar sugestões
+        self.posicao = {}
+        entradas = []
+        for posicao, produto in enumerate(produtos):
+            self.produtos[produto['id']] = produto
+            self.posicao[produto['id']] = posicao
+            for indice, token in enumerate(tokens(produto['nome'])):
+                entradas.append((token, indice, produto['id']))
+        entradas.sort()
+        self.tokens = [entrada[0] for entrada in entradas]
+        self.entradas = entradas
+
+    def _com_prefixo(self, prefixo):
+        """{produto_id: menor posição do token no nome} para tokens que começam por `prefixo`"""
+        encontrados = {}
+        for posicao in range(bisect_left(self.tokens, prefixo), len(self.tokens)):
+            if not self.tokens[posicao].startswith(prefixo):
+                break
+            _, indice, produto_id = self.entradas[posicao]
+            if produto_id not in encontrados or indice < encontrados[produto_id]:
+                encontrados[produto_id] = indice
+        return encontrados
+
+    def sugerir(self, termo, limite=LIMITE_SUGESTOES):
+        """Produtos cujo nome tem um token a começar por cada palavra do termo"""
+        prefixos = tokens(termo)
+        if not prefixos:
+            return []
+
+        candidatos = None
+        for prefixo in prefixos:
+            encontrados = self._com_prefixo(prefixo)
+            if candidatos is None:
+                candidatos = encontrados
+            else:
+                candidatos = {pk: candidatos[pk] for pk in candidatos.keys() & encontrados.keys()}
+            if not candidatos:
+                return []
+
+        # Nome que começa pelo termo primeiro, depois a ordem do menu
+        ordenados = sorted(candidatos, key=lambda pk: (candidatos[pk] > 0, self.posicao[pk]))
+        return [self.produtos[pk] for pk in ordenados[:limite]]
+
+
+def tokens(texto):
+    return [remover_acentos(palavra) for palavra in _PALAVRA.findall(texto or '')]
+
+
+def _url_imagem(nome):
+    if not nome:
+        return IMAGEM_PADRAO
+    try:
+        return default_storage.url(nome)
+    except Exception:
+        return IMAGEM_PADRAO
+
+
+def construir_indice(versao):
+    produtos = [
+        {
+            'id': produto['id'],
+            'nome': produto['nome'],
+            'preco': float(produto['preco']),
+            'imagem': _url_imagem(produto['imagem']),
+        }
+        for produto in Produto.objects.filter(status='ativo').order_by('ordem', 'nome').values(
+            'id', 'nome', 'preco', 'imagem'
+        )
+    ]
+    return IndicePrefixos(versao, produtos)
+
+
+def _valido(indice, versao):
+    return (
+        indice is not None and indice.versao == versao
+        and time.monotonic() - indice.criado_em < IDADE_MAXIMA_INDICE
+    )
+
+
+_indice = None
+_lock = threading.Lock()
+
+
+def obter_indice():
+    """Índice do processo, refeito quando a versão do catálogo muda"""
+    global _indice
+    versao = versao_tag(TAG_CATALOGO)
+    indice = _indice
+    if _valido(indice, versao):
+        return indice
+
+    with _lock:
+        # Outro thread pode já ter refeito enquanto esperávamos
+        if not _valido(_indice, versao):
+            _indice = construir_indice(versao)
+        return _indice
+
+
+def descartar_indice():
+    """Força a reconstrução na próxima consulta (testes, comandos)"""
+    global _indice
+    _indice = None
+
+
+def sugerir_produtos(termo, limite=LIMITE_SUGESTOES):
+    """Sugestões de produtos ativos para o que já foi digitado"""
+    return obter_indice().sugerir(termo, limite)
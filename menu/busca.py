@@ -0,0 +1,216 @@
+# menu/busca.py
+"""
+Pesquisa de produtos por texto completo, com relevância.
+
+O backend é escolhido pelo banco em uso:
+
+- PostgreSQL: coluna `busca_vetor` (tsvector) com índice GIN, na
+  configuração `pt_unaccent` (dicionário português + unaccent);
+- SQLite: tabela virtual FTS5 `menu_produto_fts` (tokenizer unicode61 sem
+  acentos) com um stemmer leve de português aplicado em Python;
+- outros: `icontains`, sem índice (só para não falhar).
+
+O índice é atualizado no save/delete de Produto (ver menu/models.py) e
+pode ser reconstruído com `python manage.py reconstruir_indice_busca`.
+Os resultados não são guardados em cache por termo: a consulta ao índice
+já é barata e o número de termos possíveis não tem limite.
+"""
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+TABELA_FTS = 'menu_produto_fts'
+CONFIG_POSTGRES = 'pt_unaccent'
+
+# Pesos por campo: nome > descrição curta > descrição
+PESOS = {'nome': 'A', 'descricao_curta': 'B', 'descricao': 'C'}
+PESOS_BM25 = (10.0, 4.0, 1.0)
+
+_PALAVRA = re.compile(r'\w+')
+
+
+def remover_acentos(texto):
+    """'Hambúrguer' -> 'hamburguer'"""
+    decomposto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+# Sufixos por ordem de tentativa: (sufixo, substituição, tamanho mínimo do radical)
+_SUFIXOS_PLURAL = [
+    ('oes', 'ao', 2), ('aes', 'ao', 1), ('ais', 'al', 2), ('eis', 'el', 2),
+    ('ois', 'ol', 2), ('is', 'il', 2), ('ns', 'm', 2), ('res', 'r', 3),
+    ('zes', 'z', 3), ('ses', 's', 3), ('s', '', 3),
+]
+_SUFIXOS_GRAU = [
+    ('zinho', '', 3), ('zinha', '', 3), ('inho', 'o', 3), ('inha', 'a', 3),
+    ('issimo', 'o', 3), ('issima', 'a', 3),
+]
+
+
+def _aplicar(palavra, sufixos):
+    for sufixo, troca, minimo in sufixos:
+        if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= minimo:
+            return palavra[:-len(sufixo)] + troca
+    return palavra
+
+
+def radical(palavra):
+    """
+    Stemmer leve de português (plural e diminutivo, ao estilo do RSLP):
+    basta que a mesma palavra dê sempre o mesmo radical no índice e na busca.
+    Não mexe no género, para que prefixos ("bata") continuem a casar.
+    """
+    palavra = remover_acentos(palavra)
+    if len(palavra) <= 3 or palavra.isdigit():
+        return palavra
+    palavra = _aplicar(palavra, _SUFIXOS_PLURAL)
+    return _aplicar(palavra, _SUFIXOS_GRAU)
+
+
+def radicais(texto):
+    return [radical(palavra) for palavra in _PALAVRA.findall(texto or '')]
+
+
+def _ordenar_por(ids):
+    """Expressão que preserva a ordem de relevância de uma lista de ids"""
+    return Case(
+        *[When(pk=pk, then=posicao) for posicao, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+
+
+class BuscaBase(ABC):
+    """Interface comum dos backends de pesquisa"""
+
+    @abstractmethod
+    def buscar(self, termo, queryset=None):
+        """Queryset de produtos que correspondem ao termo, do mais relevante para o menos"""
+
+    def indexar(self, produtos):
+        """Atualiza o índice dos produtos indicados"""
+
+    def remover(self, ids):
+        """Retira produtos do índice"""
+
+    def reconstruir(self, produtos):
+        """Refaz o índice inteiro a partir dos produtos indicados"""
+
+    def _base(self, queryset):
+        from .models import Produto
+        return Produto.objects.all() if queryset is None else queryset
+
+
+class BuscaSimples(BuscaBase):
+    """Sem índice de texto: icontains nos três campos"""
+
+    def buscar(self, termo, queryset=None):
+        return self._base(queryset).filter(
+            Q(nome__icontains=termo) |
+            Q(descricao__icontains=termo) |
+            Q(descricao_curta__icontains=termo)
+        ).order_by('ordem', 'nome')
+
+
+class BuscaSQLite(BuscaBase):
+    """FTS5 com radicais calculados em Python e ranking BM25"""
+
+    LIMITE = 500
+
+    def _consulta_fts(self, termo):
+        # Cada radical como prefixo ("hamburg*"), todos obrigatórios
+        termos = [f'"{r}"*' for r in radicais(termo) if r]
+        return ' '.join(termos)
+
+    def buscar(self, termo, queryset=None):
+        consulta = self._consulta_fts(termo)
+        if not consulta:
+            return self._base(queryset).none()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s '
+                f'ORDER BY bm25({TABELA_FTS}, %s, %s, %s) LIMIT %s',
+                [consulta, *PESOS_BM25, self.LIMITE]
+            )
+            ids = [linha[0] for linha in cursor.fetchall()]
+
+        if not ids:
+            return self._base(queryset).none()
+        return self._base(queryset).filter(pk__in=ids).order_by(_ordenar_por(ids))
+
+    def _linhas(self, produtos):
+        return [
+            (p.id, ' '.join(radicais(p.nome)), ' '.join(radicais(p.descricao_curta)),
+             ' '.join(radicais(p.descricao)))
+            for p in produtos
+        ]
+
+    def indexar(self, produtos):
+        linhas = self._linhas(produtos)
+        if not linhas:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {TABELA_FTS} WHERE rowid = %s', [(linha[0],) for linha in linhas])
+            cursor.executemany(
+                f'INSERT INTO {TABELA_FTS} (rowid, nome, descricao_curta, descricao) VALUES (%s, %s, %s, %s)',
+                linhas
+            )
+
+    def remover(self, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {TABELA_FTS} WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def reconstruir(self, produtos):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABELA_FTS}')
+        self.indexar(produtos)
+
+
+class BuscaPostgres(BuscaBase):
+    """tsvector ponderado numa coluna com índice GIN, ranking ts_rank"""
+
+    def _vetor_sql(self):
+        return ' || '.join(
+            f"setweight(to_tsvector('{CONFIG_POSTGRES}', coalesce({campo}, '')), '{peso}')"
+            for campo, peso in PESOS.items()
+        )
+
+    def buscar(self, termo, queryset=None):
+        consulta = f"websearch_to_tsquery('{CONFIG_POSTGRES}', %s)"
+        return self._base(queryset).annotate(
+            relevancia=RawSQL(f'ts_rank(menu_produto.busca_vetor, {consulta})', [termo],
+                              output_field=FloatField()),
+        ).filter(
+            RawSQL(f'menu_produto.busca_vetor @@ {consulta}', [termo], output_field=BooleanField())
+        ).order_by('-relevancia', 'ordem', 'nome')
+
+    def indexar(self, produtos):
+        ids = [p.id for p in produtos]
+        if ids:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE menu_produto SET busca_vetor = {self._vetor_sql()} WHERE id = ANY(%s)',
+                    [ids]
+                )
+
+    def reconstruir(self, produtos=None):
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE menu_produto SET busca_vetor = {self._vetor_sql()}')
+
+
+def obter_backend():
+    """Backend de pesquisa do banco em uso"""
+    if connection.vendor == 'postgresql':
+        return BuscaPostgres()
+    if connection.vendor == 'sqlite':
+        return BuscaSQLite()
+    return BuscaSimples()
+
+
+def buscar_produtos(termo, queryset=None):
+    """Atalho: produtos que correspondem ao termo, por relevância"""
+    return obter_backend().buscar(termo, queryset)
@@ -0,0 +1,201 @@
+# menu/catalogo.py
+"""
+Snapshot versionado do catálogo inteiro.
+
+Todos os produtos do menu (ativos e esgotados), agrupados por categoria,
+com preço formatado e variantes de imagem, serializados num único JSON
+compacto carimbado com a versão da tag do catálogo. O documento é
+montado uma vez por versão, guardado no cache (Redis) e na memória de
+cada processo: navegar no menu ou pedir `/menu/catalogo.json` não faz
+nenhuma consulta ao banco, só a leitura da versão da tag.
+
+Qualquer save/delete de Produto incrementa a tag (`limpar_cache_produto`)
+e a versão seguinte é montada no primeiro pedido que a encontrar. As
+vendas (menu/estoque.py) só a incrementam quando o produto esgota ou volta
+a ter estoque, por isso o snapshot não guarda a quantidade.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.text import Truncator
+
+from index import imagens
+from index.invalidacao import versao_tag
+
+from .models import TAG_CATALOGO, Produto
+
+# Esgotados continuam no menu, marcados como indisponíveis
+STATUS_NO_MENU = ['ativo', 'esgotado']
+TEMPO_SNAPSHOT = 60 * 60 * 24  # 24 horas (a chave muda a cada versão)
+IDADE_MAXIMA_LOCAL = 60 * 15  # 15 minutos
+IMAGEM_PADRAO = '/static/img/big.jpg'
+
+BADGES_STATUS = {'ativo': 'bg-success', 'inativo': 'bg-secondary', 'esgotado': 'bg-danger'}
+CATEGORIAS = dict(Produto.CATEGORIA_CHOICES)
+STATUS = dict(Produto.STATUS_CHOICES)
+
+
+def _chave(versao):
+    return f'catalogo_snapshot_v{versao}'
+
+
+def _imagem(nome):
+    if not nome:
+        return None
+    return {
+        'src': default_storage.url(nome),
+        'webp': imagens.srcset(nome, 'webp'),
+        'jpg': imagens.srcset(nome, 'jpg'),
+    }
+
+
+def _serializar(produto, posicao):
+    return {
+        'id': produto['id'],
+        'posicao': posicao,
+        'nome': produto['nome'],
+        'resumo': Truncator(produto['descricao_curta'] or produto['descricao']).words(15),
+        'categoria': produto['categoria'],
+        'status': produto['status'],
+        'preco': str(produto['preco']),
+        'preco_formatado': f"KZ {produto['preco']:.2f}",
+        # Só a disponibilidade: a quantidade muda a cada venda e não invalida o snapshot
+        'em_estoque': produto['estoque'] > 0 and produto['status'] == 'ativo',
+        'url': reverse('detalhes_produto', kwargs={'pk': produto['id']}),
+        'imagem': _imagem(produto['imagem']),
+    }
+
+
+def construir_snapshot(versao):
+    """Monta o snapshot da versão indicada (uma consulta)"""
+    por_categoria = {}
+    for posicao, produto in enumerate(Produto.objects.filter(status__in=STATUS_NO_MENU).order_by('ordem', 'nome').values(
+        'id', 'nome', 'descricao', 'descricao_curta', 'categoria', 'status', 'preco', 'estoque', 'imagem'
+    )):
+        por_categoria.setdefault(produto['categoria'], []).append(_serializar(produto, posicao))
+
+    dados = {
+        'versao': versao,
+        'categorias': [
+            {'categoria': categoria, 'nome': nome, 'produtos': por_categoria[categoria]}
+            for categoria, nome in Produto.CATEGORIA_CHOICES
+            if categoria in por_categoria
+        ],
+    }
+    corpo = json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode()
+    return Snapshot(versao, corpo)
+
+
+class Snapshot:
+    """Documento do catálogo (bytes prontos a servir) e o seu ETag forte"""
+
+    def __init__(self, versao, corpo, etag=None):
+        self.versao = versao
+        self.corpo = corpo
+        self.etag = etag or hashlib.sha256(corpo).hexdigest()[:32]
+        self.criado_em = time.monotonic()
+        self._produtos = None
+
+    @property
+    def dados(self):
+        return json.loads(self.corpo)
+
+    def produtos(self, categoria=None):
+        """Produtos do menu na ordem de exibição, como ProdutoCatalogo"""
+        if self._produtos is None:
+            # O JSON agrupa por categoria; o menu segue a ordem global (ordem, nome)
+            self._produtos = sorted(
+                (ProdutoCatalogo(produto) for grupo in self.dados['categorias'] for produto in grupo['produtos']),
+                key=lambda produto: produto.posicao,
+            )
+        if categoria:
+            return [produto for produto in self._produtos if produto.categoria == categoria]
+        return self._produtos
+
+    def para_cache(self):
+        return {'versao': self.versao, 'corpo': self.corpo, 'etag': self.etag}
+
+
+class ImagemCatalogo:
+    """Imagem do snapshot com a interface de FieldFile que os templates usam"""
+
+    def __init__(self, dados):
+        self.url = dados['src']
+        self.name = self.url
+        self.srcsets = {'webp': dados['webp'], 'jpg': dados['jpg']}
+
+    def __bool__(self):
+        return True
+
+
+class ProdutoCatalogo:
+    """Produto do snapshot com os atributos/métodos de Produto usados nos templates"""
+
+    def __init__(self, dados):
+        self.__dict__.update(dados)
+        self.pk = self.id
+        # O template cai de descricao_curta para descricao; o resumo já faz isso
+        self.descricao_curta = self.resumo
+        self.descricao = ''
+        self.imagem = ImagemCatalogo(dados['imagem']) if dados['imagem'] else None
+
+    def get_categoria_display(self):
+        return CATEGORIAS.get(self.categoria, self.categoria)
+
+    def get_status_display(self):
+        return STATUS.get(self.status, self.status)
+
+    def get_badge_status(self):
+        return BADGES_STATUS.get(self.status, 'bg-secondary')
+
+    def get_preco_formatado(self):
+        return self.preco_formatado
+
+    def get_imagem_url(self):
+        return self.imagem.url if self.imagem else IMAGEM_PADRAO
+
+    def get_absolute_url(self):
+        return self.url
+
+
+_local = None
+_lock = threading.Lock()
+
+
+def _valido(snapshot, versao):
+    return (
+        snapshot is not None and snapshot.versao == versao
+        and time.monotonic() - snapshot.criado_em < IDADE_MAXIMA_LOCAL
+    )
+
+
+def obter_snapshot():
+    """Snapshot da versão atual: memória do processo, depois cache, depois banco"""
+    global _local
+    versao = versao_tag(TAG_CATALOGO)
+    snapshot = _local
+    if _valido(snapshot, versao):
+        return snapshot
+
+    with _lock:
+        if _valido(_local, versao):
+            return _local
+        guardado = cache.get(_chave(versao))
+        if guardado is None:
+            snapshot = construir_snapshot(versao)
+            cache.set(_chave(versao), snapshot.para_cache(), TEMPO_SNAPSHOT)
+        else:
+            snapshot = Snapshot(**guardado)
+        _local = snapshot
+        return snapshot
+
+
+def descartar_snapshot():
+    """Esquece o snapshot do processo (testes)"""
+    global _local
+    _local = None
@@ -0,0 +1,351 @@
+# menu/estoque.py
+"""
+Estoque dos produtos: reservas no checkout e devoluções no cancelamento.
+
+Produtos marcados com `estoque_tempo_real` (promoções com muita procura)
+têm o estoque espelhado numa chave do Redis (`estoque:<id>`). A reserva
+de um pedido é um script Lua atómico (tudo ou nada) que verifica e
+decrementa todas as chaves, sem tocar na linha do produto no banco; a
+tarefa `reconciliar_estoque_produtos` grava periodicamente esses valores
+em `Produto.estoque`/`status` num único bulk_update.
+
+Os restantes produtos, e todos quando o Redis não responde, usam o banco
+com bloqueio da linha (SELECT ... FOR UPDATE) e um UPDATE sem save(): o
+catálogo partilhado (snapshot, API) só é invalidado quando o produto passa
+de ativo a esgotado ou volta atrás, não a cada venda.
+
+A chave é semeada a partir do banco na primeira reserva; as alterações
+manuais do estoque (admin) são aplicadas como diferença depois do commit
+(`sincronizar_produto`). Se o Redis ficar inacessível sem perder os
+dados, as reservas feitas no banco entretanto não chegam às chaves:
+`manage.py reconciliar_estoque --ressemear` volta a copiá-las do banco.
+"""
+import logging
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from index.conexao_redis import obter_redis
+from index.invalidacao import agrupar_invalidacoes
+
+from .models import Produto
+
+logger = logging.getLogger(__name__)
+
+# Reserva de vários produtos: verifica todos antes de decrementar algum.
+# KEYS[i]: chave do produto i; ARGV[i]: quantidade.
+# Retorna {0, 0, 0} se reservou, {-1, i, 0} se a chave i não existe e
+# {1, i, disponível} se não há estoque para o produto i.
+SCRIPT_RESERVAR = """
+for i, chave in ipairs(KEYS) do
+    local atual = redis.call('GET', chave)
+    if not atual then
+        return {-1, i, 0}
+    end
+    if tonumber(atual) < tonumber(ARGV[i]) then
+        return {1, i, tonumber(atual)}
+    end
+end
+for i, chave in ipairs(KEYS) do
+    redis.call('DECRBY', chave, ARGV[i])
+end
+return {0, 0, 0}
+"""
+
+# Soma ARGV[i] às chaves que existem; retorna os índices das que não existem
+SCRIPT_AJUSTAR = """
+local ausentes = {}
+for i, chave in ipairs(KEYS) do
+    if redis.call('EXISTS', chave) == 1 then
+        redis.call('INCRBY', chave, ARGV[i])
+    else
+        table.insert(ausentes, i)
+    end
+end
+return ausentes
+"""
+
+
+class EstoqueInsuficiente(Exception):
+    def __init__(self, produto_id, disponivel):
+        self.produto_id = produto_id
+        self.disponivel = disponivel
+        super().__init__(f'Estoque insuficiente para o produto {produto_id} (disponível: {disponivel})')
+
+
+def chave(produto_id):
+    return f'estoque:{produto_id}'
+
+
+def _semear(cliente, estoques, substituir=False):
+    """Copia {produto_id: estoque} do banco para o Redis (sem substituir, por omissão)"""
+    pipe = cliente.pipeline(transaction=False)
+    for produto_id, estoque in estoques.items():
+        pipe.set(chave(produto_id), estoque, nx=not substituir)
+    pipe.execute()
+
+
+def _ids_tempo_real(produto_ids):
+    return set(Produto.objects.filter(
+        pk__in=produto_ids, estoque_tempo_real=True
+    ).values_list('pk', flat=True))
+
+
+def estoque_atual(produto):
+    """Estoque disponível agora: o do Redis para produtos em tempo real"""
+    if produto.estoque_tempo_real:
+        cliente = obter_redis()
+        if cliente is not None:
+            try:
+                valor = cliente.get(chave(produto.pk))
+                if valor is not None:
+                    return max(int(valor), 0)
+            except Exception as e:
+                logger.warning(f"Falha ao ler o estoque do produto {produto.pk}: {e}")
+    return produto.estoque
+
+
+def _reservar_redis(quantidades):
+    """
+    Reserva no Redis. Retorna o que reservou ({} se o Redis não estiver
+    disponível: o chamador usa então o banco).
+    """
+    cliente = obter_redis()
+    if cliente is None or not quantidades:
+        return {}
+
+    ids = sorted(quantidades)
+    chaves = [chave(produto_id) for produto_id in ids]
+    valores = [quantidades[produto_id] for produto_id in ids]
+    try:
+        reservar = cliente.register_script(SCRIPT_RESERVAR)
+        codigo, indice, disponivel = reservar(keys=chaves, args=valores)
+        if codigo == -1:
+            # Primeira reserva destes produtos: semeia a partir do banco e repete
+            _semear(cliente, dict(Produto.objects.filter(pk__in=ids).values_list('pk', 'estoque')))
+            codigo, indice, disponivel = reservar(keys=chaves, args=valores)
+    except Exception as e:
+        logger.warning(f"Falha ao reservar estoque no Redis, usando o banco: {e}")
+        return {}
+
+    if codigo == 1:
+        raise EstoqueInsuficiente(ids[indice - 1], disponivel)
+    if codigo == -1:
+        # Produto apagado entretanto: fica com o banco
+        return {}
+    return quantidades
+
+
+def _ajustar_redis(quantidades):
+    """Soma {produto_id: quantidade} às chaves existentes. Retorna os ids que ficaram de fora."""
+    cliente = obter_redis()
+    if cliente is None or not quantidades:
+        return set(quantidades)
+
+    ids = list(quantidades)
+    try:
+        ajustar = cliente.register_script(SCRIPT_AJUSTAR)
+        ausentes = ajustar(keys=[chave(produto_id) for produto_id in ids],
+                           args=[quantidades[produto_id] for produto_id in ids])
+    except Exception as e:
+        logger.warning(f"Falha ao ajustar estoque no Redis: {e}")
+        return set(ids)
+    return {ids[indice - 1] for indice in ausentes}
+
+
+def _novo_status(estoque, status):
+    if estoque == 0 and status == 'ativo':
+        return 'esgotado'
+    if estoque > 0 and status == 'esgotado':
+        return 'ativo'
+    return status
+
+
+def _em_estoque(estoque, status):
+    return estoque > 0 and status == 'ativo'
+
+
+def _limpar_cache(produto, estoque_anterior, status_anterior):
+    """Catálogo inteiro só se mudou a disponibilidade; senão, as chaves do produto"""
+    if (produto.status != status_anterior
+            or _em_estoque(produto.estoque, produto.status) != _em_estoque(estoque_anterior, status_anterior)):
+        produto.limpar_cache_produto()
+    else:
+        produto.limpar_cache_estoque()
+
+
+def _alterar_banco(quantidades, sinal):
+    """Soma (sinal=1) ou subtrai (sinal=-1) as quantidades com bloqueio das linhas"""
+    if not quantidades:
+        return
+    agora = timezone.now()
+    espelhar = {}
+    with transaction.atomic(), agrupar_invalidacoes():
+        # Ordem fixa de bloqueio: dois checkouts com os mesmos produtos não se bloqueiam mutuamente
+        produtos = Produto.objects.select_for_update().filter(pk__in=quantidades).order_by('pk').only(
+            'id', 'categoria', 'estoque', 'status', 'estoque_tempo_real'
+        )
+        for produto in produtos:
+            quantidade = quantidades[produto.pk]
+            if sinal < 0 and produto.estoque < quantidade:
+                raise EstoqueInsuficiente(produto.pk, produto.estoque)
+            estoque_anterior, status_anterior = produto.estoque, produto.status
+            produto.estoque += sinal * quantidade
+            produto.status = _novo_status(produto.estoque, produto.status)
+            # UPDATE direto: o save() dispararia reindexação, recomendações e a tag do catálogo
+            Produto.objects.filter(pk=produto.pk).update(
+                estoque=produto.estoque, status=produto.status, data_atualizacao=agora
+            )
+            _limpar_cache(produto, estoque_anterior, status_anterior)
+            if produto.estoque_tempo_real:
+                espelhar[produto.pk] = sinal * quantidade
+    if espelhar:
+        # Reservas feitas no banco (Redis em falha) também chegam às chaves que existirem
+        transaction.on_commit(lambda: _ajustar_redis(espelhar))
+
+
+@contextmanager
+def reservar_estoque(quantidades):
+    """
+    Abre a transação do pedido e reserva nela {produto_id: quantidade}, ou
+    levanta EstoqueInsuficiente. A transação é durável (não pode estar
+    dentro de outra): o que foi reservado no Redis é devolvido sempre que
+    ela não chega ao commit, seja o bloco a falhar ou o próprio COMMIT.
+    """
+    quantidades = {produto_id: quantidade for produto_id, quantidade in quantidades.items() if quantidade > 0}
+    no_redis = {}
+    try:
+        with transaction.atomic(durable=True):
+            tempo_real = _ids_tempo_real(quantidades)
+            no_redis = _reservar_redis({produto_id: quantidades[produto_id] for produto_id in tempo_real})
+            _alterar_banco({
+                produto_id: quantidade for produto_id, quantidade in quantidades.items()
+                if produto_id not in no_redis
+            }, -1)
+            yield
+    except BaseException:
+        _ajustar_redis(no_redis)
+        raise
+
+
+def devolver_estoque(quantidades):
+    """
+    Devolve {produto_id: quantidade} (pedido cancelado). Para os produtos em
+    tempo real o Redis só é alterado depois do commit; sem chave (ou sem
+    Redis), a devolução vai para o banco.
+    """
+    quantidades = {produto_id: quantidade for produto_id, quantidade in quantidades.items() if quantidade > 0}
+    tempo_real = _ids_tempo_real(quantidades) if obter_redis() is not None else set()
+
+    _alterar_banco({
+        produto_id: quantidade for produto_id, quantidade in quantidades.items()
+        if produto_id not in tempo_real
+    }, 1)
+
+    if tempo_real:
+        devolver = {produto_id: quantidades[produto_id] for produto_id in tempo_real}
+
+        def _apos_commit():
+            ausentes = _ajustar_redis(devolver)
+            _alterar_banco({produto_id: devolver[produto_id] for produto_id in ausentes}, 1)
+
+        transaction.on_commit(_apos_commit)
+
+
+def sincronizar_produto(produto, criado=False):
+    """
+    Leva ao Redis uma alteração manual do estoque (como diferença, para não
+    apagar as reservas ainda não reconciliadas) e liga/desliga o espelho
+    quando `estoque_tempo_real` muda. Chamado no post_save, ainda com os
+    valores originais do RastreamentoCamposMixin.
+    """
+    original = None if criado else produto.valor_original('estoque')
+    era_tempo_real = False if criado else produto.valor_original('estoque_tempo_real')
+
+    if produto.estoque_tempo_real and not era_tempo_real:
+        estoques = {produto.pk: produto.estoque}
+        transaction.on_commit(lambda: _substituir(estoques))
+    elif era_tempo_real and not produto.estoque_tempo_real:
+        diferenca = produto.estoque - (original or 0)
+        transaction.on_commit(lambda: _desligar(produto.pk, diferenca))
+    elif produto.estoque_tempo_real and original is not None and produto.estoque != original:
+        diferenca = {produto.pk: produto.estoque - original}
+        transaction.on_commit(lambda: _ajustar_redis(diferenca))
+
+
+def _substituir(estoques):
+    cliente = obter_redis()
+    if cliente is None:
+        return
+    try:
+        _semear(cliente, estoques, substituir=True)
+    except Exception as e:
+        logger.warning(f"Falha ao semear o estoque no Redis: {e}")
+
+
+def _desligar(produto_id, diferenca):
+    """Último valor do Redis (mais a alteração manual) de volta ao banco"""
+    cliente = obter_redis()
+    if cliente is None:
+        return
+    try:
+        valor = cliente.getdel(chave(produto_id))
+    except Exception as e:
+        logger.warning(f"Falha ao desligar o estoque em tempo real do produto {produto_id}: {e}")
+        return
+    produto = Produto.objects.filter(pk=produto_id).first()
+    if valor is not None and produto is not None:
+        produto.estoque = max(int(valor) + diferenca, 0)
+        produto.save(update_fields=['estoque', 'data_atualizacao'])
+
+
+def reconciliar_estoque():
+    """
+    Grava no banco, num bulk_update, o estoque (e o status esgotado/ativo)
+    dos produtos em tempo real. Retorna o número de produtos alterados.
+    """
+    cliente = obter_redis()
+    if cliente is None:
+        return 0
+    produtos = list(Produto.objects.filter(estoque_tempo_real=True).only('id', 'categoria', 'estoque', 'status', 'data_atualizacao'))
+    if not produtos:
+        return 0
+
+    valores = cliente.mget([chave(produto.pk) for produto in produtos])
+    alterados = []
+    ausentes = {}
+    for produto, valor in zip(produtos, valores):
+        if valor is None:
+            ausentes[produto.pk] = produto.estoque
+            continue
+        estoque = max(int(valor), 0)
+        status = _novo_status(estoque, produto.status)
+        if (estoque, status) != (produto.estoque, produto.status):
+            alterados.append((produto, produto.estoque, produto.status))
+            produto.estoque, produto.status = estoque, status
+
+    if ausentes:
+        _semear(cliente, ausentes)
+    if alterados:
+        # bulk_update não aplica o auto_now: a API usa data_atualizacao para sincronizar
+        agora = timezone.now()
+        for produto, _, _ in alterados:
+            produto.data_atualizacao = agora
+        with transaction.atomic(), agrupar_invalidacoes():
+            Produto.objects.bulk_update([produto for produto, _, _ in alterados], ['estoque', 'status', 'data_atualizacao'])
+            for produto, estoque_anterior, status_anterior in alterados:
+                _limpar_cache(produto, estoque_anterior, status_anterior)
+        logger.info(f"Estoque reconciliado: {len(alterados)} produtos")
+    return len(alterados)
+
+
+def ressemear_estoque():
+    """Copia para o Redis o estoque do banco de todos os produtos em tempo real"""
+    cliente = obter_redis()
+    if cliente is None:
+        return 0
+    estoques = dict(Produto.objects.filter(estoque_tempo_real=True).values_list('pk', 'estoque'))
+    if estoques:
+        _semear(cliente, estoques, substituir=True)
+    return len(estoques)
@@ -1,5 +1,5 @@
 from django import forms
-from django.core.cache import cache
+from index.invalidacao import invalidar
 from .models import Produto
 
 class ProdutoForm(forms.ModelForm):
@@ -75,16 +75,15 @@ class ProdutoForm(forms.ModelForm):
             ])
         
         # Remover None values e deletar caches
-        cache_keys_to_delete = [key for key in cache_keys_to_delete if key]
-        for key in cache_keys_to_delete:
-            cache.delete(key)
+        invalidar(*[key for key in cache_keys_to_delete if key])
 
 class ProdutoSearchForm(forms.Form):
     query = forms.CharField(
         required=False,
         widget=forms.TextInput(attrs={
             'class': 'form-control',
-            'placeholder': 'Pesquisar produtos...'
+            'placeholder': 'Pesquisar produtos...',
+            'autocomplete': 'off'
         })
     )
     
@@ -145,4 +144,16 @@ class ProdutoSearchForm(forms.Form):
         ordenar = self.cleaned_data.get('ordenar', '')
         
         cache_key = f"produtos_search_{query}_{categoria}_{preco_min}_{preco_max}_{ordenar}"
-        return cache_key.replace(' ', '_').lower()
\ No newline at end of file
+        return cache_key.replace(' ', '_').lower()
+
+class ImportarCatalogoForm(forms.Form):
+    arquivo = forms.FileField(
+        label='Arquivo CSV ou JSON',
+        help_text='Colunas: id, nome, descricao_curta, descricao, categoria, preco, estoque, status, ordem, imagem. '
+                  'Sem id, o produto é procurado pelo nome.'
+    )
+    simular = forms.BooleanField(
+        label='Só simular (mostra o que mudaria, sem gravar)',
+        required=False,
+        initial=True
+    )
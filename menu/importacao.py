@@ -0,0 +1,262 @@
+# menu/importacao.py
+"""
+Importação e exportação do catálogo em CSV/JSON.
+
+`importar_produtos` compara as linhas com os produtos existentes (pelo
+`id`, ou pelo nome quando a linha não traz id) e grava só a diferença
+numa transação: bulk_create para os novos, bulk_update só das colunas
+alteradas. Como as operações em lote não disparam sinais, o que os sinais
+de Produto fariam é feito aqui uma vez para o lote: índice de pesquisa,
+derivadas das imagens, espelho do estoque no Redis e uma única
+invalidação do cache (a tag do catálogo sobe uma vez).
+
+Usado pelo comando `importar_catalogo`/`exportar_catalogo` e pelo
+upload no admin de Produto.
+"""
+import csv
+import io
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from index.imagens import agendar_derivadas
+from index.invalidacao import agrupar_invalidacoes, invalidar
+
+from .busca import obter_backend
+from .estoque import sincronizar_produto
+from .models import TAG_CATALOGO, Produto
+from .recomendacoes import calcular_relacionados
+
+CAMPOS = ['id', 'nome', 'descricao_curta', 'descricao', 'categoria', 'preco', 'estoque', 'status', 'ordem', 'imagem']
+FORMATOS = ('csv', 'json')
+TAMANHO_LOTE = 500
+
+CATEGORIAS = {valor for valor, _ in Produto.CATEGORIA_CHOICES}
+STATUS = {valor for valor, _ in Produto.STATUS_CHOICES}
+
+
+class ErroImportacao(Exception):
+    """Linhas inválidas: nada é gravado"""
+
+    def __init__(self, erros):
+        self.erros = erros
+        super().__init__('; '.join(erros))
+
+
+def formato_do_arquivo(nome):
+    extensao = os.path.splitext(nome)[1].lower().lstrip('.')
+    if extensao not in FORMATOS:
+        raise ErroImportacao([f'Formato não suportado: "{extensao}" (use CSV ou JSON)'])
+    return extensao
+
+
+def ler_linhas(conteudo, formato):
+    """Lista de dicionários a partir de bytes/texto CSV ou JSON"""
+    if isinstance(conteudo, bytes):
+        conteudo = conteudo.decode('utf-8-sig')
+    if formato == 'json':
+        try:
+            dados = json.loads(conteudo)
+        except ValueError as e:
+            raise ErroImportacao([f'JSON inválido: {e}'])
+        linhas = dados.get('produtos') if isinstance(dados, dict) else dados
+        if not isinstance(linhas, list):
+            raise ErroImportacao(['O JSON deve ser uma lista de produtos (ou {"produtos": [...]})'])
+        return linhas
+    return list(csv.DictReader(io.StringIO(conteudo)))
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _limpar(linha, numero):
+    """Converte e valida uma linha. Retorna (dados, erros)."""
+    erros = []
+    dados = {}
+
+    id_ = _texto(linha.get('id'))
+    if id_:
+        try:
+            dados['id'] = int(id_)
+        except ValueError:
+            erros.append(f'Linha {numero}: id inválido "{id_}"')
+
+    dados['nome'] = _texto(linha.get('nome'))
+    if not dados['nome']:
+        erros.append(f'Linha {numero}: nome obrigatório')
+
+    for campo in ('descricao_curta', 'descricao', 'imagem'):
+        if campo in linha:
+            dados[campo] = _texto(linha[campo])
+
+    if 'categoria' in linha:
+        dados['categoria'] = _texto(linha['categoria'])
+        if dados['categoria'] not in CATEGORIAS:
+            erros.append(f'Linha {numero}: categoria inválida "{dados["categoria"]}"')
+
+    if 'status' in linha and _texto(linha['status']):
+        dados['status'] = _texto(linha['status'])
+        if dados['status'] not in STATUS:
+            erros.append(f'Linha {numero}: status inválido "{dados["status"]}"')
+
+    if 'preco' in linha:
+        try:
+            dados['preco'] = Decimal(_texto(linha['preco']).replace(',', '.')).quantize(Decimal('0.01'))
+            if dados['preco'] < Decimal('0.01'):
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            erros.append(f'Linha {numero}: preço inválido "{linha["preco"]}"')
+
+    for campo in ('estoque', 'ordem'):
+        if campo in linha and _texto(linha[campo]):
+            try:
+                dados[campo] = int(_texto(linha[campo]))
+                if dados[campo] < 0:
+                    raise ValueError
+            except ValueError:
+                erros.append(f'Linha {numero}: {campo} inválido "{linha[campo]}"')
+
+    return dados, erros
+
+
+def _anexar_imagem(nome_arquivo, pasta_imagens):
+    """Copia a imagem da pasta para o storage; retorna o nome gravado"""
+    caminho = os.path.join(pasta_imagens, os.path.basename(nome_arquivo))
+    with open(caminho, 'rb') as arquivo:
+        return default_storage.save(f'produtos/{os.path.basename(nome_arquivo)}', File(arquivo))
+
+
+def importar_produtos(linhas, pasta_imagens=None, simular=False):
+    """
+    Aplica as linhas ao catálogo. Retorna {'criados', 'atualizados',
+    'inalterados'}; com `simular`, só calcula a diferença.
+    """
+    limpas = []
+    erros = []
+    for numero, linha in enumerate(linhas, start=1):
+        dados, erros_linha = _limpar(linha, numero)
+        erros += erros_linha
+        limpas.append((numero, dados))
+
+    existentes = {produto.pk: produto for produto in Produto.objects.all()}
+    por_nome = {produto.nome: produto for produto in existentes.values()}
+
+    novos, alterados, campos_alterados = [], {}, set()
+    inalterados = 0
+    for numero, dados in limpas:
+        if 'id' in dados:
+            produto = existentes.get(dados['id'])
+            if produto is None:
+                erros.append(f'Linha {numero}: produto {dados["id"]} não existe')
+                continue
+        else:
+            produto = por_nome.get(dados['nome'])
+
+        if produto is None:
+            faltam = [campo for campo in ('categoria', 'preco') if campo not in dados]
+            if faltam:
+                erros.append(f'Linha {numero}: produto novo sem {", ".join(faltam)}')
+                continue
+            novos.append((numero, dados))
+            continue
+
+        mudancas = {
+            campo: valor for campo, valor in dados.items()
+            if campo not in ('id', 'imagem') and getattr(produto, campo) != valor
+        }
+        imagem = dados.get('imagem')
+        atual = produto.imagem.name or ''
+        if imagem and imagem != atual and os.path.basename(imagem) != os.path.basename(atual):
+            mudancas['imagem'] = imagem
+
+        if mudancas:
+            alterados[produto.pk] = (numero, produto, mudancas)
+            campos_alterados.update(mudancas)
+        else:
+            inalterados += 1
+
+    # Imagens novas: da pasta indicada, ou um nome que já existe no storage
+    for numero, dados in novos + [(numero, mudancas) for numero, _, mudancas in alterados.values()]:
+        imagem = dados.get('imagem')
+        if not imagem:
+            continue
+        if pasta_imagens:
+            if not os.path.isfile(os.path.join(pasta_imagens, os.path.basename(imagem))):
+                erros.append(f'Linha {numero}: imagem "{imagem}" não encontrada em {pasta_imagens}')
+        elif not default_storage.exists(imagem):
+            erros.append(f'Linha {numero}: imagem "{imagem}" não existe (indique a pasta das imagens)')
+
+    if erros:
+        raise ErroImportacao(erros)
+
+    resultado = {'criados': len(novos), 'atualizados': len(alterados), 'inalterados': inalterados}
+    if simular or not (novos or alterados):
+        return resultado
+
+    with transaction.atomic(), agrupar_invalidacoes():
+        criados = []
+        for _, dados in novos:
+            if dados.get('imagem') and pasta_imagens:
+                dados['imagem'] = _anexar_imagem(dados['imagem'], pasta_imagens)
+            criados.append(Produto(**dados))
+        criados = Produto.objects.bulk_create(criados, batch_size=TAMANHO_LOTE)
+
+        # bulk_update não aplica o auto_now: a API usa data_atualizacao para sincronizar
+        agora = timezone.now()
+        atualizados = []
+        for _, produto, mudancas in alterados.values():
+            if mudancas.get('imagem') and pasta_imagens:
+                mudancas['imagem'] = _anexar_imagem(mudancas['imagem'], pasta_imagens)
+            for campo, valor in mudancas.items():
+                setattr(produto, campo, valor)
+            produto.data_atualizacao = agora
+            atualizados.append(produto)
+        if atualizados:
+            Produto.objects.bulk_update(
+                atualizados, sorted(campos_alterados | {'data_atualizacao'}), batch_size=TAMANHO_LOTE
+            )
+
+        # O que os sinais de post_save fariam, uma vez para o lote
+        obter_backend().indexar(criados + atualizados)
+        for produto in criados + atualizados:
+            criado = produto.pk not in alterados
+            sincronizar_produto(produto, criado)
+            if criado or 'imagem' in alterados[produto.pk][2]:
+                agendar_derivadas(produto.imagem, tags=[TAG_CATALOGO])
+            if not criado and 'categoria' in alterados[produto.pk][2]:
+                invalidar(f'produtos_categoria_{produto.valor_original("categoria")}')
+            produto.limpar_cache_produto()
+
+        # Os sinais não correm no bulk: relacionados das categorias afetadas
+        categorias = {produto.categoria for produto in criados}
+        for _, produto, mudancas in alterados.values():
+            if mudancas.keys() & {'categoria', 'ordem', 'status'}:
+                categorias |= {produto.categoria, produto.valor_original('categoria')}
+        if categorias:
+            transaction.on_commit(lambda: calcular_relacionados(categorias))
+
+    return resultado
+
+
+def exportar_produtos(formato, saida=None):
+    """Escreve o catálogo inteiro (na ordem do menu) em CSV/JSON; retorna o texto"""
+    saida = saida or io.StringIO()
+    linhas = []
+    for produto in Produto.objects.order_by('ordem', 'nome').values(*CAMPOS):
+        produto['preco'] = str(produto['preco'])
+        produto['imagem'] = produto['imagem'] or ''
+        linhas.append(produto)
+
+    if formato == 'json':
+        json.dump({'produtos': linhas}, saida, ensure_ascii=False, indent=2)
+    else:
+        escritor = csv.DictWriter(saida, fieldnames=CAMPOS)
+        escritor.writeheader()
+        escritor.writerows(linhas)
+    return saida.getvalue() if isinstance(saida, io.StringIO) else None
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from menu.recomendacoes import METODOS, VIZINHOS_POR_PRODUTO, calcular_relacionados, calcular_vizinhos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os produtos frequentemente comprados juntos (requer NumPy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--metodo', choices=METODOS, default='cosseno',
+                            help='Normalização das co-ocorrências')
+        parser.add_argument('--k', type=int, default=VIZINHOS_POR_PRODUTO,
+                            help='Vizinhos guardados por produto')
+        parser.add_argument('--so-relacionados', action='store_true',
+                            help='Só reordena os produtos relacionados (sem NumPy)')
+
+    def handle(self, *args, **options):
+        if options['so_relacionados']:
+            linhas = calcular_relacionados()
+            self.stdout.write(self.style.SUCCESS(f'{linhas} produtos relacionados gravados'))
+            return
+        try:
+            resultado = calcular_vizinhos(options['metodo'], options['k'])
+        except ImportError as e:
+            raise CommandError(f'NumPy não está instalado: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['vizinhos']} vizinhos para {resultado['produtos']} produtos "
+            f"({resultado['cestas']} pedidos)"
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from menu.importacao import FORMATOS, exportar_produtos
+
+
+class Command(BaseCommand):
+    help = 'Exporta o catálogo inteiro para CSV/JSON (formato aceite por importar_catalogo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('--saida', metavar='ARQUIVO', help='Por omissão, a saída padrão')
+
+    def handle(self, *args, **options):
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8', newline='') as saida:
+                exportar_produtos(options['formato'], saida)
+            self.stdout.write(self.style.SUCCESS(f"Catálogo exportado para {options['saida']}"))
+        else:
+            self.stdout.write(exportar_produtos(options['formato']), ending='')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from menu.importacao import FORMATOS, ErroImportacao, formato_do_arquivo, importar_produtos, ler_linhas
+
+
+class Command(BaseCommand):
+    help = 'Importa produtos de um CSV/JSON (cria os novos e atualiza só o que mudou, numa transação)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do CSV ou JSON')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por omissão, pela extensão do arquivo')
+        parser.add_argument('--imagens', metavar='PASTA', help='Pasta com as imagens referidas na coluna "imagem"')
+        parser.add_argument('--simular', action='store_true', help='Mostra a diferença sem gravar')
+
+    def handle(self, *args, **options):
+        try:
+            formato = options['formato'] or formato_do_arquivo(options['arquivo'])
+            with open(options['arquivo'], 'rb') as arquivo:
+                linhas = ler_linhas(arquivo.read(), formato)
+            resultado = importar_produtos(linhas, options['imagens'], simular=options['simular'])
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler o arquivo: {e}')
+        except ErroImportacao as e:
+            raise CommandError('Nada foi importado:\n' + '\n'.join(e.erros))
+
+        prefixo = 'Simulação: ' if options['simular'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixo}{resultado['criados']} criados, {resultado['atualizados']} atualizados, "
+            f"{resultado['inalterados']} inalterados"
+        ))
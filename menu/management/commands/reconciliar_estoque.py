@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from menu.estoque import reconciliar_estoque, ressemear_estoque
+
+
+class Command(BaseCommand):
+    help = 'Grava no banco o estoque dos produtos em tempo real (Redis)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ressemear', action='store_true',
+                            help='Copia antes o estoque do banco para o Redis (depois de uma falha do Redis)')
+
+    def handle(self, *args, **options):
+        if options['ressemear']:
+            total = ressemear_estoque()
+            self.stdout.write(f'{total} produtos copiados para o Redis')
+        total = reconciliar_estoque()
+        self.stdout.write(self.style.SUCCESS(f'Estoque reconciliado: {total} produtos alterados'))
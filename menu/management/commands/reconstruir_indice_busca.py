@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from menu.busca import obter_backend
+from menu.models import Produto
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de texto completo da pesquisa de produtos'
+
+    def handle(self, *args, **options):
+        backend = obter_backend()
+        produtos = Produto.objects.only('nome', 'descricao_curta', 'descricao')
+        backend.reconstruir(produtos)
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruído ({type(backend).__name__}): {produtos.count()} produtos'
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0007_alter_favorito_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['status', 'ordem', 'nome'], name='menu_produto_status_ordem_idx'),
+        ),
+    ]
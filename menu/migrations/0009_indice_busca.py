@@ -0,0 +1,54 @@
+# Índice de texto completo dos produtos (ver menu/busca.py)
+
+from django.db import migrations
+
+SQL_POSTGRES = [
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    "DO $$ BEGIN "
+    "CREATE TEXT SEARCH CONFIGURATION pt_unaccent (COPY = pg_catalog.portuguese); "
+    "EXCEPTION WHEN unique_violation THEN NULL; END $$",
+    'ALTER TEXT SEARCH CONFIGURATION pt_unaccent '
+    'ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem',
+    'ALTER TABLE menu_produto ADD COLUMN IF NOT EXISTS busca_vetor tsvector',
+    'CREATE INDEX IF NOT EXISTS menu_produto_busca_gin ON menu_produto USING gin (busca_vetor)',
+]
+
+SQL_SQLITE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS menu_produto_fts USING fts5("
+    "nome, descricao_curta, descricao, tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+
+def criar_indice(apps, schema_editor):
+    from menu.busca import BuscaPostgres, BuscaSQLite
+
+    vendor = schema_editor.connection.vendor
+    Produto = apps.get_model('menu', 'Produto')
+    if vendor == 'postgresql':
+        for sql in SQL_POSTGRES:
+            schema_editor.execute(sql)
+        BuscaPostgres().reconstruir()
+    elif vendor == 'sqlite':
+        schema_editor.execute(SQL_SQLITE)
+        BuscaSQLite().reconstruir(Produto.objects.only('nome', 'descricao_curta', 'descricao'))
+
+
+def remover_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS menu_produto_busca_gin')
+        schema_editor.execute('ALTER TABLE menu_produto DROP COLUMN IF EXISTS busca_vetor')
+        schema_editor.execute('DROP TEXT SEARCH CONFIGURATION IF EXISTS pt_unaccent')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS menu_produto_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0008_produto_menu_produto_status_ordem_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
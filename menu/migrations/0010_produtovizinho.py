@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0009_indice_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProdutoVizinho',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField(verbose_name='Pontuação')),
+                ('posicao', models.PositiveSmallIntegerField(verbose_name='Posição')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vizinhos', to='menu.produto')),
+                ('vizinho', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='menu.produto')),
+            ],
+            options={
+                'verbose_name': 'Produto Comprado Junto',
+                'verbose_name_plural': 'Produtos Comprados Juntos',
+                'ordering': ['produto', 'posicao'],
+                'indexes': [models.Index(fields=['produto', 'posicao'], name='menu_vizinho_prod_pos_idx')],
+                'constraints': [models.UniqueConstraint(fields=('produto', 'vizinho'), name='menu_vizinho_unico')],
+            },
+        ),
+    ]
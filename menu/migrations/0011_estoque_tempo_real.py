@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0010_produtovizinho'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='estoque_tempo_real',
+            field=models.BooleanField(default=False, help_text='Controla o estoque no Redis (promoções com muita procura); o banco é atualizado a cada minuto', verbose_name='Estoque em Tempo Real'),
+        ),
+    ]
@@ -1,13 +1,19 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.core.cache import cache
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from index.imagens import agendar_derivadas
+from index.invalidacao import agrupar_invalidacoes, invalidar, invalidar_tags
+from index.rastreamento import RastreamentoCamposMixin
 
-class Produto(models.Model):
+# Tag de versão de tudo o que deriva do catálogo (snapshots, índices, API)
+TAG_CATALOGO = 'catalogo'
+
+class Produto(RastreamentoCamposMixin, models.Model):
     CATEGORIA_CHOICES = [
         ('hamburguer', 'Hambúrguer'),
         ('Lanches', 'Lanches'),
@@ -68,6 +74,12 @@ class Produto(models.Model):
         verbose_name='Quantidade em Estoque'
     )
     
+    estoque_tempo_real = models.BooleanField(
+        default=False,
+        verbose_name='Estoque em Tempo Real',
+        help_text='Controla o estoque no Redis (promoções com muita procura); o banco é atualizado a cada minuto'
+    )
+    
     status = models.CharField(
         max_length=10,
         choices=STATUS_CHOICES,
@@ -89,6 +101,12 @@ class Produto(models.Model):
         verbose_name = 'Produto'
         verbose_name_plural = 'Produtos'
         ordering = ['ordem', 'nome']
+        indexes = [
+            models.Index(fields=['status', 'ordem', 'nome'], name='menu_produto_status_ordem_idx'),
+            # Paginação por cursor e sincronização incremental da API
+            models.Index(fields=['ordem', 'id'], name='menu_produto_ordem_id_idx'),
+            models.Index(fields=['data_atualizacao'], name='menu_produto_atualizacao_idx'),
+        ]
     
     @classmethod
     def obter_produtos_ativos(cls):
@@ -134,19 +152,9 @@ class Produto(models.Model):
     
     @classmethod
     def obter_produtos_populares(cls, limite=8):
-        """Obtém produtos populares com cache"""
-        cache_key = f'produtos_populares_{limite}'
-        produtos = cache.get(cache_key)
-        
-        if produtos is None:
-            # Esta é uma implementação básica - você pode ajustar a lógica de popularidade
-            produtos = list(cls.objects.filter(
-                status='ativo',
-                estoque__gt=0
-            ).order_by('ordem', 'nome')[:limite])
-            cache.set(cache_key, produtos, 3600)  # Cache por 1 hora
-        
-        return produtos
+        """Obtém os produtos mais vendidos recentemente (ver carinho/popularidade.py)"""
+        from carinho.popularidade import obter_produtos_populares
+        return obter_produtos_populares(limite)
     
     @classmethod
     def obter_todas_categorias_com_produtos(cls):
@@ -213,20 +221,10 @@ class Produto(models.Model):
         return produto
     
     @classmethod
-    def buscar_produtos(cls, termo):
-        """Busca produtos por termo com cache"""
-        cache_key = f'busca_produtos_{termo.lower()}'
-        produtos = cache.get(cache_key)
-        
-        if produtos is None:
-            produtos = list(cls.objects.filter(
-                models.Q(nome__icontains=termo) |
-                models.Q(descricao__icontains=termo) |
-                models.Q(descricao_curta__icontains=termo)
-            ).filter(status='ativo').order_by('ordem', 'nome')[:50])
-            cache.set(cache_key, produtos, 1800)  # Cache por 30 minutos
-        
-        return produtos
+    def buscar_produtos(cls, termo, limite=50):
+        """Busca produtos ativos por termo no índice de texto, por relevância"""
+        from .busca import buscar_produtos
+        return list(buscar_produtos(termo, cls.objects.filter(status='ativo'))[:limite])
 
     def get_imagem_url(self):
         """Retorna a URL da imagem ou uma imagem padrão com cache"""
@@ -265,6 +263,11 @@ class Produto(models.Model):
     
     def em_estoque(self):
         """Cache para verificação de estoque"""
+        if self.estoque_tempo_real:
+            # Lido do Redis a cada vez: o cache de 5 minutos mostraria estoque esgotado como disponível
+            from .estoque import estoque_atual
+            return self.status != 'inativo' and estoque_atual(self) > 0
+        
         cache_key = f'produto_{self.id}_em_estoque'
         em_estoque = cache.get(cache_key)
         
@@ -330,29 +333,35 @@ class Produto(models.Model):
             'estatisticas_produtos',
             'categorias_com_produtos',
             f'produtos_categoria_{self.categoria}',
+            'produtos_populares_6',
             'produtos_populares_8',
             'produtos_populares_12',
         ]
-        cache.delete_many(cache_keys)
+        invalidar(*cache_keys)
         
-        # Limpa caches de busca que podem conter este produto
-        # Em produção, você pode querer ser mais específico aqui
+        # Caches derivados do catálogo inteiro (buscas, snapshots) usam a tag
+        invalidar_tags(TAG_CATALOGO)
+    
+    def limpar_cache_estoque(self):
+        """Só as chaves deste produto que guardam a quantidade em estoque"""
+        invalidar(
+            f'produto_id_{self.id}',
+            f'produto_{self.id}_em_estoque',
+            f'produto_{self.id}_info_completa',
+            'produtos_em_estoque',
+        )
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         """Sobrescreve save para limpar cache"""
-        # Limpa cache antes de salvar se for uma atualização
-        if self.pk:
-            try:
-                produto_antigo = Produto.objects.get(pk=self.pk)
-                # Se categoria mudou, limpa caches específicos
-                if produto_antigo.categoria != self.categoria:
-                    cache.delete(f'produtos_categoria_{produto_antigo.categoria}')
-            except Produto.DoesNotExist:
-                pass
+        # Se categoria mudou, limpa caches específicos
+        if self.pk and 'categoria' in self.changed_fields:
+            invalidar(f'produtos_categoria_{self.valor_original("categoria")}')
         
         super().save(*args, **kwargs)
         self.limpar_cache_produto()
     
+    @agrupar_invalidacoes()
     def delete(self, *args, **kwargs):
         """Limpa cache antes de deletar"""
         self.limpar_cache_produto()
@@ -379,82 +388,151 @@ class Favorito(models.Model):
         return favoritos
     
     @classmethod
-    def obter_total_favoritos_usuario(cls, usuario):
-        """Obtém total de favoritos do usuário com cache"""
-        cache_key = f'total_favoritos_usuario_{usuario.id}'
-        total = cache.get(cache_key)
+    def ids_favoritos(cls, usuario):
+        """Ids dos produtos favoritos do usuário: um frozenset numa única chave de cache"""
+        cache_key = f'favoritos_ids_{usuario.id}'
+        ids = cache.get(cache_key)
         
-        if total is None:
-            total = cls.objects.filter(usuario=usuario).count()
-            cache.set(cache_key, total, 900)  # Cache por 15 minutos
+        if ids is None:
+            ids = frozenset(cls.objects.filter(usuario=usuario).values_list('produto_id', flat=True))
+            cache.set(cache_key, ids, 60 * 60 * 24)  # 24 horas (invalidado ao adicionar/remover)
         
-        return total
+        return ids
+    
+    @classmethod
+    def obter_total_favoritos_usuario(cls, usuario):
+        """Obtém total de favoritos do usuário com cache"""
+        return len(cls.ids_favoritos(usuario))
     
     @classmethod
     def usuario_tem_favorito(cls, usuario, produto):
         """Verifica se usuário tem produto como favorito com cache"""
-        cache_key = f'usuario_{usuario.id}_favorito_produto_{produto.id}'
-        tem_favorito = cache.get(cache_key)
-        
-        if tem_favorito is None:
-            tem_favorito = cls.objects.filter(usuario=usuario, produto=produto).exists()
-            cache.set(cache_key, tem_favorito, 1800)  # Cache por 30 minutos
-        
-        return tem_favorito
+        return produto.id in cls.ids_favoritos(usuario)
     
     @property
     def produto_em_estoque(self):
-        """Cache para verificação se produto favorito está em estoque"""
-        cache_key = f'favorito_{self.id}_produto_em_estoque'
-        em_estoque = cache.get(cache_key)
-        
-        if em_estoque is None:
-            em_estoque = self.produto.em_estoque()
-            cache.set(cache_key, em_estoque, 300)  # Cache por 5 minutos
-        
-        return em_estoque
+        """Verificação se produto favorito está em estoque (cache do produto)"""
+        return self.produto.em_estoque()
     
     def limpar_cache_favorito(self):
         """Limpa cache relacionado a este favorito"""
         cache_keys = [
-            f'favoritos_usuario_{self.usuario.id}',
-            f'total_favoritos_usuario_{self.usuario.id}',
-            f'usuario_{self.usuario.id}_favorito_produto_{self.produto.id}',
-            f'favorito_{self.id}_produto_em_estoque',
+            f'favoritos_usuario_{self.usuario_id}',
+            f'favoritos_ids_{self.usuario_id}',
         ]
-        cache.delete_many(cache_keys)
+        invalidar(*cache_keys)
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         """Sobrescreve save para limpar cache"""
         super().save(*args, **kwargs)
+        # Favoritar não altera o produto: o catálogo (tag) fica como está
         self.limpar_cache_favorito()
-        # Também limpa cache do produto relacionado
-        self.produto.limpar_cache_produto()
     
+    @agrupar_invalidacoes()
     def delete(self, *args, **kwargs):
         """Limpa cache antes de deletar"""
-        usuario_id = self.usuario.id
-        produto_id = self.produto.id
+        usuario_id = self.usuario_id
         
         super().delete(*args, **kwargs)
         
         # Limpa cache após deletar
-        cache_keys = [
+        invalidar(
             f'favoritos_usuario_{usuario_id}',
-            f'total_favoritos_usuario_{usuario_id}',
-            f'usuario_{usuario_id}_favorito_produto_{produto_id}',
-        ]
-        cache.delete_many(cache_keys)
+            f'favoritos_ids_{usuario_id}',
+        )
     
     def __str__(self):
         return f"{self.usuario.username} - {self.produto.nome}"
 
+class ProdutoVizinho(models.Model):
+    """Produtos comprados juntos, pré-calculados (ver menu/recomendacoes.py)"""
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='vizinhos')
+    vizinho = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='+')
+    pontuacao = models.FloatField('Pontuação')
+    posicao = models.PositiveSmallIntegerField('Posição')
+
+    class Meta:
+        verbose_name = 'Produto Comprado Junto'
+        verbose_name_plural = 'Produtos Comprados Juntos'
+        ordering = ['produto', 'posicao']
+        constraints = [
+            models.UniqueConstraint(fields=['produto', 'vizinho'], name='menu_vizinho_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['produto', 'posicao'], name='menu_vizinho_prod_pos_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produto_id} -> {self.vizinho_id} ({self.pontuacao:.3f})"
+
+class ProdutoRelacionado(models.Model):
+    """Produtos relacionados (mesma categoria), pré-ordenados (ver menu/recomendacoes.py)"""
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='relacionados')
+    relacionado = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='relacionado_em')
+    posicao = models.PositiveSmallIntegerField('Posição')
+
+    class Meta:
+        verbose_name = 'Produto Relacionado'
+        verbose_name_plural = 'Produtos Relacionados'
+        ordering = ['produto', 'posicao']
+        constraints = [
+            models.UniqueConstraint(fields=['produto', 'relacionado'], name='menu_relacionado_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['produto', 'posicao'], name='menu_relacionado_prod_pos_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produto_id} -> {self.relacionado_id} ({self.posicao})"
+
 # Signal handlers para limpeza automática de cache
 @receiver([post_save, post_delete], sender=Produto)
 def limpar_cache_produto_signals(sender, instance, **kwargs):
     """Limpa caches globais quando produtos são modificados"""
     instance.limpar_cache_produto()
 
+@receiver(post_save, sender=Produto)
+def espelhar_estoque_redis(sender, instance, created, raw=False, **kwargs):
+    """Leva ao Redis as alterações do estoque dos produtos em tempo real"""
+    if not raw:
+        from .estoque import sincronizar_produto
+        sincronizar_produto(instance, created)
+
+@receiver(post_save, sender=Produto)
+def indexar_produto_busca(sender, instance, raw=False, **kwargs):
+    """Mantém o índice de texto completo em dia com o produto"""
+    if not raw:
+        from .busca import obter_backend
+        obter_backend().indexar([instance])
+
+@receiver(post_save, sender=Produto)
+def gerar_derivadas_produto(sender, instance, raw=False, **kwargs):
+    """Versões redimensionadas da imagem do produto, geradas no worker"""
+    if not raw:
+        agendar_derivadas(instance.imagem, tags=[TAG_CATALOGO])
+
+@receiver(post_delete, sender=Produto)
+def remover_produto_busca(sender, instance, **kwargs):
+    from .busca import obter_backend
+    obter_backend().remover([instance.pk])
+
+@receiver([post_save, post_delete], sender=Produto)
+def recalcular_relacionados_produto(sender, instance, created=False, raw=False, **kwargs):
+    """Reordena os relacionados das categorias afetadas (depois do commit)"""
+    if raw:
+        return
+    categorias = {instance.categoria}
+    if kwargs['signal'] is post_save and not created:
+        alterados = instance.changed_fields
+        # esgotado <-> ativo não muda a ordem: a disponibilidade é filtrada na leitura
+        mudou_status = 'status' in alterados and 'inativo' in (instance.status, instance.valor_original('status'))
+        if not (alterados & {'categoria', 'ordem'} or mudou_status):
+            return
+        categorias.add(instance.valor_original('categoria'))
+    from .recomendacoes import calcular_relacionados
+    transaction.on_commit(lambda: calcular_relacionados(categorias))
+
 @receiver([post_save, post_delete], sender=Favorito)
 def limpar_cache_favorito_signals(sender, instance, **kwargs):
     """Limpa caches globais quando favoritos são modificados"""
@@ -467,24 +545,9 @@ def obter_produtos_recomendados(usuario, limite=6):
     produtos = cache.get(cache_key)
     
     if produtos is None:
-        # Lógica básica de recomendação - pode ser melhorada
-        # Por enquanto, retorna produtos da mesma categoria dos favoritos
-        categorias_favoritas = Favorito.objects.filter(
-            usuario=usuario
-        ).values_list('produto__categoria', flat=True).distinct()
-        
-        if categorias_favoritas:
-            produtos = list(Produto.objects.filter(
-                categoria__in=categorias_favoritas,
-                status='ativo',
-                estoque__gt=0
-            ).exclude(
-                favorito__usuario=usuario  # Exclui já favoritados
-            ).order_by('?')[:limite])  # Ordem aleatória
-        else:
-            # Se não tem favoritos, retorna produtos populares
-            produtos = Produto.obter_produtos_populares(limite)
-        
+        # Vizinhos por co-compra dos itens recentes e favoritos (ver recomendacoes.py)
+        from .recomendacoes import recomendar_para_usuario
+        produtos = recomendar_para_usuario(usuario, limite)
         cache.set(cache_key, produtos, 3600)  # Cache por 1 hora
     
     return produtos
@@ -0,0 +1,289 @@
+# menu/recomendacoes.py
+"""
+Recomendações item-a-item por co-compra.
+
+Um job offline (`calcular_vizinhos`, noturno no Celery ou pelo comando
+`calcular_recomendacoes`) lê os itens dos pedidos entregues (incluindo o
+arquivo), monta a matriz produto×produto de co-ocorrência com NumPy,
+normaliza-a (cosseno ou lift) e grava os K melhores vizinhos de cada
+produto em ProdutoVizinho.
+
+Em tempo de pedido só há leituras indexadas dessa tabela:
+
+- `comprados_juntos(produto)`: "frequentemente comprados juntos" na
+  página do produto;
+- `recomendar_para_usuario(usuario)`: soma as pontuações dos vizinhos
+  dos itens recentes e favoritos do usuário.
+
+Os produtos relacionados da página de detalhe (mesma categoria) também
+ficam pré-ordenados numa tabela, ProdutoRelacionado: primeiro os mais
+comprados juntos, depois pela ordem do menu. `calcular_relacionados` é
+chamado depois do commit quando um produto entra, sai ou muda de
+categoria/ordem (só para essas categorias) e no fim do job noturno; as
+reconstruções são serializadas por um bloqueio (pg_advisory_xact_lock; no
+SQLite a própria base serializa as escritas), para que duas não apaguem e
+regravem as mesmas linhas ao mesmo tempo. A página lê-os com
+`produtos_relacionados`, uma leitura indexada.
+
+O NumPy só é importado pelo job, nunca pelos pedidos web.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from index.invalidacao import invalidar_tags, versao_tag
+
+from .models import Favorito, Produto, ProdutoRelacionado, ProdutoVizinho
+
+logger = logging.getLogger(__name__)
+
+TAG_RECOMENDACOES = 'recomendacoes'
+TAG_RELACIONADOS = 'relacionados'
+VIZINHOS_POR_PRODUTO = 10
+# Guardados a mais: os indisponíveis são filtrados na leitura
+RELACIONADOS_POR_PRODUTO = 8
+MIN_COOCORRENCIAS = 2
+TAMANHO_BLOCO = 5000  # cestas por multiplicação de matrizes
+DIAS_HISTORICO_USUARIO = 90
+METODOS = ('cosseno', 'lift')
+# Chave do pg_advisory_xact_lock que serializa as reconstruções dos relacionados
+BLOQUEIO_RELACIONADOS = 48001
+
+
+def _cestas():
+    """Conjuntos de produtos de cada pedido entregue (ativo ou arquivado) com 2+ produtos"""
+    from carinho.models import ItemCarrinho, ItemPedidoArquivado
+
+    ativos = ItemCarrinho.objects.filter(
+        carrinho__pedido_entrega__estado='entregue'
+    ).order_by().values_list('carrinho_id', 'produto_id').distinct()
+    arquivados = ItemPedidoArquivado.objects.filter(
+        pedido__estado='entregue', produto__isnull=False
+    ).order_by().values_list('pedido_id', 'produto_id').distinct()
+
+    cestas = defaultdict(set)
+    for cesta_id, produto_id in ativos.iterator():
+        cestas[('c', cesta_id)].add(produto_id)
+    for cesta_id, produto_id in arquivados.iterator():
+        cestas[('a', cesta_id)].add(produto_id)
+    return [produtos for produtos in cestas.values() if len(produtos) > 1]
+
+
+def matriz_coocorrencia(cestas, indices):
+    """
+    C[i, j] = nº de cestas com os produtos i e j (diagonal = nº de cestas
+    com i), acumulada em blocos de cestas: C += Bᵀ·B.
+    """
+    import numpy as np
+
+    n = len(indices)
+    coocorrencia = np.zeros((n, n), dtype=np.float64)
+    for inicio in range(0, len(cestas), TAMANHO_BLOCO):
+        bloco = cestas[inicio:inicio + TAMANHO_BLOCO]
+        presenca = np.zeros((len(bloco), n), dtype=np.float32)
+        for linha, produtos in enumerate(bloco):
+            presenca[linha, [indices[produto_id] for produto_id in produtos]] = 1.0
+        coocorrencia += presenca.T @ presenca
+    return coocorrencia
+
+
+def normalizar(coocorrencia, total_cestas, metodo='cosseno'):
+    """Similaridade produto×produto a partir das co-ocorrências"""
+    import numpy as np
+
+    contagens = np.diag(coocorrencia).copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if metodo == 'lift':
+            similaridade = coocorrencia * total_cestas / np.outer(contagens, contagens)
+        else:
+            normas = np.sqrt(contagens)
+            similaridade = coocorrencia / np.outer(normas, normas)
+    similaridade[~np.isfinite(similaridade)] = 0.0
+    # Sem suporte mínimo, um único pedido cria "afinidades" perfeitas
+    similaridade[coocorrencia < MIN_COOCORRENCIAS] = 0.0
+    np.fill_diagonal(similaridade, 0.0)
+    return similaridade
+
+
+def melhores_vizinhos(similaridade, k=VIZINHOS_POR_PRODUTO):
+    """{linha: [(coluna, pontuação), ...]} com os k maiores valores positivos de cada linha"""
+    import numpy as np
+
+    k = min(k, similaridade.shape[1])
+    if k == 0:
+        return {}
+    candidatos = np.argpartition(-similaridade, k - 1, axis=1)[:, :k]
+    vizinhos = {}
+    for linha, colunas in enumerate(candidatos):
+        pares = [(int(coluna), float(similaridade[linha, coluna])) for coluna in colunas]
+        pares = sorted((par for par in pares if par[1] > 0), key=lambda par: -par[1])
+        if pares:
+            vizinhos[linha] = pares
+    return vizinhos
+
+
+def calcular_vizinhos(metodo='cosseno', k=VIZINHOS_POR_PRODUTO):
+    """
+    Recalcula ProdutoVizinho inteiro. Retorna {'cestas': n, 'produtos': n, 'vizinhos': n}.
+    """
+    if metodo not in METODOS:
+        raise ValueError(f'Método desconhecido: {metodo}')
+
+    cestas = _cestas()
+    produto_ids = sorted({produto_id for cesta in cestas for produto_id in cesta})
+    indices = {produto_id: indice for indice, produto_id in enumerate(produto_ids)}
+
+    linhas = []
+    if cestas:
+        coocorrencia = matriz_coocorrencia(cestas, indices)
+        similaridade = normalizar(coocorrencia, len(cestas), metodo)
+        for linha, pares in melhores_vizinhos(similaridade, k).items():
+            for posicao, (coluna, pontuacao) in enumerate(pares):
+                linhas.append(ProdutoVizinho(
+                    produto_id=produto_ids[linha],
+                    vizinho_id=produto_ids[coluna],
+                    pontuacao=pontuacao,
+                    posicao=posicao,
+                ))
+
+    with transaction.atomic():
+        ProdutoVizinho.objects.all().delete()
+        ProdutoVizinho.objects.bulk_create(linhas, batch_size=1000)
+        invalidar_tags(TAG_RECOMENDACOES)
+
+    resultado = {'cestas': len(cestas), 'produtos': len({v.produto_id for v in linhas}), 'vizinhos': len(linhas)}
+    logger.info(f"Recomendações recalculadas: {resultado}")
+    calcular_relacionados()
+    return resultado
+
+
+def _linhas_relacionados(categorias):
+    produtos = Produto.objects.exclude(status='inativo')
+    if categorias is not None:
+        produtos = produtos.filter(categoria__in=categorias)
+
+    por_categoria = defaultdict(list)
+    for produto_id, categoria in produtos.order_by('ordem', 'id').values_list('id', 'categoria'):
+        por_categoria[categoria].append(produto_id)
+    ids = [produto_id for lista in por_categoria.values() for produto_id in lista]
+    pontuacoes = {
+        (produto_id, vizinho_id): pontuacao
+        for produto_id, vizinho_id, pontuacao in ProdutoVizinho.objects.filter(
+            produto_id__in=ids, vizinho_id__in=ids,
+        ).values_list('produto_id', 'vizinho_id', 'pontuacao')
+    }
+
+    linhas = []
+    for lista in por_categoria.values():
+        for produto_id in lista:
+            # sorted é estável: os empates ficam na ordem do menu
+            candidatos = sorted(
+                (outro for outro in lista if outro != produto_id),
+                key=lambda outro: -pontuacoes.get((produto_id, outro), 0.0),
+            )[:RELACIONADOS_POR_PRODUTO]
+            linhas += [
+                ProdutoRelacionado(produto_id=produto_id, relacionado_id=outro, posicao=posicao)
+                for posicao, outro in enumerate(candidatos)
+            ]
+    return linhas
+
+
+def _bloquear_relacionados():
+    """Uma reconstrução de cada vez, até ao fim da transação"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [BLOQUEIO_RELACIONADOS])
+
+
+def calcular_relacionados(categorias=None):
+    """
+    Recalcula ProdutoRelacionado das categorias indicadas (todas, por
+    omissão): mesma categoria, por co-compra e depois (ordem, id).
+    Retorna o número de linhas gravadas.
+    """
+    with transaction.atomic():
+        _bloquear_relacionados()
+        # Lidas já com o bloqueio: a última reconstrução vê o estado mais recente
+        linhas = _linhas_relacionados(categorias)
+        antigos = ProdutoRelacionado.objects.all()
+        if categorias is not None:
+            antigos = antigos.filter(produto__categoria__in=categorias)
+        antigos.delete()
+        ProdutoRelacionado.objects.bulk_create(linhas, batch_size=1000)
+        invalidar_tags(TAG_RELACIONADOS)
+    return len(linhas)
+
+
+def _disponiveis():
+    return Produto.objects.filter(status='ativo', estoque__gt=0)
+
+
+def comprados_juntos(produto_id, limite=4):
+    """Produtos disponíveis frequentemente comprados com o produto, com cache"""
+    cache_key = f'comprados_juntos_{produto_id}_{limite}_v{versao_tag(TAG_RECOMENDACOES)}'
+    produtos = cache.get(cache_key)
+
+    if produtos is None:
+        produtos = [
+            vizinho.vizinho for vizinho in ProdutoVizinho.objects.filter(
+                produto_id=produto_id, vizinho__status='ativo', vizinho__estoque__gt=0,
+            ).select_related('vizinho').order_by('posicao')[:limite]
+        ]
+        cache.set(cache_key, produtos, 60 * 60)  # 1 hora
+
+    return produtos
+
+
+def produtos_relacionados(produto_id, limite=4):
+    """Relacionados disponíveis, já ordenados (QuerySet: só consulta se for usado)"""
+    return _disponiveis().filter(
+        relacionado_em__produto_id=produto_id
+    ).order_by('relacionado_em__posicao')[:limite]
+
+
+def itens_do_usuario(usuario):
+    """Ids dos produtos pedidos recentemente ou favoritados pelo usuário"""
+    from carinho.models import ItemCarrinho
+
+    recentes = ItemCarrinho.objects.filter(
+        carrinho__usuario=usuario,
+        carrinho__pedido_entrega__data_solicitacao__gte=timezone.now() - timedelta(days=DIAS_HISTORICO_USUARIO),
+    ).order_by().values('produto_id')
+    favoritos = Favorito.objects.filter(usuario=usuario).order_by().values('produto_id')
+    return set(recentes.union(favoritos).values_list('produto_id', flat=True))
+
+
+def recomendar_para_usuario(usuario, limite=3):
+    """
+    Vizinhos somados dos itens recentes/favoritos do usuário (sem os
+    próprios itens), completados pelos mais populares.
+    """
+    from carinho.popularidade import obter_produtos_populares
+
+    sementes = itens_do_usuario(usuario)
+    pontuacoes = defaultdict(float)
+    if sementes:
+        for vizinho_id, pontuacao in ProdutoVizinho.objects.filter(
+            produto_id__in=sementes
+        ).exclude(vizinho_id__in=sementes).values_list('vizinho_id', 'pontuacao'):
+            pontuacoes[vizinho_id] += pontuacao
+
+    produtos = []
+    if pontuacoes:
+        por_id = _disponiveis().in_bulk(list(pontuacoes))
+        ordenados = sorted(por_id, key=lambda pk: -pontuacoes[pk])
+        produtos = [por_id[pk] for pk in ordenados[:limite]]
+
+    if len(produtos) < limite:
+        vistos = {produto.pk for produto in produtos} | sementes
+        for produto in obter_produtos_populares(limite * 3):
+            if produto.pk not in vistos:
+                produtos.append(produto)
+                vistos.add(produto.pk)
+            if len(produtos) == limite:
+                break
+    return produtos
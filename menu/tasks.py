@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from .estoque import reconciliar_estoque
+from .recomendacoes import calcular_vizinhos
+
+
+@shared_task
+def calcular_recomendacoes_produtos():
+    """Recalcula os vizinhos por co-compra de todos os produtos"""
+    return calcular_vizinhos()
+
+
+@shared_task
+def reconciliar_estoque_produtos():
+    """Grava no banco o estoque dos produtos controlados no Redis"""
+    return reconciliar_estoque()
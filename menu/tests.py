@@ -1,3 +1,555 @@
-from django.test import TestCase
+import importlib.util
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from index.invalidacao import versao_tag
+
+from .autocompletar import descartar_indice, sugerir_produtos
+from .busca import TABELA_FTS, BuscaBase, buscar_produtos, radical
+from .catalogo import descartar_snapshot, obter_snapshot
+from .estoque import (
+    EstoqueInsuficiente, chave, devolver_estoque, reconciliar_estoque, reservar_estoque, ressemear_estoque,
+)
+from .importacao import ErroImportacao, exportar_produtos, importar_produtos, ler_linhas
+from .models import TAG_CATALOGO, Favorito, Produto, ProdutoVizinho
+from .recomendacoes import (
+    calcular_relacionados, calcular_vizinhos, comprados_juntos, produtos_relacionados, recomendar_para_usuario,
+)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BuscaProdutosTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.hamburguer = Produto.objects.create(
+            nome='Hambúrguer Duplo', descricao_curta='Pão, carne e queijo',
+            preco=3500, categoria='hamburguer', estoque=10
+        )
+        cls.batata = Produto.objects.create(
+            nome='Batatas Fritas', descricao='Acompanha bem um hambúrguer',
+            preco=1200, categoria='Lanches', estoque=10
+        )
+        cls.sumo = Produto.objects.create(
+            nome='Sumo de Limão', preco=800, categoria='Bebidas', estoque=10
+        )
+
+    def ids(self, termo):
+        return [produto.id for produto in buscar_produtos(termo)]
+
+    def test_radical(self):
+        self.assertEqual(radical('Hambúrgueres'), radical('hamburguer'))
+        self.assertEqual(radical('limões'), radical('Limão'))
+        self.assertEqual(radical('pães'), radical('pão'))
+
+    def test_ignora_acentos_plural_e_prefixo(self):
+        self.assertEqual(self.ids('limao'), [self.sumo.id])
+        self.assertEqual(self.ids('batata'), [self.batata.id])
+        self.assertEqual(self.ids('HAMBURGUERES duplos'), [self.hamburguer.id])
+        self.assertEqual(self.ids('bat'), [self.batata.id])
+        self.assertEqual(self.ids('pizza'), [])
+
+    def test_nome_antes_da_descricao(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('Sem ranking no backend simples')
+        self.assertEqual(self.ids('hamburguer'), [self.hamburguer.id, self.batata.id])
+
+    def test_indice_acompanha_save_e_delete(self):
+        self.sumo.nome = 'Sumo de Manga'
+        self.sumo.save()
+        self.assertEqual(self.ids('limao'), [])
+        self.assertEqual(self.ids('manga'), [self.sumo.id])
+
+        self.sumo.delete()
+        self.assertEqual(self.ids('manga'), [])
+
+    def test_lista_produtos_usa_busca(self):
+        resposta = self.client.get(reverse('lista_produtos'), {'query': 'limões'})
+        self.assertEqual(list(resposta.context['produtos']), [self.sumo])
+
+    def test_pesquisa_nao_passa_pelo_cache_de_pagina(self):
+        url = reverse('lista_produtos')
+        self.assertIn('max-age', self.client.get(url)['Cache-Control'])
+
+        resposta = self.client.get(url, {'query': 'limao'})
+        self.assertIn('no-store', resposta['Cache-Control'])
+        self.sumo.nome = 'Sumo de Manga'
+        self.sumo.save()
+        resposta = self.client.get(url, {'query': 'limao'})
+        self.assertEqual(list(resposta.context['produtos']), [])
+
+    def test_backend_tem_de_implementar_buscar(self):
+        with self.assertRaises(TypeError):
+            BuscaBase()
+
+    def test_reconstruir_indice(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Tabela FTS5 só existe no SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABELA_FTS}')
+        self.assertEqual(self.ids('batata'), [])
+
+        call_command('reconstruir_indice_busca', stdout=StringIO())
+        self.assertEqual(self.ids('batata'), [self.batata.id])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AutocompletarTest(TestCase):
+    def setUp(self):
+        descartar_indice()
+        self.duplo = Produto.objects.create(nome='Hambúrguer Duplo', preco=3500, categoria='hamburguer', estoque=5, ordem=2)
+        self.simples = Produto.objects.create(nome='Hambúrguer Simples', preco=2500, categoria='hamburguer', estoque=5, ordem=1)
+        self.batata = Produto.objects.create(nome='Batata com Hambúrguer', preco=1200, categoria='Lanches', estoque=5, ordem=0)
+        Produto.objects.create(nome='Hambúrguer Antigo', preco=2000, categoria='hamburguer', status='inativo')
+
+    def nomes(self, termo):
+        return [produto['nome'] for produto in sugerir_produtos(termo)]
+
+    def test_prefixo_sem_acentos_e_ordem(self):
+        sugerir_produtos('aquecer')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.nomes('hamb'),
+                ['Hambúrguer Simples', 'Hambúrguer Duplo', 'Batata com Hambúrguer']
+            )
+            self.assertEqual(self.nomes('HAMBÚRGUER du'), ['Hambúrguer Duplo'])
+            self.assertEqual(self.nomes('pizza'), [])
+
+    def test_reconstroi_quando_catalogo_muda(self):
+        self.assertEqual(self.nomes('bat'), ['Batata com Hambúrguer'])
+        self.batata.nome = 'Batatas Rústicas'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batata.save()
+        self.assertEqual(self.nomes('rust'), ['Batatas Rústicas'])
+
+    def test_endpoint(self):
+        resposta = self.client.get(reverse('autocompletar_produtos'), {'q': 'dup'})
+        self.assertEqual(resposta.json(), {'produtos': [{
+            'id': self.duplo.id, 'nome': 'Hambúrguer Duplo', 'preco': 3500.0, 'imagem': '/static/img/big.jpg',
+        }]})
+        self.assertIn('no-cache', resposta['Cache-Control'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SnapshotCatalogoTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        descartar_snapshot()
+        self.sumo = Produto.objects.create(nome='Sumo', preco=800, categoria='Bebidas', estoque=5, ordem=1)
+        self.burger = Produto.objects.create(nome='Burger', preco=3500, categoria='hamburguer', estoque=0, ordem=2)
+        Produto.objects.create(nome='Antigo', preco=100, categoria='Lanches', status='inativo')
+
+    def test_documento_agrupado_por_categoria(self):
+        dados = obter_snapshot().dados
+        self.assertEqual([grupo['categoria'] for grupo in dados['categorias']], ['hamburguer', 'Bebidas'])
+        sumo = dados['categorias'][1]['produtos'][0]
+        self.assertEqual((sumo['preco_formatado'], sumo['em_estoque']), ('KZ 800.00', True))
+        self.assertFalse(dados['categorias'][0]['produtos'][0]['em_estoque'])
+
+    def test_etag_forte_e_sem_consultas(self):
+        url = reverse('catalogo_json')
+        primeira = self.client.get(url)
+        etag = primeira['ETag']
+        self.assertEqual(primeira.status_code, 200)
+        self.assertFalse(etag.startswith('W/'))
+
+        with self.assertNumQueries(0):
+            resposta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+
+    def test_nova_versao_quando_produto_muda(self):
+        antigo = obter_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sumo.preco = 900
+            self.sumo.save()
+        novo = obter_snapshot()
+        self.assertNotEqual(novo.etag, antigo.etag)
+        self.assertIn('KZ 900.00', novo.corpo.decode())
+
+    def test_menu_navega_pelo_snapshot(self):
+        self.client.get(reverse('lista_produtos'))
+        with self.assertNumQueries(0):
+            resposta = self.client.get(reverse('lista_produtos'), {'categoria': 'Bebidas'})
+        self.assertEqual([produto.id for produto in resposta.context['produtos']], [self.sumo.id])
+        self.assertContains(resposta, 'KZ 800.00')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RecomendacoesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        self.burger, self.batata, self.sumo, self.bolo = [
+            Produto.objects.create(nome=nome, preco=1000, categoria='Lanches', estoque=10, ordem=i)
+            for i, nome in enumerate(['Burger', 'Batata', 'Sumo', 'Bolo'])
+        ]
+
+    def _entregar(self, *produtos):
+        from carinho.models import Carrinho, ItemCarrinho, PedidoEntrega
+
+        carrinho = Carrinho.objects.create(usuario=self.usuario, estado='fechado')
+        for produto in produtos:
+            ItemCarrinho.objects.create(carrinho=carrinho, produto=produto, quantidade=1)
+        PedidoEntrega.objects.create(carrinho=carrinho, endereco_entrega='Rua 1', estado='entregue')
+
+    def test_comprados_juntos_em_ordem_e_so_disponiveis(self):
+        ProdutoVizinho.objects.create(produto=self.burger, vizinho=self.sumo, pontuacao=0.5, posicao=1)
+        ProdutoVizinho.objects.create(produto=self.burger, vizinho=self.batata, pontuacao=0.9, posicao=0)
+        ProdutoVizinho.objects.create(produto=self.burger, vizinho=self.bolo, pontuacao=0.4, posicao=2)
+        Produto.objects.filter(pk=self.bolo.pk).update(estoque=0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(comprados_juntos(self.burger.id), [self.batata, self.sumo])
+
+    def test_recomendacao_soma_vizinhos_dos_favoritos(self):
+        Favorito.objects.create(usuario=self.usuario, produto=self.burger)
+        Favorito.objects.create(usuario=self.usuario, produto=self.batata)
+        ProdutoVizinho.objects.create(produto=self.burger, vizinho=self.bolo, pontuacao=0.3, posicao=0)
+        ProdutoVizinho.objects.create(produto=self.batata, vizinho=self.bolo, pontuacao=0.3, posicao=0)
+        ProdutoVizinho.objects.create(produto=self.batata, vizinho=self.sumo, pontuacao=0.5, posicao=1)
+        # Vizinho que o usuário já tem não é recomendado
+        ProdutoVizinho.objects.create(produto=self.burger, vizinho=self.batata, pontuacao=0.9, posicao=1)
+
+        self.assertEqual(recomendar_para_usuario(self.usuario, 2), [self.bolo, self.sumo])
+
+    def test_relacionados_por_co_compra_depois_ordem(self):
+        ProdutoVizinho.objects.create(produto=self.burger, vizinho=self.bolo, pontuacao=0.8, posicao=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            calcular_relacionados()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(list(produtos_relacionados(self.burger.id)), [self.bolo, self.batata, self.sumo])
+
+        # Mudar de categoria reordena as duas categorias depois do commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sumo.categoria = 'Bebidas'
+            self.sumo.save()
+        self.assertEqual(list(produtos_relacionados(self.burger.id)), [self.bolo, self.batata])
+        self.assertEqual(list(produtos_relacionados(self.sumo.id)), [])
+
+        resposta = self.client.get(reverse('detalhes_produto', args=[self.batata.id]))
+        self.assertEqual(list(resposta.context['produtos_relacionados']), [self.burger, self.bolo])
+
+    @skipUnless(importlib.util.find_spec('numpy'), 'NumPy não instalado')
+    def test_calcular_vizinhos_por_coocorrencia(self):
+        for _ in range(3):
+            self._entregar(self.burger, self.batata)
+        self._entregar(self.burger, self.sumo)  # abaixo do suporte mínimo
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = calcular_vizinhos()
+
+        self.assertEqual(resultado['cestas'], 4)
+        self.assertEqual(
+            set(ProdutoVizinho.objects.values_list('produto__nome', 'vizinho__nome')),
+            {('Burger', 'Batata'), ('Batata', 'Burger')},
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EstoqueTest(TestCase):
+    """Sem Redis (locmem), também os produtos em tempo real usam o banco"""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.burger = Produto.objects.create(
+                nome='Burger', preco=3500, categoria='hamburguer', estoque=2, estoque_tempo_real=True
+            )
+            self.sumo = Produto.objects.create(nome='Sumo', preco=800, categoria='Bebidas', estoque=10)
+
+    def test_reserva_baixa_estoque_e_esgota(self):
+        with reservar_estoque({self.burger.pk: 2, self.sumo.pk: 3}):
+            pass
+        self.burger.refresh_from_db()
+        self.sumo.refresh_from_db()
+        self.assertEqual((self.burger.estoque, self.burger.status), (0, 'esgotado'))
+        self.assertEqual(self.sumo.estoque, 7)
+        self.assertFalse(self.burger.em_estoque())
+
+    def test_estoque_insuficiente_nao_reserva_nada(self):
+        with self.assertRaises(EstoqueInsuficiente) as erro:
+            with reservar_estoque({self.sumo.pk: 1, self.burger.pk: 3}):
+                pass
+        self.assertEqual((erro.exception.produto_id, erro.exception.disponivel), (self.burger.pk, 2))
+        self.assertEqual(Produto.objects.get(pk=self.sumo.pk).estoque, 10)
+
+    def test_devolucao_reativa_produto_esgotado(self):
+        with reservar_estoque({self.burger.pk: 2}):
+            pass
+        devolver_estoque({self.burger.pk: 1})
+        self.burger.refresh_from_db()
+        self.assertEqual((self.burger.estoque, self.burger.status), (1, 'ativo'))
+
+    def test_catalogo_so_invalida_quando_esgota(self):
+        versao = versao_tag(TAG_CATALOGO)
+        with self.captureOnCommitCallbacks(execute=True):
+            with reservar_estoque({self.sumo.pk: 3}):
+                pass
+        self.assertEqual(versao_tag(TAG_CATALOGO), versao)
+        self.assertNotIn('estoque', obter_snapshot().dados['categorias'][0]['produtos'][0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with reservar_estoque({self.burger.pk: 2}):
+                pass
+        self.assertEqual(versao_tag(TAG_CATALOGO), versao + 1)
+
+    def test_reserva_abre_a_propria_transacao(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                with reservar_estoque({self.sumo.pk: 1}):
+                    pass
+        self.assertEqual(Produto.objects.get(pk=self.sumo.pk).estoque, 10)
+
+
+@skipUnless(importlib.util.find_spec('fakeredis'), 'fakeredis não instalado')
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EstoqueRedisTest(TestCase):
+    """Produtos em tempo real com um Redis falso (fakeredis, com Lua)"""
+
+    def setUp(self):
+        import fakeredis
+
+        cache.clear()
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('menu.estoque.obter_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.burger = Produto.objects.create(
+                nome='Burger', preco=3500, categoria='hamburguer', estoque=5, estoque_tempo_real=True
+            )
+            self.batata = Produto.objects.create(
+                nome='Batata', preco=1200, categoria='Lanches', estoque=1, estoque_tempo_real=True
+            )
+            self.sumo = Produto.objects.create(nome='Sumo', preco=800, categoria='Bebidas', estoque=10)
+
+    def _redis(self, produto):
+        valor = self.redis.get(chave(produto.pk))
+        return None if valor is None else int(valor)
+
+    def test_reserva_semeia_e_decrementa_so_no_redis(self):
+        self.redis.delete(chave(self.burger.pk))
+        with reservar_estoque({self.burger.pk: 2, self.sumo.pk: 1}):
+            pass
+        self.assertEqual(self._redis(self.burger), 3)
+        self.assertEqual(Produto.objects.get(pk=self.burger.pk).estoque, 5)
+        self.assertEqual(Produto.objects.get(pk=self.sumo.pk).estoque, 9)
+
+    def test_estoque_insuficiente_nao_decrementa_nenhuma_chave(self):
+        with self.assertRaises(EstoqueInsuficiente) as erro:
+            with reservar_estoque({self.burger.pk: 2, self.batata.pk: 2, self.sumo.pk: 1}):
+                pass
+        self.assertEqual((erro.exception.produto_id, erro.exception.disponivel), (self.batata.pk, 1))
+        self.assertEqual((self._redis(self.burger), self._redis(self.batata)), (5, 1))
+        self.assertEqual(Produto.objects.get(pk=self.sumo.pk).estoque, 10)
+
+    def test_falha_no_bloco_devolve_a_reserva(self):
+        with self.assertRaises(ValueError):
+            with reservar_estoque({self.burger.pk: 2, self.sumo.pk: 4}):
+                self.assertEqual(self._redis(self.burger), 3)
+                raise ValueError('pedido inválido')
+        self.assertEqual(self._redis(self.burger), 5)
+        self.assertEqual(Produto.objects.get(pk=self.sumo.pk).estoque, 10)
+
+    def test_reconciliar_grava_no_banco_e_esgota(self):
+        with reservar_estoque({self.batata.pk: 1, self.burger.pk: 2}):
+            pass
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(reconciliar_estoque(), 2)
+        batata = Produto.objects.get(pk=self.batata.pk)
+        self.assertEqual((batata.estoque, batata.status), (0, 'esgotado'))
+        self.assertEqual(Produto.objects.get(pk=self.burger.pk).estoque, 3)
+        self.assertEqual(reconciliar_estoque(), 0)
+
+    def test_alteracao_manual_e_ressemear(self):
+        with reservar_estoque({self.burger.pk: 2}):
+            pass
+        produto = Produto.objects.get(pk=self.burger.pk)
+        produto.estoque = 8  # +3 no admin, sobre as 5 do banco
+        with self.captureOnCommitCallbacks(execute=True):
+            produto.save()
+        self.assertEqual(self._redis(self.burger), 6)
+
+        self.redis.set(chave(self.burger.pk), 99)
+        self.assertEqual(ressemear_estoque(), 2)
+        self.assertEqual(self._redis(self.burger), 8)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ImportacaoCatalogoTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sumo = Produto.objects.create(nome='Sumo', preco=800, categoria='Bebidas', estoque=5, ordem=1)
+        self.burger = Produto.objects.create(nome='Burger', preco=3500, categoria='hamburguer', estoque=3, ordem=2)
+
+    def test_cria_novos_e_atualiza_so_o_que_mudou(self):
+        csv = (
+            'id,nome,categoria,preco,estoque\n'
+            f'{self.sumo.pk},Sumo,Bebidas,900.00,5\n'
+            ',Burger,hamburguer,3500,3\n'
+            ',Batata Frita,Lanches,"1200,50",20\n'
+        )
+        versao = versao_tag(TAG_CATALOGO)
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = importar_produtos(ler_linhas(csv.encode(), 'csv'))
+
+        self.assertEqual(resultado, {'criados': 1, 'atualizados': 1, 'inalterados': 1})
+        self.assertEqual(Produto.objects.get(pk=self.sumo.pk).preco, Decimal('900.00'))
+        self.assertEqual(Produto.objects.get(nome='Batata Frita').preco, Decimal('1200.50'))
+        self.assertEqual(versao_tag(TAG_CATALOGO), versao + 1)
+        self.assertEqual([p.nome for p in buscar_produtos('batata')], ['Batata Frita'])
+
+    def test_linha_invalida_nao_grava_nada(self):
+        linhas = [
+            {'nome': 'Novo', 'categoria': 'Lanches', 'preco': '100'},
+            {'nome': 'Sumo', 'categoria': 'Sobremesas', 'preco': '-1'},
+        ]
+        with self.assertRaises(ErroImportacao) as erro:
+            importar_produtos(linhas)
+        self.assertEqual(len(erro.exception.erros), 2)
+        self.assertTrue(all(mensagem.startswith('Linha 2') for mensagem in erro.exception.erros))
+        self.assertFalse(Produto.objects.filter(nome='Novo').exists())
+
+    def test_exportacao_reimportada_sem_alteracoes(self):
+        for formato in ('csv', 'json'):
+            linhas = ler_linhas(exportar_produtos(formato), formato)
+            # Só a leitura dos existentes: sem diferença, nada é gravado
+            with self.assertNumQueries(1):
+                resultado = importar_produtos(linhas)
+            self.assertEqual(resultado, {'criados': 0, 'atualizados': 0, 'inalterados': 2})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FavoritosTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@teste.com', password='senha', nome='Cliente'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.burger = Produto.objects.create(nome='Burger', preco=1000, categoria='Lanches', estoque=10)
+            self.sumo = Produto.objects.create(nome='Sumo', preco=800, categoria='Bebidas', estoque=0)
+
+    def test_ids_em_cache_e_invalidados_ao_adicionar_e_remover(self):
+        versao = versao_tag(TAG_CATALOGO)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorito.objects.create(usuario=self.usuario, produto=self.burger)
+        # Favoritar não invalida o catálogo
+        self.assertEqual(versao_tag(TAG_CATALOGO), versao)
+
+        self.assertTrue(Favorito.usuario_tem_favorito(self.usuario, self.burger))
+        with self.assertNumQueries(0):
+            self.assertFalse(Favorito.usuario_tem_favorito(self.usuario, self.sumo))
+            self.assertEqual(Favorito.obter_total_favoritos_usuario(self.usuario), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorito.objects.create(usuario=self.usuario, produto=self.sumo)
+        self.assertEqual(Favorito.ids_favoritos(self.usuario), {self.burger.id, self.sumo.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorito.objects.get(usuario=self.usuario, produto=self.burger).delete()
+        self.assertEqual(Favorito.ids_favoritos(self.usuario), {self.sumo.id})
+
+    def test_lista_favoritos_numa_consulta(self):
+        Favorito.objects.create(usuario=self.usuario, produto=self.burger)
+        Favorito.objects.create(usuario=self.usuario, produto=self.sumo)
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('lista_favoritos'))  # aquece sessão/contexto global
+
+        with self.assertNumQueries(3):  # sessão, usuário, favoritos
+            resposta = self.client.get(reverse('lista_favoritos'))
+
+        self.assertEqual(resposta.context['total_favoritos'], 2)
+        self.assertEqual(resposta.context['disponiveis_count'], 1)
+        self.assertEqual(resposta.context['categorias_count'], 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CachePorPerfilTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Usuario = get_user_model()
+        self.ana = Usuario.objects.create_user(username='ana', email='ana@teste.com', password='senha', nome='Ana')
+        self.rui = Usuario.objects.create_user(username='rui', email='rui@teste.com', password='senha', nome='Rui')
+        self.burger = Produto.objects.create(nome='Burger', preco=1000, categoria='Lanches', estoque=10)
+
+    def _ver(self, usuario=None):
+        cliente = self.client_class()
+        if usuario:
+            cliente.force_login(usuario)
+        return cliente.get(reverse('detalhes_produto', args=[self.burger.pk]))
+
+    def test_pagina_partilhada_pelos_usuarios_do_mesmo_perfil(self):
+        Favorito.objects.create(usuario=self.ana, produto=self.burger)
+        pagina_ana = self._ver(self.ana)
+        # O favorito vem de estado_carrinho, não fica na página em cache
+        self.assertNotContains(pagina_ana, 'class="btn-favorite-lg favorited"')
+
+        self.assertEqual(self._ver(self.rui).content, pagina_ana.content)
+        self.assertNotEqual(self._ver().content, pagina_ana.content)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ApiProdutosTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produtos = [
+                Produto.objects.create(nome=f'Produto {i}', preco=Decimal('1000.50'), categoria='Lanches', estoque=5, ordem=i // 2)
+                for i in range(5)
+            ]
+            self.sumo = Produto.objects.create(nome='Sumo', preco=800, categoria='Bebidas', estoque=5, ordem=9)
+            Produto.objects.create(nome='Antigo', preco=500, categoria='Lanches', status='inativo')
+
+    def _pedir(self, **parametros):
+        resposta = self.client.get(reverse('api_produtos'), parametros)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta, json.loads(resposta.content)
+
+    def test_paginacao_por_cursor_filtros_e_campos(self):
+        ids, cursor = [], None
+        while True:
+            parametros = {'categoria': 'Lanches', 'limite': 2, 'fields': 'id,preco_formatado'}
+            if cursor:
+                parametros['cursor'] = cursor
+            _, dados = self._pedir(**parametros)
+            ids += [produto['id'] for produto in dados['produtos']]
+            cursor = dados['proximo']
+            if not cursor:
+                break
+
+        self.assertEqual(ids, [produto.id for produto in self.produtos])
+        self.assertEqual(dados['produtos'][0], {'id': self.produtos[4].id, 'preco_formatado': 'KZ 1000.50'})
+
+        resposta = self.client.get(reverse('api_produtos'), {'status': 'vendido'})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_etag_responde_304_sem_consultas(self):
+        resposta, _ = self._pedir(fields='id')
+        with self.assertNumQueries(0):
+            resposta = self.client.get(reverse('api_produtos'), {'fields': 'id'}, HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(resposta.status_code, 304)
+
+        resposta_gzip = self.client.get(reverse('api_produtos'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(resposta_gzip['Content-Encoding'], 'gzip')
+
+    def test_updated_since_inclui_inativos(self):
+        _, dados = self._pedir()
+        self.assertNotIn('Antigo', [produto['nome'] for produto in dados['produtos']])
+        desde = Produto.objects.latest('data_atualizacao').data_atualizacao.isoformat()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sumo.status = 'inativo'
+            self.sumo.save()
+        _, dados = self._pedir(updated_since=desde, fields='id,status')
+        self.assertEqual(dados['produtos'], [{'id': self.sumo.id, 'status': 'inativo'}])
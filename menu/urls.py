@@ -6,6 +6,9 @@ from . import views
 
 urlpatterns = [
     path('', views.ProdutoListView.as_view(), name='lista_produtos'),
+    path('catalogo.json', views.catalogo_json, name='catalogo_json'),
+    path('api/produtos/', views.api_produtos, name='api_produtos'),
+    path('autocompletar/', views.autocompletar_produtos, name='autocompletar_produtos'),
     path('produto/<int:pk>/', views.ProdutoDetailView.as_view(), name='detalhes_produto'),
     path('produto/novo/', views.ProdutoCreateView.as_view(), name='criar_produto'),
     path('produto/<int:pk>/editar/', views.ProdutoUpdateView.as_view(), name='editar_produto'),
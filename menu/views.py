@@ -1,16 +1,22 @@
-from carinho.models import Carrinho, ItemCarrinho  # Importar modelos do carrinho
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.views.decorators.cache import cache_page
+from django.views.decorators.cache import cache_page, never_cache
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from django.http import HttpResponse, JsonResponse
 from django.utils.decorators import method_decorator
-from django.views.decorators.vary import vary_on_cookie
 from functools import wraps
 from .models import Produto, Favorito
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.db.models import Q
 from .forms import ProdutoForm, ProdutoSearchForm
+from .busca import buscar_produtos
+from .autocompletar import sugerir_produtos
+from . import api
+from .catalogo import obter_snapshot
+from .recomendacoes import TAG_RECOMENDACOES, TAG_RELACIONADOS, comprados_juntos, produtos_relacionados
+from index.invalidacao import invalidar, invalidar_padroes, versao_tag
 
 # Cache decorator personalizado para produtos
 def cache_produtos(timeout):
@@ -34,6 +40,32 @@ def cache_produtos(timeout):
         return _wrapped_view
     return decorator
 
+PERFIS_CACHE = ('anonimo', 'cliente', 'equipa')
+
+def perfil_cache(request):
+    """Versão da página em cache que o usuário vê"""
+    if not request.user.is_authenticated:
+        return 'anonimo'
+    return 'equipa' if request.user.is_staff else 'cliente'
+
+def cache_por_perfil(timeout):
+    """
+    cache_page partilhado por todos os usuários do mesmo perfil, em vez de
+    uma cópia por sessão. O que é de cada usuário (nome, carrinho, favoritos,
+    mensagens) vem de estado_carrinho e é aplicado por js/estado.js.
+    """
+    def decorator(view_func):
+        variantes = {
+            perfil: cache_page(timeout, key_prefix=f'perfil_{perfil}')(view_func)
+            for perfil in PERFIS_CACHE
+        }
+        
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            return variantes[perfil_cache(request)](request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
+
 # Cache para lista de produtos - 15 minutos
 class ProdutoListView(ListView):
     model = Produto
@@ -41,35 +73,48 @@ class ProdutoListView(ListView):
     context_object_name = 'produtos'
     paginate_by = 12
     
-    @method_decorator(cache_page(60 * 15))
-    @method_decorator(vary_on_cookie)
-    def dispatch(self, *args, **kwargs):
-        return super().dispatch(*args, **kwargs)
+    def dispatch(self, request, *args, **kwargs):
+        # Pesquisas não vão para o cache: os termos não têm limite e o índice já é rápido
+        if request.GET.get('query', '').strip():
+            return self._dispatch_pesquisa(request, *args, **kwargs)
+        return self._dispatch_em_cache(request, *args, **kwargs)
+    
+    # never_cache também impede o cache do site (UpdateCacheMiddleware)
+    @method_decorator(never_cache)
+    def _dispatch_pesquisa(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+    
+    @method_decorator(cache_por_perfil(60 * 15))
+    def _dispatch_em_cache(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
     
     def get_queryset(self):
-        queryset = Produto.objects.all()
+        self.snapshot = obter_snapshot()
+        query = categoria = None
         
         # Filtros de pesquisa
         self.form = ProdutoSearchForm(self.request.GET)
         if self.form.is_valid():
             query = self.form.cleaned_data.get('query')
             categoria = self.form.cleaned_data.get('categoria')
-            
-            if query:
-                queryset = queryset.filter(
-                    Q(nome__icontains=query) |
-                    Q(descricao__icontains=query) |
-                    Q(descricao_curta__icontains=query)
-                )
-            
-            if categoria:
-                queryset = queryset.filter(categoria=categoria)
+        
+        # Navegação do cliente: snapshot do catálogo, sem consultas ao banco.
+        # Pesquisa e equipa (que vê também os inativos) continuam no banco.
+        if not query and not self.request.user.is_staff:
+            return self.snapshot.produtos(categoria)
+        
+        queryset = Produto.objects.all()
+        if query:
+            queryset = buscar_produtos(query, queryset)
+        if categoria:
+            queryset = queryset.filter(categoria=categoria)
         
         return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['search_form'] = self.form if hasattr(self, 'form') else ProdutoSearchForm()
+        context['versao_catalogo'] = self.snapshot.versao
         return context
 
 # Cache para detalhes do produto - 30 minutos
@@ -78,28 +123,19 @@ class ProdutoDetailView(DetailView):
     template_name = 'detalhes_produto.html'
     context_object_name = 'produto'
     
-    @method_decorator(cache_page(60 * 30))
-    @method_decorator(vary_on_cookie)
+    @method_decorator(cache_por_perfil(60 * 30))
     def dispatch(self, *args, **kwargs):
         return super().dispatch(*args, **kwargs)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Produtos relacionados (mesma categoria)
-        produto = self.get_object()
-        
-        # Cache para produtos relacionados
-        from django.core.cache import cache
-        cache_key = f"produtos_relacionados_{produto.id}"
-        produtos_relacionados = cache.get(cache_key)
-        
-        if produtos_relacionados is None:
-            produtos_relacionados = Produto.objects.filter(
-                categoria=produto.categoria
-            ).exclude(pk=produto.pk)[:4]
-            cache.set(cache_key, produtos_relacionados, 60 * 60)  # 1 hora
+        produto = self.object
         
-        context['produtos_relacionados'] = produtos_relacionados
+        # Pré-calculados; a consulta só corre se o fragmento do template não estiver em cache
+        context['produtos_relacionados'] = produtos_relacionados(produto.id)
+        context['versao_relacionados'] = versao_tag(TAG_RELACIONADOS)
+        context['comprados_juntos'] = comprados_juntos(produto.id)
+        context['versao_recomendacoes'] = versao_tag(TAG_RECOMENDACOES)
         return context
 
 # SEM CACHE - operações de escrita
@@ -184,21 +220,10 @@ def toggle_produto_status(request, pk):
     return redirect('lista_produtos')
 
 # Cache para lista de produtos (versão função) - 15 minutos
-@cache_page(60 * 15)
-@vary_on_cookie
+@cache_por_perfil(60 * 15)
 def lista_produtos(request):
     produtos = Produto.objects.filter(status='ativo').order_by('-data_criacao')
-    
-    # Verificar quais produtos estão no carrinho do usuário
-    produtos_no_carrinho_ids = []
-    if request.user.is_authenticated:
-        carrinho = Carrinho.objects.filter(usuario=request.user, estado='aberto').first()
-        if carrinho:
-            produtos_no_carrinho_ids = list(carrinho.itens.values_list('produto_id', flat=True))
-    
-    # Adicionar informação se está no carrinho para cada produto
-    for produto in produtos:
-        produto.no_carrinho = produto.id in produtos_no_carrinho_ids
+    # O que está no carrinho de cada usuário vem de estado_carrinho (js/estado.js)
     
     context = {
         'produtos': produtos,
@@ -206,37 +231,14 @@ def lista_produtos(request):
     return render(request, 'lista_produtos.html', context)
 
 # Cache para detalhes do produto (versão função) - 30 minutos
-@cache_page(60 * 30)
-@vary_on_cookie
+@cache_por_perfil(60 * 30)
 def detalhes_produto(request, pk):
     produto = get_object_or_404(Produto, pk=pk)
     
-    # Verificar se o produto está no carrinho do usuário
-    item_carrinho = None
-    if request.user.is_authenticated:
-        carrinho = Carrinho.objects.filter(usuario=request.user, estado='aberto').first()
-        if carrinho:
-            try:
-                item_carrinho = ItemCarrinho.objects.get(carrinho=carrinho, produto=produto)
-            except ItemCarrinho.DoesNotExist:
-                item_carrinho = None
-    
-    # Cache para produtos relacionados
-    from django.core.cache import cache
-    cache_key = f"produtos_relacionados_{produto.id}"
-    produtos_relacionados = cache.get(cache_key)
-    
-    if produtos_relacionados is None:
-        produtos_relacionados = Produto.objects.filter(
-            categoria=produto.categoria,
-            status='ativo'
-        ).exclude(pk=produto.pk)[:4]
-        cache.set(cache_key, produtos_relacionados, 60 * 60)  # 1 hora
-    
     context = {
         'produto': produto,
-        'item_carrinho': item_carrinho,  # Passar o item do carrinho separadamente
-        'produtos_relacionados': produtos_relacionados,
+        'produtos_relacionados': produtos_relacionados(produto.id),
+        'versao_relacionados': versao_tag(TAG_RELACIONADOS),
     }
     return render(request, 'detalhes_produto.html', context)
 
@@ -280,21 +282,24 @@ def remover_favorito(request, produto_id):
 
 # Cache para lista de favoritos - 10 minutos
 @login_required
-@cache_page(60 * 10)
-@vary_on_cookie
+@never_cache
 def lista_favoritos(request):
-    favoritos = Favorito.objects.filter(
+    # Uma consulta; contagens e disponibilidade calculadas sobre as linhas lidas
+    favoritos = list(Favorito.objects.filter(
         usuario=request.user
-    ).select_related('produto')
+    ).select_related('produto').order_by('-data_adicao'))
     
-    # Usando property do model
-    disponiveis_count = sum(1 for fav in favoritos if fav.produto_em_estoque)
+    for favorito in favoritos:
+        produto = favorito.produto
+        favorito.disponivel = produto.estoque > 0 and produto.status == 'ativo'
     
     context = {
         'favoritos': favoritos,
-        'total_favoritos': favoritos.count(),
-        'disponiveis_count': disponiveis_count,
-        'categorias_count': favoritos.values('produto__categoria').distinct().count(),
+        'total_favoritos': len(favoritos),
+        'disponiveis_count': sum(1 for favorito in favoritos if favorito.disponivel),
+        'categorias_count': len({favorito.produto.categoria for favorito in favoritos}),
+        # Muda quando um favorito entra ou sai: chave do fragmento em cache
+        'chave_favoritos': ','.join(str(favorito.produto_id) for favorito in favoritos),
     }
     
     return render(request, 'meu_favorito.html', context)
@@ -302,78 +307,76 @@ def lista_favoritos(request):
 # Funções de invalidação de cache
 def invalidar_cache_produtos():
     """Invalida cache geral de produtos"""
-    from django.core.cache import cache
-    cache_keys = [
+    invalidar(
         'produtos_lista_produtos',
         'produtos_ProdutoListView',
-    ]
-    
-    for key in cache_keys:
-        cache.delete(key)
+    )
     
     # Também limpa padrões
-    cache.delete_many_pattern('produtos_*')
+    invalidar_padroes('produtos_*')
     
     print("Cache de produtos invalidado")
 
 def invalidar_cache_produto_especifico(produto_id):
     """Invalida cache de um produto específico"""
-    from django.core.cache import cache
-    cache_keys = [
+    invalidar(
         f'produtos_detalhes_{produto_id}',
-        f'produtos_relacionados_{produto_id}',
-        f'produto_{produto_id}_*',
-    ]
-    
-    for key in cache_keys:
-        cache.delete(key)
+    )
+    invalidar_padroes(f'produto_{produto_id}_*')
     
     print(f"Cache do produto {produto_id} invalidado")
 
 def invalidar_cache_favoritos(usuario):
     """Invalida cache de favoritos do usuário"""
-    from django.core.cache import cache
-    cache_keys = [
+    invalidar(
         f'favoritos_user_{usuario.id}',
         f'lista_favoritos_user_{usuario.id}',
-    ]
-    
-    for key in cache_keys:
-        cache.delete(key)
+    )
     
     print(f"Cache de favoritos invalidado para usuário {usuario.id}")
 
 def invalidar_todos_caches_produtos():
     """Invalida todos os caches relacionados a produtos"""
-    from django.core.cache import cache
-    cache.delete_many_pattern('produtos_*')
-    cache.delete_many_pattern('*produto*')
-    cache.delete_many_pattern('favoritos_*')
+    invalidar_padroes('produtos_*', '*produto*', 'favoritos_*')
     print("Todos os caches de produtos invalidados")
 
-# API para produtos com cache
-@cache_page(60 * 5)  # 5 minutos para API
+def _etag_api_produtos(request):
+    try:
+        return api.etag(api.ler_parametros(request.GET))
+    except api.ParametroInvalido:
+        return None
+
+# API de produtos: paginação por cursor, filtros e campos à escolha (ver menu/api.py)
+@gzip_page
+@condition(etag_func=_etag_api_produtos)
 def api_produtos(request):
-    """API para listagem de produtos (para AJAX)"""
-    from django.core.cache import cache
-    from django.http import JsonResponse
-    
-    cache_key = f"api_produtos_{request.GET.urlencode()}"
-    produtos_data = cache.get(cache_key)
-    
-    if produtos_data is None:
-        produtos = Produto.objects.filter(status='ativo').values(
-            'id', 'nome', 'preco', 'categoria', 'imagem'
-        )[:20]
-        
-        produtos_data = {
-            'produtos': list(produtos),
-            'total': len(produtos),
-        }
-        
-        cache.set(cache_key, produtos_data, 60 * 5)
-    
-    return JsonResponse(produtos_data)
+    """Página de produtos em JSON (para a app e AJAX)"""
+    try:
+        parametros = api.ler_parametros(request.GET)
+    except api.ParametroInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    response = HttpResponse(api.obter_pagina(parametros), content_type='application/json; charset=utf-8')
+    # Como o catálogo: o cache do site não guarda, o cliente revalida com If-None-Match
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
+
+# Catálogo inteiro num documento: ETag forte, revalidação a cada pedido
+@condition(etag_func=lambda request: obter_snapshot().etag)
+def catalogo_json(request):
+    """Snapshot versionado do menu (JSON), sem consultas ao banco"""
+    snapshot = obter_snapshot()
+    response = HttpResponse(snapshot.corpo, content_type='application/json; charset=utf-8')
+    # max-age=0: o cache do site não guarda e o browser revalida com If-None-Match
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    response['X-Catalogo-Versao'] = str(snapshot.versao)
+    return response
+
+# SEM CACHE - autocompletar da pesquisa (índice em memória, sem banco)
+@never_cache
+def autocompletar_produtos(request):
+    """Sugestões de produtos para o texto digitado na pesquisa"""
+    termo = request.GET.get('q', '')[:100]
+    return JsonResponse({'produtos': sugerir_produtos(termo) if termo.strip() else []})
 
 # View para estatísticas de produtos (com cache)
 @cache_page(60 * 60)  # 1 hora
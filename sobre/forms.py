@@ -1,6 +1,6 @@
 # forms.py - ATUALIZADO
 from django.core.exceptions import ValidationError
-from django.core.cache import cache
+from index.invalidacao import invalidar
 import os
 from .models import VideoHistoria
 from django import forms
@@ -102,4 +102,4 @@ class VideoHistoriaForm(forms.ModelForm):
         # Remover None values e deletar caches
         cache_keys_to_delete = [key for key in cache_keys_to_delete if key]
         for key in cache_keys_to_delete:
-            cache.delete(key)
\ No newline at end of file
+            invalidar(key)
\ No newline at end of file
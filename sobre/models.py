@@ -5,6 +5,8 @@ from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from index.imagens import agendar_derivadas
+from index.invalidacao import agrupar_invalidacoes, invalidar
 
 class VideoHistoria(models.Model):
     FORMATO_VIDEO_CHOICES = [
@@ -166,6 +168,7 @@ class VideoHistoria(models.Model):
     def __str__(self):
         return self.titulo
     
+    @agrupar_invalidacoes()
     def save(self, *args, **kwargs):
         # Detectar formato automaticamente
         if self.arquivo_video:
@@ -294,8 +297,9 @@ class VideoHistoria(models.Model):
             'videos_historia_recentes_5',
             'videos_historia_recentes_10',
         ]
-        cache.delete_many(cache_keys)
+        invalidar(*cache_keys)
     
+    @agrupar_invalidacoes()
     def delete(self, *args, **kwargs):
         """Limpa cache antes de deletar"""
         self.limpar_cache_video()
@@ -307,6 +311,12 @@ def limpar_cache_video_signals(sender, instance, **kwargs):
     """Limpa caches globais quando vídeos são modificados"""
     instance.limpar_cache_video()
 
+@receiver(post_save, sender=VideoHistoria)
+def gerar_derivadas_thumbnail(sender, instance, raw=False, **kwargs):
+    """Versões redimensionadas da thumbnail, geradas no worker"""
+    if not raw:
+        agendar_derivadas(instance.thumbnail)
+
 # Funções utilitárias com cache
 def obter_galeria_videos(limite=None):
     """Obtém galeria completa de vídeos com cache"""
@@ -401,7 +411,7 @@ def obter_video_anterior(video_atual):
 # Função para limpar todo o cache de vídeos (útil para admin)
 def limpar_cache_videos_global():
     """Limpa todo o cache relacionado a vídeos"""
-    cache.delete_many([
+    invalidar(
         'videos_historia_ativos',
         'video_historia_principal',
         'estatisticas_videos_historia',
@@ -409,4 +419,4 @@ def limpar_cache_videos_global():
         'galeria_videos_10',
         'videos_carrossel_3',
         'videos_carrossel_5',
-    ])
\ No newline at end of file
+    )
\ No newline at end of file
@@ -7,6 +7,7 @@ from django.views.decorators.vary import vary_on_cookie
 from functools import wraps
 from .models import VideoHistoria
 from .forms import VideoHistoriaForm
+from index.invalidacao import invalidar, invalidar_padroes
 
 def is_staff(user):
     return user.is_staff
@@ -200,7 +201,6 @@ def estatisticas_videos(request):
 # Funções de invalidação de cache
 def invalidar_cache_videos():
     """Invalida cache geral de vídeos"""
-    from django.core.cache import cache
     cache_keys = [
         'video_principal_sobre_nos',
         'videos_galeria_sobre_nos',
@@ -210,33 +210,31 @@ def invalidar_cache_videos():
     ]
     
     for key in cache_keys:
-        cache.delete(key)
+        invalidar(key)
     
     # Também limpa padrões
-    cache.delete_many_pattern('video_*')
-    cache.delete_many_pattern('*videos*')
+    invalidar_padroes('video_*')
+    invalidar_padroes('*videos*')
     
     print("Cache de vídeos invalidado")
 
 def invalidar_cache_video_especifico(video_id):
     """Invalida cache de um vídeo específico"""
-    from django.core.cache import cache
     cache_keys = [
         f'video_{video_id}_details',
         f'video_{video_id}_*',
     ]
     
     for key in cache_keys:
-        cache.delete(key)
+        invalidar(key)
     
     print(f"Cache do vídeo {video_id} invalidado")
 
 def invalidar_todos_caches_videos():
     """Invalida todos os caches relacionados a vídeos"""
-    from django.core.cache import cache
-    cache.delete_many_pattern('video_*')
-    cache.delete_many_pattern('*video*')
-    cache.delete_many_pattern('*sobre_nos*')
+    invalidar_padroes('video_*')
+    invalidar_padroes('*video*')
+    invalidar_padroes('*sobre_nos*')
     print("Todos os caches de vídeos invalidados")
 
 # Task para limpeza periódica de cache (opcional)